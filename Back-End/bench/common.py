@@ -0,0 +1,69 @@
+"""
+Benchmark Helpers
+จับเวลาและสรุปผลเป็น latency distribution / throughput
+"""
+
+import time
+import numpy as np
+from typing import Callable, Dict, List, Optional
+
+
+def measure(func: Callable, repeat: int = 50, warmup: int = 3, items_per_call: int = 1) -> Dict:
+    """
+    เรียก func ซ้ำแล้วสรุป latency (ms) และ throughput
+
+    Args:
+        func: ฟังก์ชันที่ไม่รับ argument
+        repeat: จำนวนครั้งที่จับเวลา
+        warmup: จำนวนครั้งที่รันก่อนจับเวลา (ไม่นับ)
+        items_per_call: จำนวนรายการที่ประมวลผลต่อการเรียก 1 ครั้ง (เช่น batch size)
+
+    Returns:
+        dict: สถิติ latency (mean, p50, p90, p99, min, max) และ throughput ต่อวินาที
+    """
+    for _ in range(warmup):
+        func()
+
+    samples = np.empty(repeat, dtype=np.float64)
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples[i] = time.perf_counter() - start
+
+    return summarize(samples * 1000.0, items_per_call)
+
+
+def summarize(samples_ms: np.ndarray, items_per_call: int = 1) -> Dict:
+    total_s = float(samples_ms.sum()) / 1000.0
+    return {
+        "n": int(len(samples_ms)),
+        "mean_ms": float(samples_ms.mean()),
+        "p50_ms": float(np.percentile(samples_ms, 50)),
+        "p90_ms": float(np.percentile(samples_ms, 90)),
+        "p99_ms": float(np.percentile(samples_ms, 99)),
+        "min_ms": float(samples_ms.min()),
+        "max_ms": float(samples_ms.max()),
+        "throughput_per_s": (len(samples_ms) * items_per_call / total_s) if total_s > 0 else None,
+    }
+
+
+class Results:
+    """เก็บผล benchmark ของแต่ละ stage/case"""
+
+    def __init__(self):
+        self.rows: List[Dict] = []
+
+    def add(self, stage: str, case: str, stats: Optional[Dict] = None, skipped: Optional[str] = None, **extra):
+        row = {"stage": stage, "case": case}
+        if skipped is not None:
+            row["skipped"] = skipped
+        if stats is not None:
+            row.update(stats)
+        row.update(extra)
+        self.rows.append(row)
+
+        if skipped is not None:
+            print(f"  {stage:<12} {case:<32} skipped: {skipped}")
+        else:
+            print(f"  {stage:<12} {case:<32} p50 {row['p50_ms']:9.3f} ms  p99 {row['p99_ms']:9.3f} ms"
+                  f"  {row['throughput_per_s'] or 0:10.1f}/s")
@@ -0,0 +1,53 @@
+"""
+Benchmark Compare
+เทียบผล benchmark 2 ไฟล์ (เช่น commit ก่อน/หลัง) แล้วแจ้ง case ที่ช้าลงเกิน threshold
+
+Usage:
+    python -m bench.compare base.json new.json --metric p50_ms --threshold 0.10
+"""
+
+import argparse
+import json
+import sys
+
+
+def _load(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        report = json.load(f)
+    return {(r["stage"], r["case"]): r for r in report["results"] if "skipped" not in r}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("base", help="ผล benchmark เดิม")
+    parser.add_argument("new", help="ผล benchmark ใหม่")
+    parser.add_argument("--metric", default="p50_ms", help="ค่าที่ใช้เทียบ (mean_ms, p50_ms, p90_ms, p99_ms)")
+    parser.add_argument("--threshold", type=float, default=0.10, help="สัดส่วนที่ถือว่าช้าลง (0.10 = 10%%)")
+    args = parser.parse_args(argv)
+
+    base = _load(args.base)
+    new = _load(args.new)
+
+    regressions = 0
+    print(f"{'stage':<12} {'case':<36} {'base':>10} {'new':>10} {'change':>8}")
+    for key in sorted(base.keys() & new.keys()):
+        old_value = base[key][args.metric]
+        new_value = new[key][args.metric]
+        change = (new_value - old_value) / old_value if old_value else 0.0
+        flag = ""
+        if change > args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{key[0]:<12} {key[1]:<36} {old_value:10.3f} {new_value:10.3f} {change:+8.1%}{flag}")
+
+    for key in sorted(base.keys() - new.keys()):
+        print(f"{key[0]:<12} {key[1]:<36} (ไม่มีในผลใหม่)")
+
+    if regressions:
+        print(f"\nพบ {regressions} case ที่ช้าลงเกิน {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""
+Benchmark Runner
+รัน benchmark ของแต่ละ stage แล้วบันทึกผลเป็น JSON (ใช้เทียบระหว่าง commit)
+
+Usage:
+    python -m bench.run
+    python -m bench.run --stages decode,quality,detection --repeat 100 --output bench_results.json
+    python -m bench.run --stages recognize --gallery-sizes 100,10000,1000000
+    python -m bench.run --stages database --db-name face_bench
+    python -m bench.compare base.json bench_results.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import traceback
+from .common import Results
+from . import stages
+
+
+ALL_STAGES = ["decode", "quality", "detection", "embedding", "recognize", "database"]
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return "unknown"
+
+
+def _metadata() -> dict:
+    import cv2
+    import numpy as np
+    try:
+        import onnxruntime as ort
+        ort_version = ort.__version__
+    except ImportError:
+        ort_version = None
+
+    return {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "onnxruntime": ort_version,
+    }
+
+
+def _int_list(value: str):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark recognition pipeline stages")
+    parser.add_argument("--stages", default=",".join(ALL_STAGES), help=f"stages ที่จะรัน ({','.join(ALL_STAGES)})")
+    parser.add_argument("--image", default=stages.default_image_path(), help="รูปทดสอบ (ต้องมีใบหน้า)")
+    parser.add_argument("--image-sizes", default="1280,4032", help="ขยายรูปให้ด้านยาวเท่ากับค่าเหล่านี้ด้วย")
+    parser.add_argument("--repeat", type=int, default=50, help="จำนวนครั้งที่จับเวลาต่อ case")
+    parser.add_argument("--batch-sizes", default="8,32", help="batch size สำหรับ embedding")
+    parser.add_argument("--gallery-sizes", default="100,1000,10000,100000", help="จำนวน users ใน gallery")
+    parser.add_argument("--nprobe", type=int, default=8, help="IVF nprobe")
+    parser.add_argument("--db-name", default=os.getenv("BENCH_DB_NAME"),
+                        help="database สำหรับ stage database (default: BENCH_DB_NAME) - init_db และสร้าง/ลบ users bench_*")
+    parser.add_argument("--allow-live-db", action="store_true",
+                        help="ยอมให้ --db-name เป็น DB_NAME เดียวกับ server")
+    parser.add_argument("--output", "-o", default="bench_results.json", help="ไฟล์ผลลัพธ์ (JSON)")
+    args = parser.parse_args(argv)
+
+    selected = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = set(selected) - set(ALL_STAGES)
+    if unknown:
+        parser.error(f"ไม่รู้จัก stage: {', '.join(sorted(unknown))}")
+
+    results = Results()
+    images = None
+    if {"decode", "quality", "detection", "embedding"} & set(selected):
+        images = stages.load_images(args.image, _int_list(args.image_sizes))
+
+    runners = {
+        "decode": lambda: stages.bench_decode(results, images, args.repeat),
+        "quality": lambda: stages.bench_quality(results, images, args.repeat),
+        "detection": lambda: stages.bench_detection(results, images, args.repeat),
+        "embedding": lambda: stages.bench_embedding(results, images, args.repeat, _int_list(args.batch_sizes)),
+        "recognize": lambda: stages.bench_recognize(results, _int_list(args.gallery_sizes), args.repeat, args.nprobe),
+        "database": lambda: stages.bench_database(results, args.repeat, args.db_name, args.allow_live_db),
+    }
+
+    for stage in selected:
+        print(f"[{stage}]")
+        try:
+            runners[stage]()
+        except Exception as e:
+            # stage ที่รันไม่ได้ (เช่นไม่มี model / ไม่มี database) ไม่ทำให้ทั้ง suite ล้ม
+            traceback.print_exc(limit=1)
+            results.add(stage, "*", skipped=f"{type(e).__name__}: {e}")
+
+    report = {"meta": _metadata(), "args": vars(args), "results": results.rows}
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"บันทึกผล: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+"""
+Stage Benchmarks
+วัดเวลาของแต่ละ stage ใน recognition pipeline แบบ offline
+(ไม่ต้องรัน server) ด้วยรูปที่ให้มากับ repo หรือรูปสังเคราะห์
+"""
+
+import itertools
+import os
+import uuid
+import cv2
+import numpy as np
+from typing import Dict, List, Optional
+from .common import Results, measure
+
+
+# ==================================================
+# Input images
+# ==================================================
+def load_images(image_path: str, sizes: List[int]) -> Dict[str, Dict]:
+    """
+    เตรียมรูปทดสอบ: รูปต้นฉบับ + รูปที่ขยายให้ด้านยาวเท่ากับแต่ละขนาดใน sizes
+    (จำลองรูปความละเอียดสูงจากกล้องมือถือ / kiosk)
+
+    Returns:
+        dict: {ชื่อ case: {"image": BGR array, "jpeg": bytes}}
+    """
+    base = cv2.imread(image_path)
+    if base is None:
+        raise ValueError(f"ไม่พบไฟล์: {image_path}")
+
+    images = {}
+    h, w = base.shape[:2]
+    images[f"{w}x{h}"] = base
+    for size in sizes:
+        scale = size / max(h, w)
+        resized = cv2.resize(base, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_CUBIC)
+        images[f"{resized.shape[1]}x{resized.shape[0]}"] = resized
+
+    return {
+        name: {"image": img, "jpeg": cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()}
+        for name, img in images.items()
+    }
+
+
+# ==================================================
+# Stages
+# ==================================================
+def bench_decode(results: Results, images: Dict, repeat: int):
+    from services.utils import decode_image, decode_image_scaled
+    from config.settings import IMAGE_WORKING_SIZE
+
+    for name, item in images.items():
+        data = item["jpeg"]
+        results.add("decode", f"full/{name}", measure(lambda: decode_image(data), repeat), bytes=len(data))
+        results.add("decode", f"working/{name}", measure(lambda: decode_image_scaled(data, IMAGE_WORKING_SIZE), repeat),
+                    working_size=IMAGE_WORKING_SIZE)
+
+
+def bench_quality(results: Results, images: Dict, repeat: int):
+    from services.image_quality import check_image_quality
+
+    for name, item in images.items():
+        img = item["image"]
+        results.add("quality", name, measure(lambda: check_image_quality(img), repeat))
+
+
+def bench_detection(results: Results, images: Dict, repeat: int):
+    from services.face_detection import detect_faces, detect_faces_simple, detect_and_crop_face
+
+    for name, item in images.items():
+        img = item["image"]
+        results.add("detection", f"haar/{name}", measure(lambda: detect_faces_simple(img), repeat))
+        results.add("detection", f"onnx/{name}", measure(lambda: detect_faces(img), repeat))
+        results.add("detection", f"detect_and_crop/{name}", measure(lambda: detect_and_crop_face(img), repeat))
+
+
+def bench_embedding(results: Results, images: Dict, repeat: int, batch_sizes: List[int]):
+    from services.face_detection import detect_and_crop_face
+    from core.face_embedding import face_to_embedding, face_to_embedding_batch
+
+    img = next(iter(images.values()))["image"]
+    crop, detection = detect_and_crop_face(img)
+    if crop is None:
+        results.add("embedding", "single", skipped="ไม่พบใบหน้าในรูปทดสอบ")
+        return
+
+    results.add("embedding", "single", measure(lambda: face_to_embedding(crop), repeat))
+    for batch_size in batch_sizes:
+        crops = [crop] * batch_size
+        results.add(
+            "embedding", f"batch/{batch_size}",
+            measure(lambda: face_to_embedding_batch(crops), max(3, repeat // batch_size), items_per_call=batch_size)
+        )
+
+    # เทียบ inference ล้วนของแต่ละ backend (onnxruntime / opencv)
+    from core.face_embedding import create_embedder, _preprocess
+    blob = np.expand_dims(_preprocess(crop), axis=0)
+    for backend in ("onnxruntime", "opencv"):
+        try:
+            embedder = create_embedder(backend)
+        except Exception as e:
+            results.add("embedding", f"infer/{backend}", skipped=f"{type(e).__name__}: {e}")
+            continue
+        results.add("embedding", f"infer/{backend}", measure(lambda: embedder.run(blob), repeat))
+
+
+def _random_unit(rng, n: int, dim: int = 512) -> np.ndarray:
+    vectors = rng.standard_normal((n, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def bench_recognize(results: Results, gallery_sizes: List[int], repeat: int, nprobe: int):
+    """
+    วัดเวลา matching ของ gallery (exact และ IVF) ที่ขนาดต่างๆ
+    query = centroid ที่มี noise (จำลองรูปใหม่ของ user ที่ลงทะเบียนแล้ว) ใช้วัด recall@1 ของ IVF ด้วย
+    """
+    from core.gallery import EmbeddingGallery
+    from core.ann_index import IVFIndex
+    from config.settings import VERIFY_THRESHOLD
+
+    rng = np.random.default_rng(0)
+    for size in gallery_sizes:
+        centroids = _random_unit(rng, size)
+        rows = [(f"user_{i}", centroids[i]) for i in range(size)]
+
+        truth = rng.integers(0, size, 64)
+        noisy = centroids[truth] + rng.standard_normal((len(truth), 512), dtype=np.float32) * 0.04
+        queries = noisy / np.linalg.norm(noisy, axis=1, keepdims=True)
+
+        exact = EmbeddingGallery()
+        exact.load(rows)
+        it = itertools.count()
+        results.add("recognize", f"exact/{size}",
+                    measure(lambda: exact.search(queries[next(it) % len(queries)], VERIFY_THRESHOLD), repeat))
+        del exact
+
+        if size < 1000:
+            continue
+
+        ivf = EmbeddingGallery(index_factory=lambda: IVFIndex(nprobe=nprobe), min_index_size=0)
+        ivf.load(rows)
+        hits = sum(ivf.search(q, VERIFY_THRESHOLD)[0] == f"user_{t}" for q, t in zip(queries, truth))
+        it = itertools.count()
+        results.add("recognize", f"ivf(nprobe={nprobe})/{size}",
+                    measure(lambda: ivf.search(queries[next(it) % len(queries)], VERIFY_THRESHOLD), repeat),
+                    recall_at_1=hits / len(truth))
+        del ivf
+
+
+def _create_bench_database(database, db_name: str):
+    """สร้าง database สำหรับ benchmark ถ้ายังไม่มี (เชื่อมต่อโดยไม่เลือก database)"""
+    import mysql.connector
+    conn = mysql.connector.connect(
+        host=database.DB_HOST, port=database.DB_PORT, user=database.DB_USER, password=database.DB_PASSWORD
+    )
+    try:
+        cur = conn.cursor()
+        cur.execute(f"CREATE DATABASE IF NOT EXISTS `{db_name.replace('`', '``')}`")
+        cur.close()
+    finally:
+        conn.close()
+
+
+def bench_database(results: Results, repeat: int, db_name: Optional[str], allow_live_db: bool = False):
+    """
+    วัดเวลา DB helpers กับ MySQL ในเครื่อง (เช่น docker-compose ของ repo)
+    รัน init_db แล้วสร้าง/ลบ users ชื่อ bench_* ใน db_name - ต้องระบุ database แยกสำหรับ benchmark
+    (ไม่ใช้ DB_NAME ของ server ยกเว้น allow_live_db)
+    """
+    from core import database
+
+    if not db_name:
+        results.add("database", "*", skipped="ต้องระบุ --db-name หรือ BENCH_DB_NAME (database แยกสำหรับ benchmark)")
+        return
+    if db_name == database.DB_NAME and not allow_live_db:
+        results.add("database", "*",
+                    skipped=f"ไม่รันกับ DB_NAME ของ server ({db_name}) - ใช้ database อื่น หรือส่ง --allow-live-db")
+        return
+
+    # ทุก connection ของ pool สร้างด้วย get_conn ซึ่งอ่าน DB_NAME ตอนเชื่อมต่อ
+    database.DB_NAME = db_name
+    try:
+        _create_bench_database(database, db_name)
+        database.init_db()
+    except Exception as e:
+        results.add("database", "*", skipped=f"เชื่อมต่อ MySQL ไม่ได้: {e}")
+        return
+
+    rng = np.random.default_rng(0)
+    prefix = f"bench_{uuid.uuid4().hex[:8]}_"
+    username = prefix + "user"
+    embeddings = _random_unit(rng, repeat + 8)
+    it = itertools.count()
+
+    try:
+        results.add("database", "save_user",
+                    measure(lambda: database.save_user(username, embeddings[next(it) % len(embeddings)]), repeat))
+        results.add("database", "get_user_embedding_count",
+                    measure(lambda: database.get_user_embedding_count(username), repeat))
+        results.add("database", "get_user_embeddings",
+                    measure(lambda: database.get_user_embeddings(username), repeat))
+        # อ่านซ้ำ user เดิม = วัด centroid LRU cache (ไม่ถึง MySQL) - แยกจากกรณีอ่านจาก database จริง
+        results.add("database", "get_user_embedding_cache_hit",
+                    measure(lambda: database.get_user_embedding(username), repeat), cache="lru_hit")
+
+        def read_centroid_uncached():
+            database._centroid_cache.invalidate(username)
+            return database.get_user_embedding(username)
+
+        results.add("database", "get_user_embedding_db_read",
+                    measure(read_centroid_uncached, repeat), cache="miss")
+        results.add("database", "record_attendance",
+                    measure(lambda: database.record_attendance(username, "check_in", 0.9), repeat))
+        results.add("database", "get_last_attendance",
+                    measure(lambda: database.get_last_attendance(username), repeat))
+        results.add("database", "load_all_centroids",
+                    measure(database.load_all_centroids, max(3, repeat // 10)))
+    finally:
+        with database.db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("DELETE FROM users WHERE username LIKE %s", (prefix + "%",))
+            conn.commit()
+            cur.close()
+
+
+def default_image_path() -> str:
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "image.jpeg")
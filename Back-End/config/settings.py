@@ -16,16 +16,184 @@ DB_USER = os.getenv("DB_USER", "face_user")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "face_pass")
 DB_NAME = os.getenv("DB_NAME", "face_db")
 
+# Database Connection Pool
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))                  # connection ที่เก็บไว้ใน pool
+DB_POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW", "10"))  # เปิดเพิ่มชั่วคราวได้เมื่อ pool เต็ม
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))          # อายุสูงสุดของ connection (วินาที)
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))          # เวลารอ connection (วินาที)
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
 # Face Recognition Configuration
-FACE_MODEL_PATH = "models/w600k_mbf.onnx"
-FACE_DETECTION_MODEL_PATH = "models/det_500m.onnx"
+FACE_MODEL_FP32_PATH = "models/w600k_mbf.onnx"
+FACE_DETECTION_MODEL_FP32_PATH = "models/det_500m.onnx"
+
+# Model INT8 (สร้างด้วย python -m scripts.quantize_models) - ใช้กับ EMBEDDING_BACKEND=onnxruntime
+FACE_MODEL_INT8_PATH = "models/w600k_mbf.int8.onnx"
+FACE_DETECTION_MODEL_INT8_PATH = "models/det_500m.int8.onnx"
+USE_QUANTIZED_MODELS = os.getenv("USE_QUANTIZED_MODELS", "false").lower() == "true"
+
+FACE_MODEL_PATH = FACE_MODEL_INT8_PATH if USE_QUANTIZED_MODELS else FACE_MODEL_FP32_PATH
+FACE_DETECTION_MODEL_PATH = FACE_DETECTION_MODEL_INT8_PATH if USE_QUANTIZED_MODELS else FACE_DETECTION_MODEL_FP32_PATH
+
+# จำนวนรูปสูงสุดต่อ forward pass ของ ArcFace (batch inference)
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+
+# โหลดและ warm-up models ตอน startup (/ready ตอบ 200 เมื่อเสร็จ) - false = โหลดตอน request แรก
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "true").lower() == "true"
+
+# database ยังไม่พร้อมตอน startup: ลองโหลด gallery ใหม่เบื้องหลังแบบ backoff (1, 2, 4, ... วินาที) ไม่เกินค่านี้
+GALLERY_LOAD_RETRY_MAX_INTERVAL = float(os.getenv("GALLERY_LOAD_RETRY_MAX_INTERVAL", "30"))
+
+# Backend ของ ArcFace: "onnxruntime" หรือ "opencv" (cv2.dnn - ไว้เทียบ benchmark)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "onnxruntime")
+
+# ONNX Runtime SessionOptions (ใช้กับทั้ง detection และ embedding)
+# ถ้ารันหลาย request พร้อมกัน ควรตั้ง intra-op threads ≈ จำนวน core / concurrency ของ stage
+ORT_INTRA_OP_THREADS = int(os.getenv("ORT_INTRA_OP_THREADS", "0"))     # 0 = ให้ ORT เลือกเอง
+ORT_INTER_OP_THREADS = int(os.getenv("ORT_INTER_OP_THREADS", "0"))     # ใช้เมื่อ execution mode = parallel
+ORT_GRAPH_OPTIMIZATION = os.getenv("ORT_GRAPH_OPTIMIZATION", "all")    # disable / basic / extended / all
+ORT_EXECUTION_MODE = os.getenv("ORT_EXECUTION_MODE", "sequential")     # sequential / parallel
+ORT_ENABLE_MEM_ARENA = os.getenv("ORT_ENABLE_MEM_ARENA", "true").lower() == "true"
+
+# รูปแบบการเก็บ embedding ใน face_embeddings: "float32" (2 KB), "float16" (1 KB), "int8" (516 bytes)
+# แถวเก่ายังอ่านได้ตาม column encoding - แปลงแถวเดิมด้วย scripts/migrate_embeddings.py
+EMBEDDING_STORAGE_ENCODING = os.getenv("EMBEDDING_STORAGE_ENCODING", "float32")
 
 # Verification Threshold
 VERIFY_THRESHOLD = 0.6
 
+# Centroid cache สำหรับ verify (1:1) - ล้างอัตโนมัติเมื่อลงทะเบียนรูปใหม่
+CENTROID_CACHE_SIZE = int(os.getenv("CENTROID_CACHE_SIZE", "10000"))
+CENTROID_CACHE_TTL = float(os.getenv("CENTROID_CACHE_TTL", "300"))  # วินาที (กันค่าเก่าเมื่อรันหลาย worker)
+
+# Upload cache: ไฟล์รูปเดียวกันที่ส่งซ้ำ (retry / check-quality แล้ว recognize) ใช้ผล quality/detection/embedding เดิม
+# จำนวน entry สูงสุด (เก็บเฉพาะใบหน้าที่ crop แล้ว ไม่เก็บรูปเต็ม, 0 = ปิด) และอายุเป็นวินาที
+UPLOAD_CACHE_SIZE = int(os.getenv("UPLOAD_CACHE_SIZE", "256"))
+UPLOAD_CACHE_TTL = float(os.getenv("UPLOAD_CACHE_TTL", "120"))
+
+# /face/register/bulk: จำนวนไฟล์สูงสุดต่อ request (ทุกไฟล์ถูก decode พร้อมกัน)
+BULK_MAX_FILES = int(os.getenv("BULK_MAX_FILES", "50"))
+
+# /face/recognize/burst: จำนวนเฟรมสูงสุดต่อ request, จำนวนเฟรมคุณภาพดีสุดที่นำไป detect/embed
+# หยุดทันทีเมื่อ score ≥ VERIFY_THRESHOLD + BURST_EARLY_EXIT_MARGIN, ไม่งั้นรวม embeddings ของเฟรมที่ผ่าน (BURST_FUSE)
+BURST_MAX_FRAMES = int(os.getenv("BURST_MAX_FRAMES", "8"))
+BURST_CANDIDATES = int(os.getenv("BURST_CANDIDATES", "3"))
+BURST_EARLY_EXIT_MARGIN = float(os.getenv("BURST_EARLY_EXIT_MARGIN", "0.1"))
+BURST_FUSE = os.getenv("BURST_FUSE", "true").lower() == "true"
+
+# Kiosk WebSocket (/face/stream): เฟรมที่ประมวลผลต่อวินาที, อายุสูงสุดของเฟรมก่อนถูกทิ้ง (วินาที)
+# และ cooldown ของ attendance event ของ user เดิมต่อ connection (วินาที)
+KIOSK_PROCESS_FPS = float(os.getenv("KIOSK_PROCESS_FPS", "5"))
+KIOSK_MAX_FRAME_AGE = float(os.getenv("KIOSK_MAX_FRAME_AGE", "1.0"))
+KIOSK_EVENT_COOLDOWN = float(os.getenv("KIOSK_EVENT_COOLDOWN", "10"))
+KIOSK_MAX_FRAME_BYTES = int(os.getenv("KIOSK_MAX_FRAME_BYTES", str(2 * 1024 * 1024)))
+
+# =====================================================
+# Recognition Index (ค้นหา 1:N)
+# =====================================================
+
+# "exact" = scan ทุก user, "ivf" = approximate nearest-neighbour (IVF)
+RECOGNITION_INDEX = os.getenv("RECOGNITION_INDEX", "exact")
+RECOGNITION_INDEX_MIN_USERS = int(os.getenv("RECOGNITION_INDEX_MIN_USERS", "5000"))  # จำนวน user ขั้นต่ำก่อนใช้ IVF
+
+# IVF parameters
+IVF_NLIST = int(os.getenv("IVF_NLIST", "0"))          # จำนวนกลุ่ม (0 = อัตโนมัติ ~sqrt(N))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))        # จำนวนกลุ่มที่ค้นต่อ query (recall/latency knob)
+IVF_TRAIN_ITERATIONS = int(os.getenv("IVF_TRAIN_ITERATIONS", "10"))
+
+# ถ้า candidate ที่ดีที่สุดไม่ผ่าน threshold ให้ scan ทั้งหมดซ้ำ
+# (ผลการตัดสิน match/ไม่ match จะตรงกับ brute force เสมอ)
+# ค้นหาแบบไม่มี threshold จาก probe ที่ไม่ครบทุกแถวก็ scan ซ้ำเช่นกัน
+IVF_EXACT_FALLBACK = os.getenv("IVF_EXACT_FALLBACK", "true").lower() == "true"
+
+# scan ทั้งหมดซ้ำด้วยเมื่อ candidate ที่ดีที่สุดผ่าน threshold ไม่เกิน margin นี้
+# (user นอกกลุ่มที่ค้นอาจ score สูงกว่า - เลี่ยงการบันทึก attendance ผิดคนในช่วงที่ก้ำกึ่ง)
+IVF_EXACT_FALLBACK_MARGIN = float(os.getenv("IVF_EXACT_FALLBACK_MARGIN", "0.1"))
+
+# Shared gallery snapshot (uvicorn --workers N): ทุก worker mmap ไฟล์เดียวกันแทนการถือ gallery คนละชุด
+# ว่าง = ปิด (gallery ใน memory ของแต่ละ process) - RECOGNITION_INDEX=ivf สร้าง index ของ snapshot ต่อ worker
+GALLERY_SNAPSHOT_PATH = os.getenv("GALLERY_SNAPSHOT_PATH", "")
+GALLERY_SNAPSHOT_MAX_AGE = float(os.getenv("GALLERY_SNAPSHOT_MAX_AGE", "3600"))  # วินาทีนับจาก sync กับ MySQL (0 = ไม่หมดอายุ)
+GALLERY_SNAPSHOT_CHECK_INTERVAL = float(os.getenv("GALLERY_SNAPSHOT_CHECK_INTERVAL", "0.5"))  # วินาที ระหว่างการตรวจไฟล์ใหม่
+# การลงทะเบียนต่อท้าย delta segment (<path>.delta) - ครบกี่ records จึงรวมเข้า snapshot ใหม่ทั้งไฟล์
+GALLERY_SNAPSHOT_COMPACT_ROWS = int(os.getenv("GALLERY_SNAPSHOT_COMPACT_ROWS", "10000"))
+
 # Output Directories
 FACES_OUTPUT_DIR = "faces"
 
+# =====================================================
+# Worker Executor (งาน CV/ONNX/DB รันนอก event loop)
+# =====================================================
+
+_CPU_COUNT = os.cpu_count() or 4
+
+# Thread pool สำหรับ OpenCV / ONNX Runtime (ปล่อย GIL) และ MySQL
+WORKER_THREADS = int(os.getenv("WORKER_THREADS", str(_CPU_COUNT * 2)))
+
+# Process pool สำหรับ stage ที่ใช้ CPU (0 = ไม่ใช้, รันใน thread pool แทน)
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "0"))
+
+# จำนวนงานที่รันพร้อมกันได้สูงสุดต่อ stage
+STAGE_CONCURRENCY = {
+    "decode": int(os.getenv("DECODE_CONCURRENCY", str(_CPU_COUNT))),
+    "quality": int(os.getenv("QUALITY_CONCURRENCY", str(_CPU_COUNT))),
+    "detection": int(os.getenv("DETECTION_CONCURRENCY", str(_CPU_COUNT))),
+    "embedding": int(os.getenv("EMBEDDING_CONCURRENCY", str(_CPU_COUNT))),
+    "match": int(os.getenv("MATCH_CONCURRENCY", str(_CPU_COUNT))),
+    "db": int(os.getenv("DB_CONCURRENCY", str(DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW))),
+}
+
+# =====================================================
+# Attendance
+# =====================================================
+
+# Timezone ของเวลาที่ write-behind ประทับให้ attendance (ต้องตรงกับ timezone ของ MySQL เช่น "Asia/Bangkok")
+# จำเป็นเมื่อ ATTENDANCE_WRITE_BEHIND=true - แบบปกติใช้เวลาของ MySQL (NOW()) เหมือนเดิม
+APP_TIMEZONE = os.getenv("APP_TIMEZONE", "")
+
+# Write-behind: ตอบกลับทันทีแล้วค่อยเขียน attendance ลง MySQL เป็น batch
+# แต่ละ process เขียน spill file ของตัวเอง (<ATTENDANCE_SPILL_PATH>.<pid>)
+ATTENDANCE_WRITE_BEHIND = os.getenv("ATTENDANCE_WRITE_BEHIND", "false").lower() == "true"
+ATTENDANCE_SPILL_PATH = os.getenv("ATTENDANCE_SPILL_PATH", "data/attendance_spill.jsonl")
+ATTENDANCE_FLUSH_INTERVAL = float(os.getenv("ATTENDANCE_FLUSH_INTERVAL", "1.0"))  # วินาที
+ATTENDANCE_FLUSH_BATCH = int(os.getenv("ATTENDANCE_FLUSH_BATCH", "500"))
+ATTENDANCE_SPILL_FSYNC = os.getenv("ATTENDANCE_SPILL_FSYNC", "false").lower() == "true"
+# batch ที่ MySQL ปฏิเสธ (ไม่ใช่ connection error) ครบกี่ครั้งจึงย้าย record ที่เสียไป dead-letter file
+ATTENDANCE_MAX_RETRIES = int(os.getenv("ATTENDANCE_MAX_RETRIES", "5"))
+ATTENDANCE_DEAD_LETTER_PATH = os.getenv("ATTENDANCE_DEAD_LETTER_PATH", "data/attendance_dead.jsonl")
+
+# กันบันทึกซ้ำเมื่อกด check-in/check-out หลายครั้ง: ภายใน window (วินาที) หลัง verify/matching ผ่าน
+# คืน record เดิมแทนการ insert ใหม่ (0 = ปิด, default)
+ATTENDANCE_DEDUP_WINDOW = float(os.getenv("ATTENDANCE_DEDUP_WINDOW", "0"))
+ATTENDANCE_DEDUP_BACKEND = os.getenv("ATTENDANCE_DEDUP_BACKEND", "memory")  # memory / redis (ใช้ร่วมกันทุก worker)
+ATTENDANCE_DEDUP_MAXSIZE = int(os.getenv("ATTENDANCE_DEDUP_MAXSIZE", "10000"))
+ATTENDANCE_DEDUP_REDIS_URL = os.getenv("ATTENDANCE_DEDUP_REDIS_URL", "redis://localhost:6379/0")
+
+# เวลาเริ่มงานของแต่ละช่วง (time_period) สำหรับรายงานการมาสาย - รูปแบบ "period=HH:MM,..."
+WORK_START_TIMES = {
+    period.strip(): start.strip()
+    for period, start in (
+        item.split("=", 1) for item in os.getenv("WORK_START_TIMES", "morning=08:30,afternoon=13:00").split(",") if "=" in item
+    )
+}
+LATE_GRACE_MINUTES = int(os.getenv("LATE_GRACE_MINUTES", "0"))  # มาสายไม่เกินกี่นาทีไม่นับว่าสาย
+
+# จำนวน users ต่อหน้าของรายงาน (keyset pagination)
+REPORT_PAGE_SIZE = int(os.getenv("REPORT_PAGE_SIZE", "50"))
+REPORT_MAX_PAGE_SIZE = int(os.getenv("REPORT_MAX_PAGE_SIZE", "500"))
+
+# จำนวนแถวที่อ่านจาก MySQL ต่อครั้งตอน stream export
+EXPORT_FETCH_SIZE = int(os.getenv("EXPORT_FETCH_SIZE", "2000"))
+
+# =====================================================
+# Image Decode
+# =====================================================
+
+# ด้านยาวสูงสุดของรูปหลัง decode (working size) - รูปจากกล้องความละเอียดสูงจะถูกย่อ
+# ด้วย reduced-resolution decoding (IMREAD_REDUCED_*) ก่อนเข้า quality/detection
+# bbox ใน response ยังเป็นพิกัดของรูปต้นฉบับ (0 = ไม่ย่อ)
+IMAGE_WORKING_SIZE = int(os.getenv("IMAGE_WORKING_SIZE", "1280"))
+
 # =====================================================
 # Image Quality Thresholds (OpenCV Heuristics)
 # =====================================================
@@ -39,9 +207,42 @@ BRIGHTNESS_MAX = 220     # สว่างเกินไปถ้าสูง
 # ค่าสูง = คมชัด, ค่าต่ำ = เบลอ
 BLUR_THRESHOLD = 30      # เบลอเกินไปถ้าต่ำกว่านี้
 
+# Contrast (standard deviation ของ grayscale)
+CONTRAST_MIN = 30        # contrast ต่ำเกินไปถ้าต่ำกว่านี้
+
+# ขนาด (ด้านยาว) ของรูปที่ใช้วัดคุณภาพ - ย่อก่อนคำนวณเพื่อลดงาน (0 = ไม่ย่อ, default)
+# การย่อทำให้ Laplacian variance (blur) และ contrast เปลี่ยน - ถ้าตั้งค่านี้ต้องปรับ BLUR_THRESHOLD /
+# CONTRAST_MIN ใหม่กับรูปจริงที่ติด label ผ่าน/ไม่ผ่านแล้วที่ขนาดเดียวกัน
+QUALITY_ANALYSIS_SIZE = int(os.getenv("QUALITY_ANALYSIS_SIZE", "0"))
+
+# บริเวณที่ใช้วัดคุณภาพ: "frame" = ทั้งรูป, "face" = เฉพาะใบหน้าที่ detect ได้
+# (แบบ face จะ detect ใบหน้าก่อน quality check)
+QUALITY_REGION = os.getenv("QUALITY_REGION", "frame")
+
 # Face Detection
 FACE_DETECTION_CONFIDENCE = 0.5  # ค่า confidence ต่ำสุดสำหรับ face detection
 FACE_CROP_MARGIN = 0.2           # เพิ่มขอบ 20% รอบใบหน้า
+FACE_DETECTION_INPUT_SIZE = int(os.getenv("FACE_DETECTION_INPUT_SIZE", "640"))      # ขนาด input ของ SCRFD
+FACE_DETECTION_NMS_THRESHOLD = float(os.getenv("FACE_DETECTION_NMS_THRESHOLD", "0.4"))
+
+# ลำดับ detector: ตัวแรกเป็นหลัก ตัวถัดไปเป็น fallback ("haar", "onnx")
+# หมายเหตุ: embeddings ที่ลงทะเบียนไว้แล้วถูก crop ด้วย Haar ถ้าเปลี่ยนเป็น onnx ก่อน
+# ควรลงทะเบียนรูปใหม่ เพราะกรอบใบหน้าของ SCRFD แคบกว่า
+FACE_DETECTOR_ORDER = [
+    name.strip() for name in os.getenv("FACE_DETECTOR_ORDER", "haar,onnx").split(",") if name.strip()
+]
+
+# Face tracking ของ kiosk stream: หลัง detect ทั้งเฟรม เฟรมถัดไปค้นหาเฉพาะ ROI รอบใบหน้าเดิม
+# ROI ขยายออกแต่ละด้าน FACE_TRACK_ROI_PADDING เท่าของขนาดใบหน้า และใช้ input SCRFD ขนาด FACE_TRACK_INPUT_SIZE (หาร 32 ลงตัว)
+# detect ทั้งเฟรมใหม่เมื่อ track หลุดหรือทุก FACE_TRACK_REDETECT_INTERVAL เฟรม
+# embed ใหม่ภายใน track เดิมเมื่อความคมชัดของใบหน้าเพิ่มขึ้น FACE_TRACK_REEMBED_GAIN เท่า
+# (และทุกครั้งที่ detect ทั้งเฟรมหรือยังไม่ match ใคร)
+FACE_TRACKING = os.getenv("FACE_TRACKING", "true").lower() == "true"
+FACE_TRACK_REDETECT_INTERVAL = int(os.getenv("FACE_TRACK_REDETECT_INTERVAL", "10"))
+FACE_TRACK_ROI_PADDING = float(os.getenv("FACE_TRACK_ROI_PADDING", "0.5"))
+FACE_TRACK_INPUT_SIZE = int(os.getenv("FACE_TRACK_INPUT_SIZE", "192"))
+FACE_TRACK_MIN_IOU = float(os.getenv("FACE_TRACK_MIN_IOU", "0.3"))
+FACE_TRACK_REEMBED_GAIN = float(os.getenv("FACE_TRACK_REEMBED_GAIN", "1.25"))
 
 # =====================================================
 # Location Settings (GPS)
@@ -53,3 +254,10 @@ OFFICE_LONGITUDE = float(os.getenv("OFFICE_LONGITUDE", "100.499083333"))
 
 # ระยะทางสูงสุดที่อนุญาต (เมตร)
 MAX_DISTANCE_METERS = int(os.getenv("MAX_DISTANCE_METERS", "200"))
+
+# หลายสาขา: สาขาในตาราง sites (ถ้ายังไม่มีสาขา ใช้ OFFICE_* / MAX_DISTANCE_METERS เป็นสาขาเดียว)
+# ขนาดช่องของ grid index (เมตร, 0 = เท่ารัศมีที่ใหญ่ที่สุดของสาขา)
+SITE_GRID_CELL_METERS = float(os.getenv("SITE_GRID_CELL_METERS", "0"))
+
+# โหลดสาขาจาก database ใหม่ทุกกี่วินาที (ให้ทุก worker เห็นสาขาที่เพิ่ม/ปิด, 0 = โหลดตอน startup เท่านั้น)
+SITE_REFRESH_INTERVAL = float(os.getenv("SITE_REFRESH_INTERVAL", "60"))
@@ -1,11 +1,15 @@
 # Core modules
-from .database import get_conn, save_user, load_all_users, get_user_embedding
+from .database import get_conn, save_user, load_all_users, get_user_embedding, get_user_centroid
 from .face_embedding import face_to_embedding
+from .gallery import get_gallery, load_gallery
 
 __all__ = [
     "get_conn",
     "save_user", 
     "load_all_users",
     "get_user_embedding",
-    "face_to_embedding"
+    "get_user_centroid",
+    "face_to_embedding",
+    "get_gallery",
+    "load_gallery"
 ]
@@ -0,0 +1,163 @@
+"""
+ANN Index Module
+Approximate nearest-neighbour index (IVF) สำหรับค้นหา centroid ใน gallery
+เขียนด้วย NumPy ล้วน ไม่ต้องใช้ native service
+
+หลักการ (IVF - Inverted File):
+- แบ่ง centroid ของ users ออกเป็น nlist กลุ่มด้วย spherical k-means
+- ตอนค้นหา เทียบ query กับ coarse centroid ก่อน แล้วเลือก nprobe กลุ่มที่ใกล้สุด
+- คืน row ของ users ในกลุ่มเหล่านั้นเป็น candidates ให้ gallery rerank แบบ exact
+"""
+
+import numpy as np
+from typing import List, Optional
+
+
+class ExactIndex:
+    """Index แบบ brute-force (ไม่ตัด candidate) ใช้เป็นค่า default"""
+
+    name = "exact"
+    trained_size = 0
+
+    @property
+    def trained(self) -> bool:
+        return False
+
+    def build(self, vectors: np.ndarray):
+        pass
+
+    def add(self, row: int, vector: np.ndarray):
+        pass
+
+    def candidates(self, query: np.ndarray) -> Optional[np.ndarray]:
+        # None = ให้ gallery scan ทุกแถว
+        return None
+
+
+class IVFIndex:
+    """
+    Inverted-file index บน NumPy
+
+    Args:
+        nlist: จำนวนกลุ่ม (0 = อัตโนมัติ ~sqrt(N))
+        nprobe: จำนวนกลุ่มที่ค้นหาต่อ query (ยิ่งมาก recall ยิ่งสูง แต่ช้าลง)
+        train_iterations: จำนวนรอบของ k-means
+        train_sample: จำนวน vector สูงสุดต่อกลุ่มที่ใช้ train
+    """
+
+    name = "ivf"
+
+    def __init__(self, nlist: int = 0, nprobe: int = 8, train_iterations: int = 10,
+                 train_sample: int = 64, seed: int = 0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_iterations = train_iterations
+        self.train_sample = train_sample
+        self._rng = np.random.default_rng(seed)
+        self._centroids: Optional[np.ndarray] = None
+        self._lists: List[List[int]] = []
+        self._assign: List[int] = []
+        self.trained_size = 0
+
+    @property
+    def trained(self) -> bool:
+        return self._centroids is not None
+
+    def _assign_rows(self, vectors: np.ndarray, chunk: int = 65536) -> np.ndarray:
+        """หา coarse centroid ที่ใกล้ที่สุดของแต่ละ vector (ทำเป็น chunk เพื่อคุม memory)"""
+        out = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), chunk):
+            block = vectors[start:start + chunk]
+            out[start:start + chunk] = np.argmax(block @ self._centroids.T, axis=1)
+        return out
+
+    def _train(self, vectors: np.ndarray, nlist: int) -> np.ndarray:
+        """Spherical k-means (cosine) บน sample ของ vectors"""
+        n = len(vectors)
+        sample_size = min(n, nlist * self.train_sample)
+        sample_rows = self._rng.choice(n, size=sample_size, replace=False)
+        sample = vectors[sample_rows]
+
+        centroids = sample[self._rng.choice(sample_size, size=nlist, replace=False)].copy()
+        for _ in range(self.train_iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+
+            # รวม vector ของแต่ละกลุ่มด้วย sort + reduceat (เร็วกว่า loop)
+            order = np.argsort(assign, kind="stable")
+            sorted_assign = assign[order]
+            starts = np.flatnonzero(np.r_[True, sorted_assign[1:] != sorted_assign[:-1]])
+            sums = np.add.reduceat(sample[order], starts, axis=0)
+
+            new_centroids = centroids.copy()
+            new_centroids[sorted_assign[starts]] = sums
+
+            # กลุ่มที่ว่าง: สุ่ม vector ใหม่มาเป็น seed
+            empty = np.setdiff1d(np.arange(nlist), sorted_assign[starts])
+            if len(empty):
+                new_centroids[empty] = sample[self._rng.choice(sample_size, size=len(empty))]
+
+            norms = np.linalg.norm(new_centroids, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = (new_centroids / norms).astype(np.float32)
+        return centroids
+
+    def build(self, vectors: np.ndarray):
+        """Train coarse centroids แล้วแบ่ง vectors ทั้งหมดลง inverted lists"""
+        n = len(vectors)
+        if n == 0:
+            self._centroids = None
+            self._lists = []
+            self._assign = []
+            self.trained_size = 0
+            return
+
+        nlist = self.nlist or int(np.sqrt(n))
+        nlist = max(1, min(nlist, n))
+        self._centroids = self._train(vectors, nlist)
+
+        assign = self._assign_rows(vectors)
+        self._assign = assign.tolist()
+        self._lists = [[] for _ in range(nlist)]
+        for row, list_id in enumerate(self._assign):
+            self._lists[list_id].append(row)
+        self.trained_size = n
+
+    def add(self, row: int, vector: np.ndarray):
+        """เพิ่ม/ย้าย row (เมื่อ centroid ของ user เปลี่ยน) โดยไม่ต้อง train ใหม่"""
+        if self._centroids is None:
+            return
+        list_id = int(np.argmax(self._centroids @ vector))
+        if row < len(self._assign):
+            old = self._assign[row]
+            if old == list_id:
+                return
+            self._lists[old].remove(row)
+            self._assign[row] = list_id
+        else:
+            self._assign.append(list_id)
+        self._lists[list_id].append(row)
+
+    def candidates(self, query: np.ndarray) -> Optional[np.ndarray]:
+        """คืน row ของ users ใน nprobe กลุ่มที่ใกล้ query ที่สุด"""
+        if self._centroids is None:
+            return None
+        coarse = self._centroids @ query
+        nprobe = min(self.nprobe, len(coarse))
+        if nprobe >= len(coarse):
+            probe = np.arange(len(coarse))
+        else:
+            probe = np.argpartition(-coarse, nprobe - 1)[:nprobe]
+
+        rows = [self._lists[i] for i in probe if self._lists[i]]
+        if not rows:
+            return np.empty(0, dtype=np.int64)
+        return np.fromiter((r for lst in rows for r in lst), dtype=np.int64)
+
+
+def create_index(kind: str, **kwargs):
+    """สร้าง index ตามชื่อ ("exact" หรือ "ivf") - kwargs ใช้กับ IVF เท่านั้น"""
+    if kind == "ivf":
+        return IVFIndex(**kwargs)
+    if kind == "exact":
+        return ExactIndex()
+    raise ValueError(f"ไม่รู้จัก index type: {kind}")
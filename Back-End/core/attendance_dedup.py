@@ -0,0 +1,134 @@
+"""
+Attendance Dedup Module
+จำ attendance ล่าสุดของแต่ละ (username, action) ไว้ช่วงสั้นๆ (ATTENDANCE_DEDUP_WINDOW)
+เมื่อพนักงานกด check-in ซ้ำหลายครั้ง จะคืน record เดิมแทนการรัน detect/embed และ insert ซ้ำ
+
+Backends:
+- memory: LRU cache ใน process (ค่าเริ่มต้น)
+- redis: ใช้ร่วมกันทุก worker / ทุก instance (ต้องติดตั้ง redis เพิ่ม: pip install redis)
+"""
+
+import json
+import math
+from typing import Dict, Optional
+from config.settings import (
+    ATTENDANCE_DEDUP_WINDOW,
+    ATTENDANCE_DEDUP_BACKEND,
+    ATTENDANCE_DEDUP_MAXSIZE,
+    ATTENDANCE_DEDUP_REDIS_URL,
+)
+from .cache import LRUCache
+
+
+class MemoryDedupBackend:
+    """เก็บใน LRU cache ของ process (entry หมดอายุตาม window)"""
+
+    def __init__(self, window: float, maxsize: int):
+        self._cache = LRUCache(maxsize=maxsize, ttl=window)
+
+    def get(self, key: str) -> Optional[Dict]:
+        return self._cache.get(key)
+
+    def put(self, key: str, record: Dict):
+        self._cache.put(key, record)
+
+    def stats(self) -> Dict:
+        return self._cache.stats()
+
+
+class RedisDedupBackend:
+    """เก็บใน Redis (SET ... EX window) - error ของ Redis ถือว่าไม่พบ ไม่ทำให้ check-in ล้ม"""
+
+    KEY_PREFIX = "face:attendance:recent:"
+
+    def __init__(self, window: float, url: str):
+        import redis
+
+        self._window = max(1, math.ceil(window))
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def get(self, key: str) -> Optional[Dict]:
+        try:
+            raw = self._client.get(self.KEY_PREFIX + key)
+        except Exception as e:
+            self.errors += 1
+            print(f"Attendance dedup (redis) error: {e}")
+            return None
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(raw)
+
+    def put(self, key: str, record: Dict):
+        try:
+            self._client.set(self.KEY_PREFIX + key, json.dumps(record, ensure_ascii=False), ex=self._window)
+        except Exception as e:
+            self.errors += 1
+            print(f"Attendance dedup (redis) error: {e}")
+
+    def stats(self) -> Dict:
+        return {"hits": self.hits, "misses": self.misses, "errors": self.errors}
+
+
+def _create_backend():
+    if ATTENDANCE_DEDUP_WINDOW <= 0:
+        return None
+    if ATTENDANCE_DEDUP_BACKEND == "redis":
+        return RedisDedupBackend(ATTENDANCE_DEDUP_WINDOW, ATTENDANCE_DEDUP_REDIS_URL)
+    if ATTENDANCE_DEDUP_BACKEND == "memory":
+        return MemoryDedupBackend(ATTENDANCE_DEDUP_WINDOW, ATTENDANCE_DEDUP_MAXSIZE)
+    raise ValueError(f"ไม่รู้จัก ATTENDANCE_DEDUP_BACKEND: {ATTENDANCE_DEDUP_BACKEND} (ใช้ได้: memory, redis)")
+
+
+_backend = _create_backend()
+
+
+def _key(username: str, action: str) -> str:
+    return f"{action}:{username}"
+
+
+def dedup_enabled() -> bool:
+    return _backend is not None
+
+
+def find_recent_attendance(username: str, action: str) -> Optional[Dict]:
+    """
+    คืน attendance ของ (username, action) ที่บันทึกภายใน window (None ถ้าไม่มีหรือปิดใช้งาน)
+
+    Returns:
+        dict: username, action, score, timestamp (string), time_period, time_period_thai, site_id
+    """
+    if _backend is None:
+        return None
+    return _backend.get(_key(username, action))
+
+
+def attendance_summary(record: Dict, score: float) -> Dict:
+    """แปลง record จาก record_attendance เป็น dict ที่เก็บใน cache ได้ (timestamp เป็น string)"""
+    return {
+        "username": record["username"],
+        "action": record["action"],
+        "score": float(score),
+        "timestamp": record["timestamp"].strftime("%Y-%m-%d %H:%M:%S"),
+        "time_period": record.get("time_period"),
+        "time_period_thai": record.get("time_period_thai", ""),
+        "site_id": record.get("site_id"),
+    }
+
+
+def remember_attendance(summary: Dict):
+    """จำ attendance ที่เพิ่งบันทึก (ผลจาก attendance_summary)"""
+    if _backend is None:
+        return
+    _backend.put(_key(summary["username"], summary["action"]), summary)
+
+
+def get_dedup_stats() -> Optional[Dict]:
+    """สถิติของ dedup cache (None ถ้าปิดใช้งาน)"""
+    if _backend is None:
+        return None
+    return {"backend": ATTENDANCE_DEDUP_BACKEND, "window": ATTENDANCE_DEDUP_WINDOW, **_backend.stats()}
@@ -0,0 +1,110 @@
+"""
+Cache Module
+LRU cache แบบ thread-safe (จำกัดจำนวน + อายุ) พร้อมนับ hit/miss
+และกันค่าเก่าที่อ่านมาก่อน invalidate ถูก put กลับเข้า cache (generation)
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class LRUCache:
+    """
+    LRU cache จำกัดจำนวน entry และอายุ (TTL)
+
+    Args:
+        maxsize: จำนวน entry สูงสุด (เกินแล้วลบตัวที่ใช้ล่าสุดนานที่สุด)
+        ttl: อายุของ entry เป็นวินาที (0 = ไม่หมดอายุ)
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        # generation ตอนที่แต่ละ key ถูก invalidate ล่าสุด (จำกัดจำนวนเท่า maxsize)
+        self._invalidated: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._invalidated_floor = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            value, expires_at = item
+            if expires_at and time.monotonic() > expires_at:
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def generation(self) -> int:
+        """generation ปัจจุบัน - อ่านก่อนเริ่มโหลดค่าจากแหล่งข้อมูล แล้วส่งให้ put"""
+        with self._lock:
+            return self._generation
+
+    def _invalidated_since_locked(self, key: Hashable, generation: int) -> bool:
+        stamp = self._invalidated.get(key)
+        if stamp is None:
+            # ประวัติของ key ถูกลบไปแล้ว - ถือว่าเก่าถ้าอ่านมาก่อน invalidate ที่ลบออกล่าสุด
+            return generation < self._invalidated_floor
+        return stamp > generation
+
+    def put(self, key: Hashable, value: Any, generation: Optional[int] = None):
+        """
+        เก็บค่าลง cache
+
+        Args:
+            generation: ผลจาก generation() ก่อนอ่านค่า - ถ้า key ถูก invalidate หลังจากนั้น
+                        ค่านี้อาจเก่าแล้ว จึงไม่เก็บ
+        """
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else 0
+        with self._lock:
+            if generation is not None and self._invalidated_since_locked(key, generation):
+                return
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.pop(key, None)
+            return item[0] if item else None
+
+    def invalidate(self, key: Hashable):
+        """ลบ key และจำ generation ไว้ (put ของค่าที่อ่านมาก่อนหน้านี้จะถูกข้าม)"""
+        with self._lock:
+            self._data.pop(key, None)
+            self._generation += 1
+            self._invalidated[key] = self._generation
+            self._invalidated.move_to_end(key)
+            while len(self._invalidated) > max(self.maxsize, 1):
+                _, stamp = self._invalidated.popitem(last=False)
+                self._invalidated_floor = stamp
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
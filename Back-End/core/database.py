@@ -3,13 +3,32 @@ Database Module
 จัดการการเชื่อมต่อและ query ฐานข้อมูล
 """
 
+import threading
+import uuid
+from typing import Optional
+from datetime import datetime
 import mysql.connector
 import numpy as np
-from config.settings import DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME
+from config.settings import (
+    DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME,
+    DB_POOL_SIZE, DB_POOL_MAX_OVERFLOW, DB_POOL_RECYCLE, DB_POOL_TIMEOUT, DB_POOL_PRE_PING,
+    CENTROID_CACHE_SIZE, CENTROID_CACHE_TTL,
+    EMBEDDING_STORAGE_ENCODING,
+    APP_TIMEZONE,
+    ATTENDANCE_WRITE_BEHIND, ATTENDANCE_SPILL_PATH, ATTENDANCE_FLUSH_INTERVAL,
+    ATTENDANCE_FLUSH_BATCH, ATTENDANCE_SPILL_FSYNC,
+    ATTENDANCE_MAX_RETRIES, ATTENDANCE_DEAD_LETTER_PATH,
+)
+from .cache import LRUCache
+from .db_pool import ConnectionPool, PoolTimeoutError
+from .embedding_codec import encode_embedding, decode_embedding
+from .write_behind import WriteBehindQueue
+from .gallery import update_gallery
+from .metrics import DB_POOL_CONNECTIONS, timed_db
 
 
 def get_conn():
-    """สร้าง connection ไปยัง MySQL database"""
+    """สร้าง connection ใหม่ไปยัง MySQL database (ไม่ผ่าน pool)"""
     return mysql.connector.connect(
         host=DB_HOST,
         port=DB_PORT,
@@ -19,165 +38,508 @@ def get_conn():
     )
 
 
+# ==================================================
+# Connection pool (สร้างครั้งเดียว ใช้ร่วมกันทุกฟังก์ชัน)
+# ==================================================
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """คืน connection pool ของ process (สร้างตอนใช้งานครั้งแรก)"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    get_conn,
+                    size=DB_POOL_SIZE,
+                    max_overflow=DB_POOL_MAX_OVERFLOW,
+                    recycle=DB_POOL_RECYCLE,
+                    timeout=DB_POOL_TIMEOUT,
+                    pre_ping=DB_POOL_PRE_PING,
+                )
+    return _pool
+
+
+def db_connection():
+    """
+    ยืม connection จาก pool แบบ context manager (คืนอัตโนมัติเสมอ)
+
+    Usage:
+        with db_connection() as conn:
+            cur = conn.cursor()
+            ...
+    """
+    return get_pool().connection()
+
+
+def get_pool_stats() -> dict:
+    """สถิติของ connection pool (in use, waiting, created ฯลฯ)"""
+    return get_pool().stats()
+
+
+def _pool_stat(state: str) -> float:
+    # function gauge ถูกเรียกตอน scrape - ถ้าอ่านไม่ได้ (เช่น pool ยังสร้างไม่ได้) ให้เป็น NaN ไม่ให้ /metrics ล้ม
+    try:
+        return float(get_pool_stats()[state])
+    except Exception:
+        return float("nan")
+
+
+for _state in ("open", "idle", "in_use", "waiting"):
+    DB_POOL_CONNECTIONS.labels(state=_state).set_function(lambda state=_state: _pool_stat(state))
+
+
+@timed_db
 def init_db():
     """สร้างตารางถ้ายังไม่มี"""
-    conn = get_conn()
-    cur = conn.cursor()
+    with db_connection() as conn:
+        cur = conn.cursor()
     
-    # ตาราง users - เก็บข้อมูล user
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            username VARCHAR(255) NOT NULL UNIQUE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
+        # ตาราง users - เก็บข้อมูล user
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                username VARCHAR(255) NOT NULL UNIQUE,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
     
-    # ตาราง face_embeddings - เก็บ embedding หลายรูปต่อ user
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS face_embeddings (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            user_id INT NOT NULL,
-            embedding BLOB NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-        )
-    """)
+        # ตาราง face_embeddings - เก็บ embedding หลายรูปต่อ user
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS face_embeddings (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                user_id INT NOT NULL,
+                embedding BLOB NOT NULL,
+                encoding ENUM('float32', 'float16', 'int8') NOT NULL DEFAULT 'float32',
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+            )
+        """)
     
-    # ตาราง attendance - เก็บ check-in/check-out
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS attendance (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            user_id INT NOT NULL,
-            action ENUM('check_in', 'check_out') NOT NULL,
-            similarity_score FLOAT NOT NULL,
-            time_period VARCHAR(20) DEFAULT NULL,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-        )
-    """)
+        # ตาราง attendance - เก็บ check-in/check-out
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS attendance (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                user_id INT NOT NULL,
+                action ENUM('check_in', 'check_out') NOT NULL,
+                similarity_score FLOAT NOT NULL,
+                time_period VARCHAR(20) DEFAULT NULL,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                entry_id CHAR(32) DEFAULT NULL UNIQUE,
+                site_id INT DEFAULT NULL,
+                INDEX idx_attendance_user_time (user_id, timestamp),
+                INDEX idx_attendance_time (timestamp),
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+            )
+        """)
     
-    # เพิ่ม column time_period ถ้ายังไม่มี (สำหรับ database เก่า)
-    try:
+        # ตาราง sites - สาขา/จุดที่อนุญาตให้ check-in (พิกัดศูนย์กลาง + รัศมี)
         cur.execute("""
-            ALTER TABLE attendance ADD COLUMN time_period VARCHAR(20) DEFAULT NULL
+            CREATE TABLE IF NOT EXISTS sites (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                name VARCHAR(255) NOT NULL,
+                latitude DOUBLE NOT NULL,
+                longitude DOUBLE NOT NULL,
+                radius_meters INT NOT NULL DEFAULT 200,
+                active TINYINT(1) NOT NULL DEFAULT 1,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
         """)
-    except:
-        pass  # column มีอยู่แล้ว
     
-    conn.commit()
-    cur.close()
-    conn.close()
+        # ตาราง user_centroids - centroid (normalize แล้ว) + ผลรวม embedding ต่อ user
+        # ใช้ verify ด้วยการอ่านแถวเดียว แทนการเฉลี่ยทุก embedding ทุกครั้ง
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS user_centroids (
+                user_id INT PRIMARY KEY,
+                centroid BLOB NOT NULL,
+                embedding_sum BLOB NOT NULL,
+                embedding_count INT NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+            )
+        """)
+    
+        # เพิ่ม column time_period ถ้ายังไม่มี (สำหรับ database เก่า)
+        try:
+            cur.execute("""
+                ALTER TABLE attendance ADD COLUMN time_period VARCHAR(20) DEFAULT NULL
+            """)
+        except:
+            pass  # column มีอยู่แล้ว
+    
+        # เพิ่ม column entry_id ถ้ายังไม่มี (กันบันทึกซ้ำตอน replay write-behind)
+        try:
+            cur.execute("""
+                ALTER TABLE attendance ADD COLUMN entry_id CHAR(32) DEFAULT NULL UNIQUE
+            """)
+        except:
+            pass  # column มีอยู่แล้ว
+    
+        # เพิ่ม column site_id ถ้ายังไม่มี (สาขาที่ check-in, NULL = ที่ทำงานจาก settings)
+        try:
+            cur.execute("""
+                ALTER TABLE attendance ADD COLUMN site_id INT DEFAULT NULL
+            """)
+        except:
+            pass  # column มีอยู่แล้ว
+    
+        # เพิ่ม index ของ attendance ถ้ายังไม่มี (สำหรับ database เก่า)
+        # (user_id, timestamp): attendance ล่าสุดของ user และรายงานต่อ user, (timestamp): กรองตามช่วงวันที่
+        for index_name, columns in (
+            ("idx_attendance_user_time", "user_id, timestamp"),
+            ("idx_attendance_time", "timestamp"),
+        ):
+            try:
+                cur.execute(f"ALTER TABLE attendance ADD INDEX {index_name} ({columns})")
+            except:
+                pass  # index มีอยู่แล้ว
+    
+        # เพิ่ม column encoding ถ้ายังไม่มี (แถวเดิมเป็น float32)
+        try:
+            cur.execute("""
+                ALTER TABLE face_embeddings
+                ADD COLUMN encoding ENUM('float32', 'float16', 'int8') NOT NULL DEFAULT 'float32' AFTER embedding
+            """)
+        except:
+            pass  # column มีอยู่แล้ว
+    
+        # คำนวณ centroid ให้ users เก่าที่ยังไม่มี (สำหรับ database เก่า)
+        cur.execute("""
+            SELECT DISTINCT fe.user_id FROM face_embeddings fe
+            LEFT JOIN user_centroids c ON c.user_id = fe.user_id
+            WHERE c.user_id IS NULL
+        """)
+        for (user_id,) in cur.fetchall():
+            _recompute_centroid(cur, user_id)
+    
+        conn.commit()
+        cur.close()
 
 
+# ==================================================
+# Per-user centroid
+# ==================================================
+_centroid_cache = LRUCache(maxsize=CENTROID_CACHE_SIZE, ttl=CENTROID_CACHE_TTL)
+
+
+def _write_centroid(cur, user_id: int, embedding_sum: np.ndarray, count: int) -> np.ndarray:
+    """บันทึกผลรวม embedding และ centroid ที่ normalize แล้วของ user"""
+    embedding_sum = embedding_sum.astype(np.float32)
+    norm = np.linalg.norm(embedding_sum)
+    # ผลรวมเป็นศูนย์ normalize ไม่ได้ (จะได้ NaN) - เก็บผลรวมดิบไว้แทน (score 0 กับทุก query)
+    centroid = embedding_sum / norm if norm > 0 else embedding_sum
+    cur.execute("""
+        INSERT INTO user_centroids (user_id, centroid, embedding_sum, embedding_count)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            centroid = VALUES(centroid),
+            embedding_sum = VALUES(embedding_sum),
+            embedding_count = VALUES(embedding_count)
+    """, (user_id, centroid.tobytes(), embedding_sum.tobytes(), count))
+    return embedding_sum
+
+
+def _recompute_centroid(cur, user_id: int) -> np.ndarray:
+    """คำนวณ centroid ใหม่จากทุก embedding ของ user (ใช้ตอน backfill)"""
+    cur.execute("SELECT embedding, encoding FROM face_embeddings WHERE user_id = %s FOR UPDATE", (user_id,))
+    embeddings = [decode_embedding(blob, encoding) for blob, encoding in cur.fetchall()]
+    return _write_centroid(cur, user_id, np.sum(embeddings, axis=0), len(embeddings))
+
+
+def _add_to_centroid(cur, user_id: int, new_embeddings) -> np.ndarray:
+    """
+    เพิ่ม embeddings ใหม่เข้า centroid ของ user (ต้องเรียกหลัง insert face_embeddings
+    ใน transaction เดียวกัน)
+
+    Returns:
+        np.ndarray: ผลรวม embedding ใหม่ของ user
+    """
+    cur.execute(
+        "SELECT embedding_sum, embedding_count FROM user_centroids WHERE user_id = %s FOR UPDATE",
+        (user_id,)
+    )
+    row = cur.fetchone()
+    
+    if row is None:
+        # ยังไม่มี centroid - คำนวณจากทุก embedding (รวมตัวที่เพิ่ง insert)
+        return _recompute_centroid(cur, user_id)
+    
+    embedding_sum = np.frombuffer(row[0], dtype=np.float32) + np.sum(new_embeddings, axis=0)
+    return _write_centroid(cur, user_id, embedding_sum, row[1] + len(new_embeddings))
+
+
+@timed_db
 def save_user(username: str, embedding: np.ndarray):
     """
     บันทึก user และ face embedding ลง database
     ถ้า user มีอยู่แล้ว จะเพิ่ม embedding ใหม่
     ถ้า user ยังไม่มี จะสร้าง user ใหม่พร้อม embedding
     """
-    emb_blob = embedding.astype(np.float32).tobytes()
+    emb_blob = encode_embedding(embedding, EMBEDDING_STORAGE_ENCODING)
 
-    conn = get_conn()
-    cur = conn.cursor()
+    with db_connection() as conn:
+        cur = conn.cursor()
 
-    # ตรวจสอบว่า user มีอยู่แล้วหรือไม่
-    cur.execute("SELECT id FROM users WHERE username = %s", (username,))
-    row = cur.fetchone()
-    
-    if row is None:
-        # สร้าง user ใหม่
-        cur.execute("INSERT INTO users (username) VALUES (%s)", (username,))
-        user_id = cur.lastrowid
-    else:
-        user_id = row[0]
-    
-    # เพิ่ม embedding ใหม่
-    cur.execute(
-        "INSERT INTO face_embeddings (user_id, embedding) VALUES (%s, %s)",
-        (user_id, emb_blob)
-    )
+        # ตรวจสอบว่า user มีอยู่แล้วหรือไม่
+        cur.execute("SELECT id FROM users WHERE username = %s", (username,))
+        row = cur.fetchone()
+        
+        if row is None:
+            # สร้าง user ใหม่
+            cur.execute("INSERT INTO users (username) VALUES (%s)", (username,))
+            user_id = cur.lastrowid
+        else:
+            user_id = row[0]
+        
+        # เพิ่ม embedding ใหม่
+        cur.execute(
+            "INSERT INTO face_embeddings (user_id, embedding, encoding) VALUES (%s, %s, %s)",
+            (user_id, emb_blob, EMBEDDING_STORAGE_ENCODING)
+        )
+        
+        # update centroid ใน transaction เดียวกัน
+        embedding_sum = _add_to_centroid(cur, user_id, [embedding.astype(np.float32)])
 
-    conn.commit()
-    cur.close()
-    conn.close()
+        conn.commit()
+        cur.close()
+    
+    # update cache และ gallery (in-memory) ให้ตรงกับ database
+    _centroid_cache.invalidate(username)
+    update_gallery(username, embedding_sum)
     
     return user_id
 
 
+@timed_db
+def save_users_batch(items):
+    """
+    บันทึก embeddings หลายรายการ (หลาย user ได้) ใน transaction เดียว
+    สร้าง users ที่ยังไม่มี แล้วเพิ่ม embeddings ทั้งหมดด้วย multi-row insert
+
+    Args:
+        items: list ของ (username, embedding)
+
+    Returns:
+        dict: {username: user_id}
+    """
+    if not items:
+        return {}
+
+    usernames = list(dict.fromkeys(username for username, _ in items))
+    placeholders = ", ".join(["%s"] * len(usernames))
+
+    with db_connection() as conn:
+        cur = conn.cursor()
+
+        # สร้าง users ที่ยังไม่มี (มีอยู่แล้วจะถูกข้าม)
+        cur.executemany(
+            "INSERT IGNORE INTO users (username) VALUES (%s)",
+            [(username,) for username in usernames]
+        )
+
+        cur.execute(
+            f"SELECT username, id FROM users WHERE username IN ({placeholders})",
+            tuple(usernames)
+        )
+        user_ids = dict(cur.fetchall())
+
+        # executemany ของ INSERT จะถูกรวมเป็น multi-row insert คำสั่งเดียว
+        cur.executemany(
+            "INSERT INTO face_embeddings (user_id, embedding, encoding) VALUES (%s, %s, %s)",
+            [
+                (user_ids[username], encode_embedding(embedding, EMBEDDING_STORAGE_ENCODING), EMBEDDING_STORAGE_ENCODING)
+                for username, embedding in items
+            ]
+        )
+        
+        # update centroid ของแต่ละ user ใน transaction เดียวกัน
+        embedding_sums = {}
+        for username in usernames:
+            new_embeddings = [emb.astype(np.float32) for name, emb in items if name == username]
+            embedding_sums[username] = _add_to_centroid(cur, user_ids[username], new_embeddings)
+
+        conn.commit()
+        cur.close()
+
+    for username, embedding_sum in embedding_sums.items():
+        _centroid_cache.invalidate(username)
+        update_gallery(username, embedding_sum)
+
+    return user_ids
+
+
+@timed_db
+def get_user_embedding_counts(usernames) -> dict:
+    """นับจำนวน embedding ของหลาย user ใน query เดียว"""
+    usernames = list(dict.fromkeys(usernames))
+    if not usernames:
+        return {}
+
+    placeholders = ", ".join(["%s"] * len(usernames))
+
+    with db_connection() as conn:
+        cur = conn.cursor()
+
+        cur.execute(f"""
+            SELECT u.username, COUNT(fe.id) FROM users u
+            LEFT JOIN face_embeddings fe ON fe.user_id = u.id
+            WHERE u.username IN ({placeholders})
+            GROUP BY u.username
+        """, tuple(usernames))
+
+        counts = dict(cur.fetchall())
+        cur.close()
+
+    return {username: counts.get(username, 0) for username in usernames}
+
+
+@timed_db
 def get_user_embedding_count(username: str) -> int:
     """นับจำนวน embedding ของ user"""
-    conn = get_conn()
-    cur = conn.cursor()
-    
-    cur.execute("""
-        SELECT COUNT(*) FROM face_embeddings fe
-        JOIN users u ON fe.user_id = u.id
-        WHERE u.username = %s
-    """, (username,))
-    
-    count = cur.fetchone()[0]
-    cur.close()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        
+        cur.execute("""
+            SELECT COUNT(*) FROM face_embeddings fe
+            JOIN users u ON fe.user_id = u.id
+            WHERE u.username = %s
+        """, (username,))
+        
+        count = cur.fetchone()[0]
+        cur.close()
     
     return count
 
 
+@timed_db
 def load_all_users():
     """โหลด users ทั้งหมดพร้อม embeddings"""
-    conn = get_conn()
-    cur = conn.cursor()
+    with db_connection() as conn:
+        cur = conn.cursor()
 
-    cur.execute("""
-        SELECT u.username, fe.embedding 
-        FROM users u
-        JOIN face_embeddings fe ON u.id = fe.user_id
-    """)
-
-    users = []
-    for username, emb_blob in cur.fetchall():
-        emb = np.frombuffer(emb_blob, dtype=np.float32)
-        users.append((username, emb))
-
-    cur.close()
-    conn.close()
+        cur.execute("""
+            SELECT u.username, fe.embedding, fe.encoding
+            FROM users u
+            JOIN face_embeddings fe ON u.id = fe.user_id
+        """)
+
+        users = []
+        for username, emb_blob, encoding in cur.fetchall():
+            emb = decode_embedding(emb_blob, encoding)
+            users.append((username, emb))
+
+        cur.close()
+    return users
+
+
+@timed_db
+def load_all_centroids():
+    """
+    โหลดผลรวม embedding ของทุก user (แถวเดียวต่อ user) สำหรับสร้าง gallery
+    
+    Returns:
+        list: [(username, embedding_sum), ...]
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+
+        cur.execute("""
+            SELECT u.username, c.embedding_sum
+            FROM users u
+            JOIN user_centroids c ON u.id = c.user_id
+        """)
+
+        users = [(username, np.frombuffer(blob, dtype=np.float32)) for username, blob in cur.fetchall()]
+
+        cur.close()
     return users
 
 
+@timed_db
+def get_user_centroid(username: str):
+    """
+    ดึง centroid (normalize แล้ว) ของ user - อ่านแถวเดียว และ cache ไว้ใน memory
+    
+    Returns:
+        np.ndarray shape (512,) หรือ None ถ้าไม่พบ user
+    """
+    centroid = _centroid_cache.get(username)
+    if centroid is not None:
+        return centroid
+
+    # save_user ที่ invalidate ระหว่างอ่าน ทำให้แถวที่อ่านได้อาจเก่า - put จะข้ามให้เอง
+    generation = _centroid_cache.generation()
+    with db_connection() as conn:
+        cur = conn.cursor()
+
+        cur.execute("""
+            SELECT c.centroid FROM user_centroids c
+            JOIN users u ON c.user_id = u.id
+            WHERE u.username = %s
+        """, (username,))
+
+        row = cur.fetchone()
+        cur.close()
+
+    if row is None:
+        return None
+
+    centroid = np.frombuffer(row[0], dtype=np.float32)
+    _centroid_cache.put(username, centroid, generation=generation)
+    return centroid
+
+
+def get_centroid_cache_stats() -> dict:
+    """สถิติของ centroid cache (hit/miss)"""
+    return _centroid_cache.stats()
+
+
+@timed_db
 def get_user_embeddings(username: str):
     """ดึง embeddings ทั้งหมดของ user ที่ระบุ (return list)"""
-    conn = get_conn()
-    cur = conn.cursor()
+    with db_connection() as conn:
+        cur = conn.cursor()
 
-    cur.execute("""
-        SELECT fe.embedding FROM face_embeddings fe
-        JOIN users u ON fe.user_id = u.id
-        WHERE u.username = %s
-    """, (username,))
+        cur.execute("""
+            SELECT fe.embedding, fe.encoding FROM face_embeddings fe
+            JOIN users u ON fe.user_id = u.id
+            WHERE u.username = %s
+        """, (username,))
 
-    embeddings = []
-    for (emb_blob,) in cur.fetchall():
-        emb = np.frombuffer(emb_blob, dtype=np.float32)
-        embeddings.append(emb)
+        embeddings = []
+        for emb_blob, encoding in cur.fetchall():
+            emb = decode_embedding(emb_blob, encoding)
+            embeddings.append(emb)
 
-    cur.close()
-    conn.close()
+        cur.close()
 
     return embeddings if embeddings else None
 
 
 def get_user_embedding(username: str):
-    """ดึง embedding ของ user ที่ระบุ (return ค่าเฉลี่ยของทุก embedding)"""
-    embeddings = get_user_embeddings(username)
-    
-    if embeddings is None or len(embeddings) == 0:
-        return None
-    
-    # คำนวณค่าเฉลี่ยของ embeddings แล้ว normalize
-    avg_embedding = np.mean(embeddings, axis=0)
-    avg_embedding = avg_embedding / np.linalg.norm(avg_embedding)
-    
-    return avg_embedding
+    """ดึง embedding ของ user ที่ระบุ (ค่าเฉลี่ยของทุก embedding ที่ normalize แล้ว)"""
+    # อ่านจาก centroid ที่เก็บไว้ (แถวเดียว) แทนการเฉลี่ยทุก embedding
+    return get_user_centroid(username)
+
+
+TIME_PERIOD_THAI = {
+    "morning": "เช้า",
+    "noon": "กลางวัน",
+    "afternoon": "บ่าย",
+    "evening": "เย็น/ค่ำ",
+}
+
+# get_time_period ฝั่ง MySQL (ใช้ตอน insert ด้วยเวลาของ database)
+_TIME_PERIOD_SQL = """
+    CASE
+        WHEN HOUR(NOW()) >= 6 AND HOUR(NOW()) < 12 THEN 'morning'
+        WHEN HOUR(NOW()) = 12 THEN 'noon'
+        WHEN HOUR(NOW()) >= 13 AND HOUR(NOW()) < 18 THEN 'afternoon'
+        ELSE 'evening'
+    END
+"""
 
 
 def get_time_period(hour: int) -> tuple:
@@ -188,93 +550,261 @@ def get_time_period(hour: int) -> tuple:
         tuple: (period_key, period_thai)
     """
     if 6 <= hour < 12:
-        return "morning", "เช้า"
+        key = "morning"
     elif 12 <= hour < 13:
-        return "noon", "กลางวัน"
+        key = "noon"
     elif 13 <= hour < 18:
-        return "afternoon", "บ่าย"
+        key = "afternoon"
     else:
-        return "evening", "เย็น/ค่ำ"
+        key = "evening"
+    return key, TIME_PERIOD_THAI[key]
 
 
-def record_attendance(username: str, action: str, similarity_score: float):
+def _now() -> datetime:
+    """
+    เวลาปัจจุบันตาม APP_TIMEZONE (naive datetime สำหรับ column TIMESTAMP)
+    ใช้เฉพาะ write-behind ที่ต้องประทับเวลาก่อนถึง MySQL - ต้องตั้ง APP_TIMEZONE ให้ตรงกับ MySQL
+    """
+    if not APP_TIMEZONE:
+        raise ValueError("ATTENDANCE_WRITE_BEHIND=true ต้องตั้ง APP_TIMEZONE (timezone เดียวกับ MySQL เช่น Asia/Bangkok)")
+    from zoneinfo import ZoneInfo
+    return datetime.now(ZoneInfo(APP_TIMEZONE)).replace(tzinfo=None, microsecond=0)
+
+
+@timed_db
+def record_attendance(username: str, action: str, similarity_score: float, site_id: Optional[int] = None):
     """
     บันทึก check-in/check-out ลง database
+    ใช้ INSERT ... SELECT คำสั่งเดียว (หา user_id + timestamp และ time_period จากเวลาของ MySQL)
+    แล้วอ่าน timestamp ที่บันทึกกลับด้วย primary key
+    ถ้าเปิด ATTENDANCE_WRITE_BEHIND จะเข้าคิวแล้วตอบกลับทันที (เวลาตาม APP_TIMEZONE)
     
     Args:
         username: ชื่อผู้ใช้
         action: 'check_in' หรือ 'check_out'
         similarity_score: ค่าความเหมือน (0-1)
+        site_id: สาขาที่ check-in (None = ที่ทำงานจาก settings)
     
     Returns:
-        dict: ข้อมูลการบันทึก
+        dict: ข้อมูลการบันทึก (None ถ้าไม่พบ user)
     """
-    conn = get_conn()
-    cur = conn.cursor()
-    
-    # หา user_id
-    cur.execute("SELECT id FROM users WHERE username = %s", (username,))
-    row = cur.fetchone()
-    
-    if row is None:
-        cur.close()
-        conn.close()
-        return None
-    
-    user_id = row[0]
-    
-    # บันทึก attendance
-    cur.execute(
-        "INSERT INTO attendance (user_id, action, similarity_score) VALUES (%s, %s, %s)",
-        (user_id, action, similarity_score)
-    )
-    
-    attendance_id = cur.lastrowid
-    
-    # ดึงเวลาที่บันทึก
-    cur.execute("SELECT timestamp FROM attendance WHERE id = %s", (attendance_id,))
-    timestamp = cur.fetchone()[0]
-    
-    # คำนวณช่วงเวลา
-    period_key, period_thai = get_time_period(timestamp.hour)
-    
-    # อัพเดท time_period
-    cur.execute(
-        "UPDATE attendance SET time_period = %s WHERE id = %s",
-        (period_key, attendance_id)
-    )
-    
-    conn.commit()
-    cur.close()
-    conn.close()
-    
-    return {
+    record = {
         "username": username,
         "action": action,
         "similarity_score": similarity_score,
-        "timestamp": timestamp,
-        "time_period": period_key,
-        "time_period_thai": period_thai
+        "site_id": site_id,
     }
+    
+    if ATTENDANCE_WRITE_BEHIND:
+        timestamp = _now()
+        period_key, period_thai = get_time_period(timestamp.hour)
+        record.update(timestamp=timestamp, time_period=period_key, time_period_thai=period_thai)
+        _get_attendance_queue().put({
+            "entry_id": uuid.uuid4().hex,
+            "username": username,
+            "action": action,
+            "similarity_score": float(similarity_score),
+            "time_period": period_key,
+            "timestamp": timestamp.isoformat(sep=" "),
+            "site_id": site_id
+        })
+        return record
+    
+    with db_connection() as conn:
+        cur = conn.cursor()
+        
+        cur.execute(f"""
+            INSERT INTO attendance (user_id, action, similarity_score, time_period, timestamp, site_id)
+            SELECT id, %s, %s, {_TIME_PERIOD_SQL}, NOW(), %s FROM users WHERE username = %s
+        """, (action, similarity_score, site_id, username))
+        
+        if cur.rowcount == 0:
+            # ไม่พบ user
+            conn.commit()
+            cur.close()
+            return None
+        
+        cur.execute("SELECT timestamp, time_period FROM attendance WHERE id = %s", (cur.lastrowid,))
+        timestamp, period_key = cur.fetchone()
+        conn.commit()
+        cur.close()
+    
+    record.update(timestamp=timestamp, time_period=period_key, time_period_thai=TIME_PERIOD_THAI[period_key])
+    return record
+
+
+@timed_db
+def record_attendance_batch(records):
+    """
+    บันทึก attendance หลายรายการด้วย multi-row insert (ใช้โดย write-behind queue)
+    records ที่ entry_id ซ้ำ (เคยบันทึกแล้ว) จะถูกข้าม
+
+    Args:
+        records: list ของ dict (entry_id, username, action, similarity_score, time_period, timestamp, site_id)
+    """
+    usernames = list(dict.fromkeys(r["username"] for r in records))
+    placeholders = ", ".join(["%s"] * len(usernames))
+
+    with db_connection() as conn:
+        cur = conn.cursor()
+
+        cur.execute(
+            f"SELECT username, id FROM users WHERE username IN ({placeholders})",
+            tuple(usernames)
+        )
+        user_ids = dict(cur.fetchall())
+
+        rows = [
+            (
+                user_ids[r["username"]], r["action"], r["similarity_score"], r["time_period"], r["timestamp"],
+                r["entry_id"], r.get("site_id")  # spill file จากเวอร์ชันก่อนไม่มี site_id
+            )
+            for r in records if r["username"] in user_ids
+        ]
+        if rows:
+            cur.executemany("""
+                INSERT INTO attendance (user_id, action, similarity_score, time_period, timestamp, entry_id, site_id)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE id = id
+            """, rows)
+
+        conn.commit()
+        cur.close()
 
 
+_attendance_queue = None
+_attendance_queue_lock = threading.Lock()
+
+
+def _get_attendance_queue() -> WriteBehindQueue:
+    global _attendance_queue
+    if _attendance_queue is None:
+        with _attendance_queue_lock:
+            if _attendance_queue is None:
+                queue = WriteBehindQueue(
+                    record_attendance_batch,
+                    ATTENDANCE_SPILL_PATH,
+                    flush_interval=ATTENDANCE_FLUSH_INTERVAL,
+                    batch_size=ATTENDANCE_FLUSH_BATCH,
+                    fsync=ATTENDANCE_SPILL_FSYNC,
+                    max_retries=ATTENDANCE_MAX_RETRIES,
+                    dead_letter_path=ATTENDANCE_DEAD_LETTER_PATH,
+                    # database ล่ม/หลุด: รอแล้วลองใหม่ไปเรื่อยๆ ไม่ย้ายไป dead-letter
+                    transient_errors=(
+                        mysql.connector.errors.InterfaceError,
+                        mysql.connector.errors.OperationalError,
+                        PoolTimeoutError,
+                    ),
+                )
+                queue.start()
+                _attendance_queue = queue
+    return _attendance_queue
+
+
+def start_attendance_writer():
+    """เริ่ม write-behind queue (replay spill file ที่ค้างไว้) ถ้าเปิดใช้ - raise ถ้ายังไม่ตั้ง APP_TIMEZONE"""
+    if ATTENDANCE_WRITE_BEHIND:
+        _now()
+        _get_attendance_queue()
+
+
+def stop_attendance_writer():
+    """flush attendance ที่ค้างอยู่แล้วหยุด write-behind queue"""
+    if _attendance_queue is not None:
+        _attendance_queue.stop()
+
+
+def get_attendance_queue_stats():
+    """สถิติของ write-behind queue (None ถ้าไม่ได้เปิดใช้)"""
+    return _attendance_queue.stats() if _attendance_queue is not None else None
+
+
+@timed_db
 def get_last_attendance(username: str):
     """ดึงข้อมูล attendance ล่าสุดของ user"""
-    conn = get_conn()
-    cur = conn.cursor()
-    
-    cur.execute("""
-        SELECT a.action, a.timestamp FROM attendance a
-        JOIN users u ON a.user_id = u.id
-        WHERE u.username = %s
-        ORDER BY a.timestamp DESC
-        LIMIT 1
-    """, (username,))
-    
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        
+        # อ่านย้อนหลังจาก index (user_id, timestamp) แถวเดียว ไม่ต้อง sort
+        cur.execute("""
+            SELECT a.action, a.timestamp FROM attendance a
+            WHERE a.user_id = (SELECT id FROM users WHERE username = %s)
+            ORDER BY a.timestamp DESC
+            LIMIT 1
+        """, (username,))
+        
+        row = cur.fetchone()
+        cur.close()
     
     if row:
         return {"action": row[0], "timestamp": row[1]}
     return None
+
+
+# ==================================================
+# Sites (multi-site geofencing)
+# ==================================================
+_SITE_COLUMNS = ("id", "name", "latitude", "longitude", "radius_meters")
+
+
+@timed_db
+def load_active_sites():
+    """
+    โหลดสาขาที่เปิดใช้งานทั้งหมด (สำหรับสร้าง site index)
+    
+    Returns:
+        list: [{"id", "name", "latitude", "longitude", "radius_meters"}, ...]
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+        
+        cur.execute("""
+            SELECT id, name, latitude, longitude, radius_meters
+            FROM sites WHERE active = 1
+            ORDER BY id
+        """)
+        
+        sites = [dict(zip(_SITE_COLUMNS, row)) for row in cur.fetchall()]
+        cur.close()
+    return sites
+
+
+@timed_db
+def create_site(name: str, latitude: float, longitude: float, radius_meters: int) -> dict:
+    """
+    เพิ่มสาขาใหม่
+    
+    Returns:
+        dict: ข้อมูลสาขาที่เพิ่ม (รวม id)
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+        
+        cur.execute("""
+            INSERT INTO sites (name, latitude, longitude, radius_meters)
+            VALUES (%s, %s, %s, %s)
+        """, (name, latitude, longitude, radius_meters))
+        site_id = cur.lastrowid
+        
+        conn.commit()
+        cur.close()
+    return dict(zip(_SITE_COLUMNS, (site_id, name, latitude, longitude, radius_meters)))
+
+
+@timed_db
+def deactivate_site(site_id: int) -> bool:
+    """
+    ปิดใช้งานสาขา (ไม่ลบแถว เพราะ attendance เดิมยังอ้างอิง site_id)
+    
+    Returns:
+        bool: True ถ้าพบสาขาที่เปิดใช้งานอยู่
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+        
+        cur.execute("UPDATE sites SET active = 0 WHERE id = %s AND active = 1", (site_id,))
+        updated = cur.rowcount
+        
+        conn.commit()
+        cur.close()
+    return updated > 0
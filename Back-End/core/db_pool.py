@@ -0,0 +1,191 @@
+"""
+Database Connection Pool
+Pool ของ MySQL connections ที่ใช้ร่วมกันทุก helper ใน core.database
+(จำกัดจำนวน, มี overflow, recycle ตามอายุ, ping ก่อนใช้งาน และเก็บสถิติ)
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict
+
+
+class PoolTimeoutError(Exception):
+    """รอ connection จาก pool นานเกิน timeout"""
+
+
+class ConnectionPool:
+    """
+    Bounded connection pool
+
+    Args:
+        creator: ฟังก์ชันสร้าง connection ใหม่
+        size: จำนวน connection ที่เก็บไว้ใน pool (idle) ได้สูงสุด
+        max_overflow: จำนวน connection ที่เปิดเพิ่มได้ชั่วคราวเมื่อ pool เต็ม (ปิดทิ้งเมื่อคืน)
+        recycle: อายุสูงสุดของ connection (วินาที, 0 = ไม่ recycle)
+        timeout: เวลารอ connection สูงสุด (วินาที)
+        pre_ping: ตรวจว่า connection ยังใช้ได้ก่อนส่งให้ผู้ใช้
+    """
+
+    def __init__(self, creator: Callable, size: int = 5, max_overflow: int = 10,
+                 recycle: int = 1800, timeout: float = 10.0, pre_ping: bool = True):
+        self._creator = creator
+        self.size = size
+        self.max_overflow = max_overflow
+        self.recycle = recycle
+        self.timeout = timeout
+        self.pre_ping = pre_ping
+
+        self._cond = threading.Condition()
+        self._idle = deque()      # (conn, created_at)
+        self._created_at = {}     # id(conn) -> created_at
+        self._open = 0            # connection ที่เปิดอยู่ทั้งหมด (idle + in use)
+        self._in_use = 0
+        self._waiting = 0
+        self._created_total = 0
+        self._closed_total = 0
+        self._checkouts = 0
+        self._timeouts = 0
+
+    # --------------------------------------------------
+    # Internal helpers
+    # --------------------------------------------------
+    def _create(self):
+        conn = self._creator()
+        with self._cond:
+            self._created_total += 1
+            self._created_at[id(conn)] = time.monotonic()
+        return conn
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._closed_total += 1
+            self._created_at.pop(id(conn), None)
+
+    def _expired(self, created_at: float) -> bool:
+        return self.recycle > 0 and time.monotonic() - created_at > self.recycle
+
+    def _is_alive(self, conn) -> bool:
+        try:
+            return conn.is_connected()
+        except Exception:
+            return False
+
+    # --------------------------------------------------
+    # Checkout / checkin
+    # --------------------------------------------------
+    def acquire(self):
+        """ยืม connection จาก pool (ต้องคืนด้วย release เสมอ)"""
+        deadline = time.monotonic() + self.timeout
+        reuse = None
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    reuse, _ = self._idle.pop()
+                    break
+                if self._open < self.size + self.max_overflow:
+                    self._open += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeoutError(
+                        f"ไม่มี connection ว่างภายใน {self.timeout} วินาที "
+                        f"(pool size={self.size}, overflow={self.max_overflow})"
+                    )
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            self._in_use += 1
+            self._checkouts += 1
+
+        try:
+            if reuse is not None:
+                created_at = self._created_at.get(id(reuse), 0.0)
+                if self._expired(created_at) or (self.pre_ping and not self._is_alive(reuse)):
+                    self._close(reuse)
+                    reuse = None
+            return reuse if reuse is not None else self._create()
+        except Exception:
+            # สร้าง connection ไม่สำเร็จ - คืน slot ให้ pool
+            with self._cond:
+                self._open -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn, discard: bool = False):
+        """คืน connection เข้า pool (discard=True = ปิดทิ้ง เช่นเมื่อเกิด error)"""
+        if not discard:
+            try:
+                # ปิด transaction ที่ค้างอยู่ เพื่อไม่ให้ snapshot เก่าติดไปกับคนถัดไป
+                if conn.in_transaction:
+                    conn.rollback()
+            except Exception:
+                discard = True
+
+        with self._cond:
+            self._in_use -= 1
+            created_at = self._created_at.get(id(conn), 0.0)
+            keep = (not discard and len(self._idle) < self.size and not self._expired(created_at))
+            if keep:
+                self._idle.append((conn, created_at))
+            else:
+                self._open -= 1
+            self._cond.notify()
+
+        if not keep:
+            self._close(conn)
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager สำหรับยืม connection แล้วคืนอัตโนมัติ (rollback ถ้ามี error)
+        คืน slot ทุกกรณีรวมถึง BaseException (CancelledError, KeyboardInterrupt, GeneratorExit)
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+        except BaseException:
+            discard = False
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+            self.release(conn, discard=discard)
+            raise
+        else:
+            self.release(conn)
+
+    def dispose(self):
+        """ปิด connection ที่ว่างอยู่ทั้งหมด"""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._open -= len(idle)
+        for conn, _ in idle:
+            self._close(conn)
+
+    def stats(self) -> Dict:
+        """สถิติของ pool สำหรับ monitoring"""
+        with self._cond:
+            return {
+                "size": self.size,
+                "max_overflow": self.max_overflow,
+                "open": self._open,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "waiting": self._waiting,
+                "created": self._created_total,
+                "closed": self._closed_total,
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+            }
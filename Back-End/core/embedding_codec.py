@@ -0,0 +1,100 @@
+"""
+Embedding Codec
+แปลง embedding เป็น bytes สำหรับเก็บใน face_embeddings (column embedding + encoding)
+
+- float32: 4 bytes/ค่า (2048 bytes สำหรับ 512-d) - ค่าเดิม ไม่มีความคลาดเคลื่อน
+- float16: 2 bytes/ค่า (1024 bytes)
+- int8:    scale float32 ต่อ vector + 1 byte/ค่า (516 bytes) - scale = max(|x|) / 127
+
+user_centroids ยังเก็บเป็น float32 เสมอ (ผลรวม embedding ต้องสะสมได้แม่นยำ)
+"""
+
+from typing import Dict, List, Optional
+import numpy as np
+
+
+ENCODINGS = ("float32", "float16", "int8")
+DEFAULT_ENCODING = "float32"
+
+
+def encode_embedding(embedding: np.ndarray, encoding: str = DEFAULT_ENCODING) -> bytes:
+    """
+    แปลง embedding เป็น bytes ตาม encoding
+
+    Args:
+        embedding: vector (float)
+        encoding: "float32", "float16" หรือ "int8"
+
+    Returns:
+        bytes: ข้อมูลสำหรับ column embedding
+    """
+    embedding = np.asarray(embedding, dtype=np.float32).reshape(-1)
+
+    if encoding == "float32":
+        return embedding.tobytes()
+    if encoding == "float16":
+        return embedding.astype(np.float16).tobytes()
+    if encoding == "int8":
+        peak = float(np.max(np.abs(embedding))) if embedding.size else 0.0
+        scale = np.float32(peak / 127.0 if peak > 0 else 1.0)
+        quantized = np.clip(np.rint(embedding / scale), -127, 127).astype(np.int8)
+        return scale.tobytes() + quantized.tobytes()
+
+    raise ValueError(f"ไม่รู้จัก embedding encoding: {encoding} (ใช้ได้: {', '.join(ENCODINGS)})")
+
+
+def decode_embedding(blob: bytes, encoding: Optional[str] = DEFAULT_ENCODING) -> np.ndarray:
+    """
+    แปลง bytes จาก database กลับเป็น embedding float32
+
+    Args:
+        blob: ข้อมูลจาก column embedding
+        encoding: ค่าจาก column encoding (None = float32 สำหรับแถวเก่า)
+    """
+    if encoding is None or encoding == "float32":
+        return np.frombuffer(blob, dtype=np.float32)
+    if encoding == "float16":
+        return np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+    if encoding == "int8":
+        scale = np.frombuffer(blob, dtype=np.float32, count=1)[0]
+        return np.frombuffer(blob, dtype=np.int8, offset=4).astype(np.float32) * scale
+
+    raise ValueError(f"ไม่รู้จัก embedding encoding: {encoding}")
+
+
+def measure_score_error(embeddings: List[np.ndarray], encoding: str, threshold: float) -> Dict:
+    """
+    วัดความคลาดเคลื่อนของ match score ที่เกิดจากการเก็บ embedding ด้วย encoding นี้ เทียบกับ float32
+    score = cosine ระหว่าง embedding ต้นฉบับ (แทนรูปที่ส่งมาตรวจ) กับ embedding อีกตัวที่ผ่าน encode/decode
+
+    Args:
+        embeddings: embeddings float32 ต้นฉบับ (อย่างน้อย 2 ตัว)
+        encoding: encoding ที่ต้องการวัด
+        threshold: VERIFY_THRESHOLD ใช้นับคู่ที่ผลการตัดสินเปลี่ยน
+
+    Returns:
+        dict: bytes ต่อ embedding, ความต่างของ score (mean / p99 / max) และจำนวนคู่ที่ผลเปลี่ยน
+    """
+    original = np.stack([np.asarray(e, dtype=np.float32).reshape(-1) for e in embeddings])
+    original /= np.linalg.norm(original, axis=1, keepdims=True)
+
+    stored = np.stack([decode_embedding(encode_embedding(e, encoding), encoding) for e in original])
+    stored /= np.linalg.norm(stored, axis=1, keepdims=True)
+
+    exact = original @ original.T
+    approx = original @ stored.T
+    off_diagonal = ~np.eye(len(original), dtype=bool)
+    diff = np.abs(exact - approx)[off_diagonal]
+    flipped = ((exact >= threshold) != (approx >= threshold))[off_diagonal]
+
+    return {
+        "encoding": encoding,
+        "bytes_per_embedding": len(encode_embedding(original[0], encoding)),
+        "pairs": int(diff.size),
+        "score_abs_diff": {
+            "mean": round(float(diff.mean()), 6),
+            "p99": round(float(np.percentile(diff, 99)), 6),
+            "max": round(float(diff.max()), 6),
+        },
+        "decisions_flipped": int(flipped.sum()),
+    }
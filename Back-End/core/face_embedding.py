@@ -3,58 +3,130 @@ Face Embedding Module
 แปลงรูปหน้าเป็น face embedding vector
 """
 
+import threading
 import cv2
 import numpy as np
-from typing import Union
-from config.settings import FACE_MODEL_PATH
+from typing import List, Union
+from config.settings import FACE_MODEL_PATH, EMBEDDING_BATCH_SIZE, EMBEDDING_BACKEND
+from .onnx_session import create_session
+from .model_registry import register_model, get_model
 
 
 # ==================================================
-# Load model once (สำคัญมาก)
+# Inference backends
 # ==================================================
-_arcface_net = cv2.dnn.readNetFromONNX(FACE_MODEL_PATH)
+class OrtEmbedder:
+    """ArcFace ผ่าน ONNX Runtime (session.run เรียกพร้อมกันหลาย thread ได้)"""
 
+    name = "onnxruntime"
 
-def face_to_embedding(image: Union[str, np.ndarray]) -> np.ndarray:
-    """
-    รับรูปหน้าที่ crop มาแล้ว
-    แปลงเป็น face embedding (512-d, L2-normalized)
+    def __init__(self, model_path: str):
+        self.session = create_session(model_path)
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # บาง export ล็อก batch = 1 ไว้ - ต้อง run ทีละรูป
+        self.fixed_batch = model_input.shape[0] == 1
 
-    Args:
-        image: path รูป หรือ numpy array (BGR)
+    def run(self, blob: np.ndarray) -> np.ndarray:
+        """blob (N, 3, 112, 112) float32 → embeddings (N, 512) ยังไม่ normalize"""
+        if self.fixed_batch and len(blob) > 1:
+            return np.concatenate([self.run(blob[i:i + 1]) for i in range(len(blob))], axis=0)
+        output = self.session.run(None, {self.input_name: np.ascontiguousarray(blob, dtype=np.float32)})[0]
+        return output.reshape(len(blob), -1)
 
-    Returns:
-        np.ndarray shape (512,) - normalized embedding
-    """
 
-    # -------------------------------
-    # Load image
-    # -------------------------------
+class CvDnnEmbedder:
+    """ArcFace ผ่าน cv2.dnn (setInput/forward ใช้ state ร่วมกัน จึงต้อง lock)"""
+
+    name = "opencv"
+
+    def __init__(self, model_path: str):
+        self.net = cv2.dnn.readNetFromONNX(model_path)
+        self._lock = threading.Lock()
+
+    def run(self, blob: np.ndarray) -> np.ndarray:
+        with self._lock:
+            self.net.setInput(blob)
+            output = self.net.forward()
+        return output.reshape(len(blob), -1)
+
+
+_BACKENDS = {
+    OrtEmbedder.name: OrtEmbedder,
+    CvDnnEmbedder.name: CvDnnEmbedder,
+}
+
+
+def create_embedder(backend: str = EMBEDDING_BACKEND, model_path: str = FACE_MODEL_PATH):
+    """สร้าง embedder ตามชื่อ backend ("onnxruntime" หรือ "opencv")"""
+    if backend not in _BACKENDS:
+        raise ValueError(f"ไม่รู้จัก EMBEDDING_BACKEND: {backend}")
+    return _BACKENDS[backend](model_path)
+
+
+# ==================================================
+# Load model once (สำคัญมาก) - โหลดตอนใช้งานครั้งแรก / ตอน warm-up
+# ==================================================
+def _warm_up(embedder):
+    embedder.run(np.zeros((1, 3, 112, 112), dtype=np.float32))
+
+
+register_model("arcface", create_embedder, _warm_up)
+
+
+def _get_embedder():
+    return get_model("arcface")
+
+
+def _load_image(image: Union[str, np.ndarray]) -> np.ndarray:
+    """โหลดรูปจาก path หรือใช้ numpy array (BGR) ที่ส่งมา"""
     if isinstance(image, str):
         img = cv2.imread(image)
         if img is None:
             raise ValueError("ไม่พบไฟล์รูป")
-    else:
-        img = image.copy()
+        return img
+    return image
 
-    # -------------------------------
-    # Preprocess (InsightFace MBF)
-    # -------------------------------
+
+def _preprocess(image: Union[str, np.ndarray]) -> np.ndarray:
+    """
+    Preprocess (InsightFace MBF): resize 112x112, BGR→RGB, normalize [-1, 1]
+
+    Returns:
+        np.ndarray shape (3, 112, 112) - CHW float32
+    """
+    img = _load_image(image)
     img = cv2.resize(img, (112, 112))
     img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
 
     img = img.astype(np.float32)
     img = (img - 127.5) / 128.0   # normalize [-1, 1]
 
-    # HWC → CHW → NCHW
-    blob = np.transpose(img, (2, 0, 1))
-    blob = np.expand_dims(blob, axis=0)
+    # HWC → CHW
+    return np.transpose(img, (2, 0, 1))
+
+
+def face_to_embedding(image: Union[str, np.ndarray]) -> np.ndarray:
+    """
+    รับรูปหน้าที่ crop มาแล้ว
+    แปลงเป็น face embedding (512-d, L2-normalized)
+
+    Args:
+        image: path รูป หรือ numpy array (BGR)
+
+    Returns:
+        np.ndarray shape (512,) - normalized embedding
+    """
+
+    # -------------------------------
+    # Preprocess (CHW → NCHW)
+    # -------------------------------
+    blob = np.expand_dims(_preprocess(image), axis=0)
 
     # -------------------------------
     # Inference
     # -------------------------------
-    _arcface_net.setInput(blob)
-    embedding = _arcface_net.forward()
+    embedding = _get_embedder().run(blob)
 
     # -------------------------------
     # Postprocess
@@ -63,3 +135,34 @@ def face_to_embedding(image: Union[str, np.ndarray]) -> np.ndarray:
     embedding = embedding / np.linalg.norm(embedding)
 
     return embedding
+
+
+def face_to_embedding_batch(images: List[Union[str, np.ndarray]], batch_size: int = None) -> np.ndarray:
+    """
+    แปลงรูปหน้าหลายรูปเป็น embeddings ด้วย forward pass ครั้งเดียวต่อ batch
+    (รวมเป็น NCHW blob แทนการเรียก forward ทีละรูป)
+
+    Args:
+        images: list ของ path รูป หรือ numpy array (BGR) ที่ crop แล้ว
+        batch_size: จำนวนรูปสูงสุดต่อ forward pass (default จาก settings)
+
+    Returns:
+        np.ndarray shape (N, 512) - normalized embeddings เรียงตาม images
+    """
+    if batch_size is None:
+        batch_size = EMBEDDING_BATCH_SIZE
+
+    if len(images) == 0:
+        return np.empty((0, 512), dtype=np.float32)
+
+    embedder = _get_embedder()
+    outputs = []
+    for start in range(0, len(images), batch_size):
+        blob = np.stack([_preprocess(img) for img in images[start:start + batch_size]])
+
+        outputs.append(embedder.run(blob))
+
+    embeddings = np.concatenate(outputs, axis=0)
+    embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+    return embeddings
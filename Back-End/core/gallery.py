@@ -0,0 +1,323 @@
+"""
+Embedding Gallery Module
+เก็บ centroid (ค่าเฉลี่ย embedding ที่ normalize แล้ว) ของทุก user ไว้ใน memory
+เพื่อให้ recognize_face ค้นหาด้วย matrix-vector product ครั้งเดียว
+โดยไม่ต้องโหลด embeddings ทั้งหมดจาก database ทุก request
+(โหลดจากตาราง user_centroids แถวเดียวต่อ user)
+"""
+
+import threading
+import numpy as np
+from typing import Callable, Iterable, List, Optional, Tuple, Union
+from config.settings import (
+    RECOGNITION_INDEX,
+    RECOGNITION_INDEX_MIN_USERS,
+    IVF_NLIST,
+    IVF_NPROBE,
+    IVF_TRAIN_ITERATIONS,
+    IVF_EXACT_FALLBACK,
+    IVF_EXACT_FALLBACK_MARGIN,
+    GALLERY_SNAPSHOT_PATH,
+    GALLERY_SNAPSHOT_MAX_AGE,
+    GALLERY_SNAPSHOT_CHECK_INTERVAL,
+    GALLERY_SNAPSHOT_COMPACT_ROWS,
+)
+from .ann_index import create_index
+from .gallery_snapshot import SharedGallery
+from .metrics import GALLERY_USERS
+
+
+EMBEDDING_DIM = 512
+_INITIAL_CAPACITY = 64
+
+
+class EmbeddingGallery:
+    """
+    Matrix ของ centroid ต่อ user (float32, contiguous) + array ของ username ที่เรียงตรงกัน
+
+    - _sums: ผลรวม embedding ของแต่ละ user (ใช้ update centroid แบบ incremental)
+    - _matrix: centroid ที่ normalize แล้ว (ใช้สำหรับค้นหา)
+    - _usernames: username ของแต่ละแถว
+    - _ann: ANN index (ถ้าเปิดใช้) ที่คืน candidate rows ให้ rerank แบบ exact
+    - _generation: เพิ่มทุกครั้งที่ load() - index ที่ train จาก matrix ก่อน load จะถูกทิ้ง
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM, index_factory: Optional[Callable] = None,
+                 min_index_size: int = 0, exact_fallback: bool = True, fallback_margin: float = 0.0):
+        self.dim = dim
+        self._index_factory = index_factory
+        self._min_index_size = min_index_size
+        self._exact_fallback = exact_fallback
+        self._fallback_margin = fallback_margin
+        self._ann = None
+        self._generation = 0
+        self._rebuilding = False
+        self._pending_rows = set()
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._size = 0
+        self._sums = np.zeros((_INITIAL_CAPACITY, dim), dtype=np.float32)
+        self._matrix = np.zeros((_INITIAL_CAPACITY, dim), dtype=np.float32)
+        self._usernames: List[str] = []
+        self._index = {}
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _ensure_capacity(self, needed: int):
+        """ขยาย matrix (เท่าตัว) ถ้าพื้นที่ไม่พอ"""
+        capacity = self._matrix.shape[0]
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        sums = np.zeros((capacity, self.dim), dtype=np.float32)
+        matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        sums[:self._size] = self._sums[:self._size]
+        matrix[:self._size] = self._matrix[:self._size]
+        self._sums = sums
+        self._matrix = matrix
+
+    def _row_locked(self, username: str) -> int:
+        """หา row ของ user (สร้างแถวใหม่ถ้ายังไม่มี)"""
+        row = self._index.get(username)
+        if row is None:
+            self._ensure_capacity(self._size + 1)
+            row = self._size
+            self._usernames.append(username)
+            self._index[username] = row
+            self._size += 1
+        return row
+
+    def _refresh_row_locked(self, row: int):
+        """คำนวณ centroid ของแถวใหม่จากผลรวม แล้ว update index"""
+        # centroid = mean แล้ว normalize (เท่ากับ sum แล้ว normalize)
+        norm = np.linalg.norm(self._sums[row])
+        if norm > 0:
+            self._matrix[row] = self._sums[row] / norm
+
+        if self._rebuilding:
+            self._pending_rows.add(row)
+        elif self._ann is not None:
+            self._ann.add(row, self._matrix[row])
+
+    def _add_locked(self, username: str, embedding: np.ndarray):
+        row = self._row_locked(username)
+        self._sums[row] += embedding
+        self._refresh_row_locked(row)
+
+    def _needs_rebuild_locked(self) -> bool:
+        """ต้อง build index ใหม่เมื่อถึงขนาดขั้นต่ำ หรือจำนวน user โตขึ้นเท่าตัวจากตอน train"""
+        if self._index_factory is None or self._rebuilding or self._size < self._min_index_size:
+            return False
+        if self._ann is None:
+            return True
+        return self._size >= 2 * max(1, self._ann.trained_size)
+
+    def rebuild_index(self):
+        """
+        Build ANN index ใหม่จาก centroid ปัจจุบัน
+        การ train ทำนอก lock (search ยังใช้ index เดิมได้) แล้วค่อยสลับ index
+        rows ที่เพิ่ม/เปลี่ยนระหว่าง train จะถูก insert เพิ่มก่อนสลับ
+        ถ้ามี load() ระหว่าง train (rows ไม่ตรงกับ matrix แล้ว) จะทิ้ง index ที่ได้
+        """
+        if self._index_factory is None:
+            return
+        with self._lock:
+            generation = self._generation
+            n = self._size
+            snapshot = self._matrix[:n].copy()
+            self._rebuilding = True
+            self._pending_rows = set()
+
+        try:
+            index = self._index_factory()
+            index.build(snapshot)
+        except Exception:
+            with self._lock:
+                if generation == self._generation:
+                    self._rebuilding = False
+            raise
+
+        with self._lock:
+            if generation != self._generation:
+                return
+            for row in sorted(self._pending_rows | set(range(n, self._size))):
+                index.add(row, self._matrix[row])
+            self._ann = index
+            self._rebuilding = False
+            self._pending_rows = set()
+
+    def load(self, rows: Iterable[Tuple[str, np.ndarray]]):
+        """
+        สร้าง gallery ใหม่ทั้งหมดจาก (username, embedding)
+        ถ้า username ซ้ำกันหลายแถว จะรวมกันเป็น centroid เดียว
+
+        Args:
+            rows: iterable ของ (username, embedding) หรือ (username, ผลรวม embedding)
+                  เช่นผลลัพธ์จาก load_all_centroids()
+        """
+        with self._lock:
+            self._generation += 1
+            self._size = 0
+            self._usernames = []
+            self._index = {}
+            self._sums[:] = 0
+            self._matrix[:] = 0
+            self._ann = None
+            self._rebuilding = False
+            self._pending_rows = set()
+            for username, emb in rows:
+                self._add_locked(username, np.asarray(emb, dtype=np.float32))
+            self._loaded = True
+            rebuild = self._needs_rebuild_locked()
+
+        if rebuild:
+            self.rebuild_index()
+
+    def add_embedding(self, username: str, embedding: np.ndarray):
+        """เพิ่ม embedding ของ user แล้ว update centroid แถวนั้นแบบ in-place"""
+        with self._lock:
+            self._add_locked(username, np.asarray(embedding, dtype=np.float32).reshape(-1))
+            rebuild = self._needs_rebuild_locked()
+
+        # gallery โตจนต้อง train index ใหม่ - ทำใน background ไม่ให้ request รอ
+        if rebuild:
+            threading.Thread(target=self.rebuild_index, daemon=True).start()
+
+    def set_user(self, username: str, embedding_sum: np.ndarray):
+        """กำหนดผลรวม embedding ของ user (ค่าล่าสุดจาก database) แล้ว update centroid แบบ in-place"""
+        with self._lock:
+            row = self._row_locked(username)
+            self._sums[row] = np.asarray(embedding_sum, dtype=np.float32).reshape(-1)
+            self._refresh_row_locked(row)
+            rebuild = self._needs_rebuild_locked()
+
+        if rebuild:
+            threading.Thread(target=self.rebuild_index, daemon=True).start()
+
+    def search(self, query: np.ndarray, threshold: Optional[float] = None) -> Tuple[Optional[str], Optional[float]]:
+        """
+        หา user ที่ใกล้ที่สุด (cosine similarity) ด้วย matrix-vector product + argmax
+        ถ้ามี ANN index จะคำนวณ score แบบ exact เฉพาะ candidates จาก index
+
+        Args:
+            query: embedding ที่ normalize แล้ว shape (512,)
+            threshold: ถ้าระบุและ candidate ที่ดีที่สุดต่ำกว่า threshold + fallback_margin
+                       จะ scan ทั้งหมดซ้ำ (ตาม IVF_EXACT_FALLBACK)
+                       - ผลการตัดสิน match/ไม่ match ตรงกับ brute force เสมอ
+                       - ถ้า match ในช่วง margin ได้ user เดียวกับ brute force ด้วย
+                       - candidate ที่เกิน margin ยอมรับทันที (user นอกกลุ่มที่ค้นอาจ score สูงกว่า
+                         แต่ต้องสูงกว่า threshold + margin ซึ่งแทบไม่เกิดกับใบหน้าคนละคน)
+                       ถ้าไม่ระบุ ผลจาก probe ที่ไม่ครบทุกแถวจะ scan ทั้งหมดซ้ำเสมอ
+                       (ไม่มีเกณฑ์ให้ยอมรับผล approximate)
+
+        Returns:
+            tuple: (username, score) หรือ (None, None) ถ้า gallery ว่าง
+        """
+        query = np.asarray(query, dtype=np.float32)
+        with self._lock:
+            if self._size == 0:
+                return None, None
+
+            if self._ann is not None:
+                rows = self._ann.candidates(query)
+                if rows is not None and len(rows) > 0:
+                    # exact rerank ของ candidates ด้วย centroid float32
+                    scores = self._matrix[rows] @ query
+                    best = int(np.argmax(scores))
+                    best_score = float(scores[best])
+                    # probe ครบทุกแถว = ผล exact อยู่แล้ว
+                    partial = len(rows) < self._size
+                    if (not partial or not self._exact_fallback
+                            or (threshold is not None and best_score >= threshold + self._fallback_margin)):
+                        return self._usernames[int(rows[best])], best_score
+
+            scores = self._matrix[:self._size] @ query
+            best = int(np.argmax(scores))
+            return self._usernames[best], float(scores[best])
+
+    def usernames(self) -> List[str]:
+        with self._lock:
+            return list(self._usernames)
+
+
+# ==================================================
+# Gallery ของ process (สร้างครั้งเดียว)
+# ==================================================
+def _make_index():
+    return create_index(
+        RECOGNITION_INDEX,
+        nlist=IVF_NLIST,
+        nprobe=IVF_NPROBE,
+        train_iterations=IVF_TRAIN_ITERATIONS,
+    )
+
+
+if GALLERY_SNAPSHOT_PATH:
+    # หลาย worker ใช้ snapshot (mmap) ร่วมกัน
+    _gallery = SharedGallery(
+        GALLERY_SNAPSHOT_PATH,
+        dim=EMBEDDING_DIM,
+        check_interval=GALLERY_SNAPSHOT_CHECK_INTERVAL,
+        max_age=GALLERY_SNAPSHOT_MAX_AGE,
+        compact_rows=GALLERY_SNAPSHOT_COMPACT_ROWS,
+        index_factory=_make_index if RECOGNITION_INDEX != "exact" else None,
+        min_index_size=RECOGNITION_INDEX_MIN_USERS,
+        exact_fallback=IVF_EXACT_FALLBACK,
+        fallback_margin=IVF_EXACT_FALLBACK_MARGIN,
+    )
+else:
+    _gallery = EmbeddingGallery(
+        index_factory=_make_index if RECOGNITION_INDEX != "exact" else None,
+        min_index_size=RECOGNITION_INDEX_MIN_USERS,
+        exact_fallback=IVF_EXACT_FALLBACK,
+        fallback_margin=IVF_EXACT_FALLBACK_MARGIN,
+    )
+_load_lock = threading.Lock()
+GALLERY_USERS.set_function(lambda: len(_gallery))
+
+
+def get_gallery() -> Union[EmbeddingGallery, SharedGallery]:
+    """คืน gallery ของ process (โหลดจาก database ครั้งแรกถ้ายังไม่ได้โหลด)"""
+    if not _gallery.loaded:
+        with _load_lock:
+            if not _gallery.loaded:
+                load_gallery()
+    return _gallery
+
+
+def is_gallery_loaded() -> bool:
+    """โหลด gallery แล้วหรือยัง (ไม่ trigger การโหลด)"""
+    return _gallery.loaded
+
+
+def load_gallery():
+    """
+    โหลด centroid ของทุก user จาก database เข้า gallery (เรียกตอน startup)
+    shared mode: map snapshot ที่มีอยู่ (ไม่ query database) หรือสร้างใหม่ถ้ายังไม่มี/หมดอายุ
+    """
+    from .database import load_all_centroids
+    if isinstance(_gallery, SharedGallery):
+        _gallery.open(load_all_centroids)
+    else:
+        _gallery.load(load_all_centroids())
+    return _gallery
+
+
+def rebuild_gallery_index():
+    """Build ANN index ใหม่จาก gallery ปัจจุบัน (เช่นหลังเปลี่ยน IVF_NLIST)"""
+    get_gallery().rebuild_index()
+
+
+def update_gallery(username: str, embedding_sum: np.ndarray):
+    """
+    update gallery หลังจากบันทึก embedding ใหม่ ด้วยผลรวม embedding ล่าสุดของ user
+    (ถ้ายังไม่ได้โหลด จะโหลดทีหลังเองตอนใช้งาน)
+    """
+    if _gallery.loaded:
+        _gallery.set_user(username, embedding_sum)
@@ -0,0 +1,590 @@
+"""
+Gallery Snapshot Module
+แชร์ gallery ระหว่าง uvicorn workers ผ่านไฟล์ snapshot ที่ทุก worker mmap แบบ read-only
+
+รูปแบบไฟล์ snapshot (little-endian):
+    header 64 bytes : magic "FGAL", version, dim, count, generation, synced_at, names_offset, names_size
+    matrix          : float32 [count, dim] เริ่มที่ byte 64 (centroid ที่ normalize แล้ว)
+    username table  : uint64 offsets [count + 1] ตามด้วย username (UTF-8) ต่อกัน
+
+delta segment (<path>.delta, append-only):
+    header 32 bytes : magic "FGDL", version, dim, generation ของ snapshot ที่ต่อท้าย, จำนวน records
+    records         : uint16 ความยาว username, username (UTF-8), float32 [dim]
+
+- ทุก worker map ไฟล์เดียวกัน (ใช้ page cache ของ OS ร่วมกัน) memory จึงไม่โตตามจำนวน worker
+- worker ใหม่ map ไฟล์ที่มีอยู่ได้ทันที ไม่ต้อง query MySQL
+- เมื่อมีการลงทะเบียน worker นั้นต่อท้าย centroid ใหม่ลง delta segment (ไม่เขียน snapshot ทั้งไฟล์)
+  worker อื่นอ่านเฉพาะ bytes ใหม่ของ delta (stat) แล้วเก็บเป็น overlay เล็กๆ ทับแถวเดิมใน snapshot
+- delta ครบ compact_rows records: รวมเข้า snapshot ใหม่ (temp + os.replace) แล้วเริ่ม delta ใหม่
+  (เขียนทั้งไฟล์ครั้งเดียวต่อ compact_rows การลงทะเบียน)
+- การเขียนทำภายใต้ file lock เพื่อไม่ให้ worker ที่ลงทะเบียนพร้อมกันทับ update ของกันและกัน
+"""
+
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows - ไม่มี file lock ข้าม process (ใช้ได้กับ worker เดียว)
+    fcntl = None
+
+
+MAGIC = b"FGAL"
+VERSION = 1
+HEADER_SIZE = 64
+_HEADER = struct.Struct("<4sIIQQdQQ")
+
+DELTA_MAGIC = b"FGDL"
+DELTA_VERSION = 1
+DELTA_HEADER_SIZE = 32
+_DELTA_HEADER = struct.Struct("<4sIIQQ")
+_DELTA_COUNT_OFFSET = 20
+_NAME_LENGTH = struct.Struct("<H")
+
+
+class GallerySnapshot:
+    """Snapshot ที่ map จากไฟล์ - matrix และ username table อ่านจาก mmap โดยตรง (zero-copy)"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # ใช้ตรวจว่าไฟล์ถูกแทนที่แล้วหรือยัง (os.replace เปลี่ยน inode)
+        self.file_id = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+        (magic, version, self.dim, self.count, self.generation, self.synced_at,
+         names_offset, names_size) = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"ไม่ใช่ gallery snapshot (version {VERSION}): {path}")
+        if names_offset + 8 * (self.count + 1) + names_size > len(self._mmap):
+            raise ValueError(f"gallery snapshot ไม่สมบูรณ์: {path}")
+
+        self.matrix = np.frombuffer(
+            self._mmap, dtype=np.float32, count=self.count * self.dim, offset=HEADER_SIZE
+        ).reshape(self.count, self.dim)
+        self._name_offsets = np.frombuffer(self._mmap, dtype=np.uint64, count=self.count + 1, offset=names_offset)
+        self._names_start = names_offset + 8 * (self.count + 1)
+        self._rows: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def username(self, row: int) -> str:
+        start = self._names_start + int(self._name_offsets[row])
+        end = self._names_start + int(self._name_offsets[row + 1])
+        return self._mmap[start:end].decode("utf-8")
+
+    def usernames(self) -> List[str]:
+        return [self.username(row) for row in range(self.count)]
+
+    def row(self, username: str) -> Optional[int]:
+        """row ของ username (สร้าง dict ครั้งแรกที่เรียก - ครั้งเดียวต่อ snapshot)"""
+        if self._rows is None:
+            self._rows = {username: row for row, username in enumerate(self.usernames())}
+        return self._rows.get(username)
+
+
+def write_snapshot(path: str, usernames: List[str], matrix: np.ndarray,
+                   generation: int = 0, synced_at: float = 0.0):
+    """
+    เขียน snapshot ลงไฟล์ temp แล้วแทนที่ไฟล์เดิมแบบ atomic
+    (worker ที่ map ไฟล์เดิมอยู่ยังอ่านของเดิมได้จนกว่าจะ remap)
+
+    Args:
+        path: path ของ snapshot
+        usernames: username ของแต่ละแถว
+        matrix: centroid ที่ normalize แล้ว shape (len(usernames), dim)
+        generation: เลขรุ่นของ snapshot (เพิ่มทุกครั้งที่เขียน)
+        synced_at: เวลา (unix) ที่โหลดข้อมูลจาก database ครั้งล่าสุด
+    """
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    count, dim = matrix.shape
+    if count != len(usernames):
+        raise ValueError("จำนวน usernames ไม่ตรงกับจำนวนแถวของ matrix")
+
+    names = [username.encode("utf-8") for username in usernames]
+    offsets = np.zeros(count + 1, dtype=np.uint64)
+    offsets[1:] = np.cumsum([len(name) for name in names], dtype=np.uint64)
+    names_offset = HEADER_SIZE + matrix.nbytes
+    header = _HEADER.pack(MAGIC, VERSION, dim, count, generation, synced_at, names_offset, int(offsets[-1]))
+
+    def write(f):
+        f.write(header.ljust(HEADER_SIZE, b"\0"))
+        f.write(matrix.reshape(-1).view(np.uint8).data)
+        f.write(offsets.tobytes())
+        f.write(b"".join(names))
+
+    _replace_file(path, write)
+
+
+def _replace_file(path: str, write: Callable):
+    """เขียนไฟล์ใหม่ลง temp (fsync) แล้ว os.replace"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def delta_path(path: str) -> str:
+    return path + ".delta"
+
+
+def reset_delta(path: str, dim: int, generation: int):
+    """เริ่ม delta segment ว่างของ snapshot รุ่น generation (แทนที่ delta เดิมแบบ atomic)"""
+    header = _DELTA_HEADER.pack(DELTA_MAGIC, DELTA_VERSION, dim, generation, 0)
+    _replace_file(delta_path(path), lambda f: f.write(header.ljust(DELTA_HEADER_SIZE, b"\0")))
+
+
+def read_delta_header(f) -> Optional[Tuple[int, int, int]]:
+    """(dim, generation, count) ของ delta segment หรือ None ถ้า header ไม่ถูกต้อง"""
+    f.seek(0)
+    data = f.read(DELTA_HEADER_SIZE)
+    if len(data) < DELTA_HEADER_SIZE:
+        return None
+    magic, version, dim, generation, count = _DELTA_HEADER.unpack_from(data, 0)
+    if magic != DELTA_MAGIC or version != DELTA_VERSION:
+        return None
+    return dim, generation, count
+
+
+def encode_delta_records(updates: Dict[str, np.ndarray], dim: int) -> bytes:
+    parts = []
+    for username, centroid in updates.items():
+        name = username.encode("utf-8")
+        parts.append(_NAME_LENGTH.pack(len(name)))
+        parts.append(name)
+        parts.append(np.asarray(centroid, dtype=np.float32).reshape(dim).tobytes())
+    return b"".join(parts)
+
+
+def decode_delta_records(data: bytes, dim: int) -> Tuple[List[Tuple[str, np.ndarray]], int]:
+    """
+    แยก records ที่สมบูรณ์จาก bytes ของ delta (record สุดท้ายที่ยังเขียนไม่ครบจะถูกข้าม)
+
+    Returns:
+        tuple: (list ของ (username, centroid), จำนวน bytes ที่อ่านไปแล้ว)
+    """
+    records = []
+    pos = 0
+    vector_size = 4 * dim
+    while pos + _NAME_LENGTH.size <= len(data):
+        (name_size,) = _NAME_LENGTH.unpack_from(data, pos)
+        end = pos + _NAME_LENGTH.size + name_size + vector_size
+        if end > len(data):
+            break
+        name_end = pos + _NAME_LENGTH.size + name_size
+        username = data[pos + _NAME_LENGTH.size:name_end].decode("utf-8")
+        records.append((username, np.frombuffer(data, dtype=np.float32, count=dim, offset=name_end).copy()))
+        pos = end
+    return records, pos
+
+
+@contextmanager
+def snapshot_lock(path: str):
+    """Lock ข้าม process สำหรับการสร้าง/เขียน snapshot และ delta (ไฟล์ <path>.lock)"""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + ".lock", "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _normalize_rows(rows: Iterable[Tuple[str, np.ndarray]], dim: int) -> Tuple[List[str], np.ndarray]:
+    """รวม (username, ผลรวม embedding) ที่ username ซ้ำ แล้ว normalize เป็น centroid"""
+    sums: Dict[str, np.ndarray] = {}
+    for username, emb in rows:
+        emb = np.asarray(emb, dtype=np.float32).reshape(-1)
+        if username in sums:
+            sums[username] = sums[username] + emb
+        else:
+            sums[username] = emb
+
+    usernames = list(sums)
+    matrix = np.zeros((len(usernames), dim), dtype=np.float32)
+    for row, username in enumerate(usernames):
+        matrix[row] = sums[username]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return usernames, matrix
+
+
+class _GalleryView:
+    """
+    สถานะที่ search ใช้ (สร้างใหม่แล้วสลับทั้งก้อน - search อ่านโดยไม่ต้อง lock)
+
+    - snapshot: แถวจาก snapshot ที่ map ไว้
+    - overlay: centroid จาก delta (user ใหม่ หรือ user ที่ centroid ใน snapshot เก่าแล้ว)
+    - masked: rows ใน snapshot ที่ถูก overlay แทนที่ (เรียงจากน้อยไปมาก)
+    - ann: ANN index ของ snapshot (None = exact scan)
+    """
+
+    __slots__ = ("snapshot", "delta_id", "delta_offset", "overlay_names", "overlay_rows",
+                 "overlay_matrix", "masked", "ann")
+
+    def __init__(self, snapshot: GallerySnapshot, dim: int, ann=None):
+        self.snapshot = snapshot
+        self.delta_id = None
+        self.delta_offset = DELTA_HEADER_SIZE
+        self.overlay_names: List[str] = []
+        self.overlay_rows: Dict[str, int] = {}
+        self.overlay_matrix = np.zeros((0, dim), dtype=np.float32)
+        self.masked = np.empty(0, dtype=np.int64)
+        self.ann = ann
+
+    def apply(self, records: List[Tuple[str, np.ndarray]], delta_id, delta_offset: int) -> "_GalleryView":
+        """view ใหม่ที่รวม records จาก delta (ไม่แก้ view เดิมที่ search อื่นอาจใช้อยู่)"""
+        view = _GalleryView(self.snapshot, self.overlay_matrix.shape[1], self.ann)
+        view.delta_id = delta_id
+        view.delta_offset = delta_offset
+        view.overlay_names = list(self.overlay_names)
+        view.overlay_rows = dict(self.overlay_rows)
+        matrix = list(self.overlay_matrix)
+        masked = set(self.masked.tolist())
+        for username, centroid in records:
+            row = view.overlay_rows.get(username)
+            if row is not None:
+                matrix[row] = centroid
+                continue
+            base_row = self.snapshot.row(username)
+            if base_row is not None:
+                masked.add(base_row)
+            view.overlay_rows[username] = len(view.overlay_names)
+            view.overlay_names.append(username)
+            matrix.append(centroid)
+        if matrix:
+            view.overlay_matrix = np.stack(matrix).astype(np.float32, copy=False)
+        view.masked = np.array(sorted(masked), dtype=np.int64)
+        return view
+
+    def __len__(self) -> int:
+        return self.snapshot.count - len(self.masked) + len(self.overlay_names)
+
+
+class SharedGallery:
+    """
+    Gallery ที่อ่านจาก snapshot file (mmap) + delta segment - interface เดียวกับ EmbeddingGallery
+
+    - search: ตรวจไฟล์ทุก check_interval วินาที (snapshot ถูกแทนที่ = remap, delta โต = อ่านเฉพาะส่วนใหม่)
+    - set_user: รวม updates ที่มาติดๆ กัน (publish_delay) แล้วต่อท้าย delta ใน background
+    - index_factory: ANN index ของแถวใน snapshot (build ต่อ worker ใน background ทุกครั้งที่ remap)
+      แถวใน overlay คำนวณแบบ exact เสมอ - ใช้ exact_fallback / fallback_margin เหมือน EmbeddingGallery
+
+    Args:
+        compact_rows: จำนวน records ใน delta ที่จะรวมเข้า snapshot ใหม่
+    """
+
+    def __init__(self, path: str, dim: int, check_interval: float = 0.5,
+                 max_age: float = 0.0, publish_delay: float = 0.05, compact_rows: int = 10000,
+                 index_factory: Optional[Callable] = None, min_index_size: int = 0,
+                 exact_fallback: bool = True, fallback_margin: float = 0.0):
+        self.path = path
+        self.dim = dim
+        self._check_interval = check_interval
+        self._max_age = max_age
+        self._publish_delay = publish_delay
+        self._compact_rows = max(1, compact_rows)
+        self._index_factory = index_factory
+        self._min_index_size = min_index_size
+        self._exact_fallback = exact_fallback
+        self._fallback_margin = fallback_margin
+        self._view: Optional[_GalleryView] = None
+        self._checked_at = 0.0
+        self._remap_lock = threading.Lock()
+        self._pending: Dict[str, np.ndarray] = {}
+        self._pending_lock = threading.Lock()
+        self._publishing = False
+
+    @property
+    def loaded(self) -> bool:
+        return self._view is not None
+
+    @property
+    def generation(self) -> Optional[int]:
+        view = self._view
+        return view.snapshot.generation if view is not None else None
+
+    def __len__(self) -> int:
+        view = self._view
+        return len(view) if view is not None else 0
+
+    # ---------- mapping ----------
+    def _remap(self, force: bool = False):
+        """map snapshot ใหม่ถ้าไฟล์ถูกแทนที่ (หรือ force) แล้วอ่าน records ใหม่จาก delta"""
+        with self._remap_lock:
+            self._checked_at = time.monotonic()
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                return
+            view = self._view
+            file_id = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            if force or view is None or view.snapshot.file_id != file_id:
+                # mapping เดิมถูกปล่อยเมื่อ search ที่ยังใช้อยู่ทำงานเสร็จ
+                view = _GalleryView(GallerySnapshot(self.path), self.dim)
+                if self._index_factory is not None and view.snapshot.count >= self._min_index_size:
+                    threading.Thread(target=self._build_index, args=(view.snapshot,), daemon=True).start()
+            self._view = self._read_delta(view)
+
+    def _read_delta(self, view: _GalleryView) -> _GalleryView:
+        """อ่าน records ที่ต่อท้าย delta หลังจากครั้งล่าสุด (delta ของ snapshot รุ่นอื่นถูกข้าม)"""
+        try:
+            f = open(delta_path(self.path), "rb")
+        except FileNotFoundError:
+            return view
+        with f:
+            stat = os.fstat(f.fileno())
+            delta_id = stat.st_ino
+            header = read_delta_header(f)
+            if header is None or header[0] != self.dim or header[1] != view.snapshot.generation:
+                # delta ของ snapshot รุ่นก่อน (records รวมอยู่ใน snapshot แล้ว) หรือรุ่นใหม่ที่ยังไม่ได้ remap
+                return view
+            if delta_id != view.delta_id:
+                # delta ไฟล์ใหม่ของ snapshot เดิม (เช่น reset หลังโหลดใหม่) - เริ่มจาก overlay ว่าง
+                view = _GalleryView(view.snapshot, self.dim, view.ann)
+            if stat.st_size <= view.delta_offset and delta_id == view.delta_id:
+                return view
+            f.seek(view.delta_offset)
+            records, consumed = decode_delta_records(f.read(), self.dim)
+        return view.apply(records, delta_id, view.delta_offset + consumed)
+
+    def _build_index(self, snapshot: GallerySnapshot):
+        """build ANN index ของ snapshot (นอก lock) แล้วติดให้ view ปัจจุบันถ้ายังเป็น snapshot เดิม"""
+        try:
+            index = self._index_factory()
+            index.build(snapshot.matrix)
+        except Exception as e:
+            print(f"Gallery snapshot index build error: {e}")
+            return
+        with self._remap_lock:
+            view = self._view
+            if view is not None and view.snapshot is snapshot:
+                view.ann = index
+
+    def _maybe_remap(self):
+        if time.monotonic() - self._checked_at >= self._check_interval:
+            self._remap()
+
+    def _is_fresh(self) -> bool:
+        """มี snapshot ที่ยังไม่หมดอายุ (นับจากการ sync กับ database ครั้งล่าสุด) หรือไม่"""
+        try:
+            snapshot = GallerySnapshot(self.path)
+        except (FileNotFoundError, ValueError):
+            return False
+        if snapshot.dim != self.dim:
+            return False
+        return self._max_age <= 0 or time.time() - snapshot.synced_at <= self._max_age
+
+    # ---------- loading ----------
+    def open(self, loader: Callable[[], Iterable[Tuple[str, np.ndarray]]]):
+        """
+        map snapshot ที่มีอยู่ หรือสร้างใหม่จาก loader (เช่น load_all_centroids) ถ้ายังไม่มี/หมดอายุ
+        worker ที่ start พร้อมกันจะรอ worker แรกสร้างเสร็จแล้ว map ไฟล์เดียวกัน
+        """
+        with snapshot_lock(self.path):
+            if not self._is_fresh():
+                self._write_rows_locked(loader())
+        self._remap(force=True)
+
+    def load(self, rows: Iterable[Tuple[str, np.ndarray]]):
+        """สร้าง snapshot ใหม่ทั้งหมดจาก (username, ผลรวม embedding)"""
+        with snapshot_lock(self.path):
+            self._write_rows_locked(rows)
+        self._remap(force=True)
+
+    def _latest_generation_locked(self) -> int:
+        try:
+            with open(self.path, "rb") as f:
+                return _HEADER.unpack(f.read(_HEADER.size))[4]
+        except (FileNotFoundError, struct.error):
+            return -1
+
+    def _write_rows_locked(self, rows: Iterable[Tuple[str, np.ndarray]]):
+        usernames, matrix = _normalize_rows(rows, self.dim)
+        generation = self._latest_generation_locked() + 1
+        write_snapshot(self.path, usernames, matrix, generation=generation, synced_at=time.time())
+        reset_delta(self.path, self.dim, generation)
+
+    # ---------- updates ----------
+    def set_user(self, username: str, embedding_sum: np.ndarray):
+        """กำหนดผลรวม embedding ล่าสุดของ user - ต่อท้าย delta ใน background"""
+        embedding_sum = np.asarray(embedding_sum, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(embedding_sum)
+        centroid = embedding_sum / norm if norm > 0 else embedding_sum
+
+        with self._pending_lock:
+            self._pending[username] = centroid
+            if self._publishing:
+                return
+            self._publishing = True
+        threading.Thread(target=self._publish_loop, daemon=True).start()
+
+    def _publish_loop(self):
+        # รอให้ updates ที่มาติดๆ กัน (เช่น bulk register) รวมเป็นการเขียนครั้งเดียว
+        time.sleep(self._publish_delay)
+        while True:
+            with self._pending_lock:
+                updates, self._pending = self._pending, {}
+                if not updates:
+                    self._publishing = False
+                    return
+            try:
+                self._publish(updates)
+            except Exception as e:
+                print(f"Gallery snapshot publish error: {e}")
+                with self._pending_lock:
+                    # เก็บ updates ไว้ลองใหม่ตอนลงทะเบียนครั้งถัดไป (ไม่ทับค่าที่ใหม่กว่า)
+                    for username, centroid in updates.items():
+                        self._pending.setdefault(username, centroid)
+                    self._publishing = False
+                return
+
+    def _publish(self, updates: Dict[str, np.ndarray]):
+        """ต่อท้าย updates ลง delta ของ snapshot ล่าสุดบน disk (รวมเข้า snapshot เมื่อครบ compact_rows)"""
+        with snapshot_lock(self.path):
+            generation = self._latest_generation_locked()
+            if generation < 0:
+                # ยังไม่มี snapshot - เริ่มจาก updates ชุดนี้
+                self._write_rows_locked(updates.items())
+            else:
+                count = self._append_delta_locked(generation, updates)
+                if count >= self._compact_rows:
+                    self._compact_locked()
+        self._remap()
+
+    def _append_delta_locked(self, generation: int, updates: Dict[str, np.ndarray]) -> int:
+        """ต่อท้าย records (fsync ก่อน update จำนวนใน header) - คืนจำนวน records ใน delta"""
+        path = delta_path(self.path)
+        try:
+            f = open(path, "r+b")
+        except FileNotFoundError:
+            f = None
+        if f is not None:
+            header = read_delta_header(f)
+            if header is None or header[0] != self.dim or header[1] != generation:
+                f.close()
+                f = None
+        if f is None:
+            reset_delta(self.path, self.dim, generation)
+            f = open(path, "r+b")
+            header = read_delta_header(f)
+
+        with f:
+            count = header[2] + len(updates)
+            f.seek(0, os.SEEK_END)
+            f.write(encode_delta_records(updates, self.dim))
+            f.flush()
+            os.fsync(f.fileno())
+            f.seek(_DELTA_COUNT_OFFSET)
+            f.write(struct.pack("<Q", count))
+            f.flush()
+        return count
+
+    def _compact_locked(self):
+        """รวม delta เข้า snapshot ใหม่ (รุ่นถัดไป) แล้วเริ่ม delta ว่าง"""
+        latest = GallerySnapshot(self.path)
+        with open(delta_path(self.path), "rb") as f:
+            f.seek(DELTA_HEADER_SIZE)
+            records, _ = decode_delta_records(f.read(), self.dim)
+
+        updates = dict(records)
+        usernames = latest.usernames()
+        new_users = [username for username in updates if latest.row(username) is None]
+        matrix = np.empty((latest.count + len(new_users), self.dim), dtype=np.float32)
+        matrix[:latest.count] = latest.matrix
+        usernames.extend(new_users)
+        for row, username in enumerate(new_users, start=latest.count):
+            matrix[row] = updates.pop(username)
+        for username, centroid in updates.items():
+            matrix[latest.row(username)] = centroid
+
+        generation = latest.generation + 1
+        write_snapshot(self.path, usernames, matrix, generation=generation, synced_at=latest.synced_at)
+        # snapshot ใหม่รวม records เดิมแล้ว - worker ที่ยังอ่าน delta เก่าอยู่จะข้ามเพราะ generation ไม่ตรง
+        reset_delta(self.path, self.dim, generation)
+        del latest
+
+    def rebuild_index(self):
+        """Build ANN index ของ snapshot ปัจจุบันใหม่ (เช่นหลังเปลี่ยน IVF_NLIST)"""
+        view = self._view
+        if view is not None and self._index_factory is not None:
+            self._build_index(view.snapshot)
+
+    # ---------- query ----------
+    def search(self, query: np.ndarray, threshold: Optional[float] = None) -> Tuple[Optional[str], Optional[float]]:
+        """
+        หา user ที่ใกล้ที่สุด (cosine similarity) บน matrix ที่ map ไว้ + overlay จาก delta
+        ถ้ามี ANN index จะคำนวณ score เฉพาะ candidates ของ snapshot (overlay คำนวณทุกแถว)
+        แล้ว scan ทั้งหมดซ้ำตามกติกาเดียวกับ EmbeddingGallery.search
+
+        Returns:
+            tuple: (username, score) หรือ (None, None) ถ้า gallery ว่าง
+        """
+        self._maybe_remap()
+        view = self._view
+        if view is None or len(view) == 0:
+            return None, None
+        query = np.asarray(query, dtype=np.float32)
+        snapshot = view.snapshot
+
+        best_name, best_score = None, -np.inf
+        if len(view.overlay_names):
+            overlay_scores = view.overlay_matrix @ query
+            best = int(np.argmax(overlay_scores))
+            best_name, best_score = view.overlay_names[best], float(overlay_scores[best])
+
+        rows = view.ann.candidates(query) if view.ann is not None else None
+        partial = rows is not None and len(rows) < snapshot.count
+        if rows is None:
+            scores = snapshot.matrix @ query
+            if len(view.masked):
+                scores[view.masked] = -np.inf
+            rows = np.arange(snapshot.count)
+        else:
+            if len(view.masked):
+                rows = rows[~np.isin(rows, view.masked)]
+            scores = snapshot.matrix[rows] @ query
+
+        if len(rows):
+            best = int(np.argmax(scores))
+            if float(scores[best]) > best_score:
+                best_name, best_score = snapshot.username(int(rows[best])), float(scores[best])
+
+        if partial and self._exact_fallback and (
+                threshold is None or best_score < threshold + self._fallback_margin):
+            scores = snapshot.matrix @ query
+            if len(view.masked):
+                scores[view.masked] = -np.inf
+            if snapshot.count:
+                best = int(np.argmax(scores))
+                if float(scores[best]) > best_score:
+                    best_name, best_score = snapshot.username(best), float(scores[best])
+
+        return best_name, best_score
+
+    def usernames(self) -> List[str]:
+        view = self._view
+        if view is None:
+            return []
+        masked = set(view.masked.tolist())
+        return [username for row, username in enumerate(view.snapshot.usernames())
+                if row not in masked] + list(view.overlay_names)
@@ -0,0 +1,106 @@
+"""
+Metrics Module
+Counter / Gauge / Histogram ของระบบ (prometheus_client) และ export เป็น Prometheus text format
+"""
+
+import time
+from functools import wraps
+from typing import Callable
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    disable_created_metrics,
+    generate_latest,
+)
+
+
+# ไม่ export *_created ของ counter/histogram (timestamp ตอนสร้าง label set ไม่ได้ใช้)
+disable_created_metrics()
+
+# bucket (วินาที) ครอบคลุมตั้งแต่ matching ระดับ ms จนถึง request ที่รอคิวหลายวินาที
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# registry แยกของระบบ (ไม่รวม process/platform collector ของ default registry)
+REGISTRY = CollectorRegistry()
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+
+def render_metrics() -> bytes:
+    """Export ทุก metric เป็น Prometheus text exposition format"""
+    return generate_latest(REGISTRY)
+
+
+# ==================================================
+# Metrics ของระบบ
+# ==================================================
+# Counter ตั้งชื่อโดยไม่มี _total - prometheus_client เติม _total ให้ตอน export
+HTTP_REQUESTS = Counter(
+    "face_api_requests", "HTTP requests ทั้งหมด", ["method", "route", "status"], registry=REGISTRY)
+HTTP_REQUEST_SECONDS = Histogram(
+    "face_api_request_duration_seconds", "เวลาตอบ HTTP request", ["method", "route"],
+    buckets=DEFAULT_BUCKETS, registry=REGISTRY)
+HTTP_IN_FLIGHT = Gauge(
+    "face_api_requests_in_flight", "จำนวน request ที่กำลังประมวลผล", registry=REGISTRY)
+
+STAGE_SECONDS = Histogram(
+    "face_stage_duration_seconds", "เวลาประมวลผลของแต่ละ stage ใน executor (รวมคิวของ executor)", ["stage"],
+    buckets=DEFAULT_BUCKETS, registry=REGISTRY)
+STAGE_WAIT_SECONDS = Histogram(
+    "face_stage_wait_seconds", "เวลารอ concurrency limit ของ stage ก่อนส่งเข้า executor", ["stage"],
+    buckets=DEFAULT_BUCKETS, registry=REGISTRY)
+STAGE_IN_FLIGHT = Gauge(
+    "face_stage_in_flight", "จำนวนงานที่กำลังรันหรือรอในแต่ละ stage", ["stage"], registry=REGISTRY)
+
+QUALITY_FAILURES = Counter(
+    "face_quality_failures", "รูปที่ไม่ผ่าน quality check แยกตามเหตุผล", ["reason"], registry=REGISTRY)
+DETECTION_FAILURES = Counter(
+    "face_detection_failures", "รูปที่ detect ใบหน้าไม่ผ่าน", ["reason"], registry=REGISTRY)
+VERIFICATIONS = Counter(
+    "face_verifications", "ผลการยืนยันตัวตน", ["mode", "outcome"], registry=REGISTRY)
+ATTENDANCE_DUPLICATES = Counter(
+    "face_attendance_duplicates", "check-in/check-out ซ้ำที่คืน record เดิม แยกตามจุดที่ตรวจพบ", ["stage"], registry=REGISTRY)
+UPLOAD_CACHE_REQUESTS = Counter(
+    "face_upload_cache_requests", "การค้นหาผลวิเคราะห์ของไฟล์ที่ upload ซ้ำ (hit/miss)", ["result"], registry=REGISTRY)
+KIOSK_CONNECTIONS = Gauge(
+    "face_kiosk_connections", "จำนวน kiosk WebSocket ที่เชื่อมต่ออยู่", registry=REGISTRY)
+KIOSK_FRAMES = Counter(
+    "face_kiosk_frames", "เฟรมจาก kiosk WebSocket แยกตามผล (processed / dropped / stale / invalid)", ["result"], registry=REGISTRY)
+
+DB_QUERY_SECONDS = Histogram(
+    "face_db_query_duration_seconds", "เวลาของแต่ละ database operation", ["operation"],
+    buckets=DEFAULT_BUCKETS, registry=REGISTRY)
+DB_ERRORS = Counter(
+    "face_db_errors", "database operation ที่ล้มเหลว", ["operation"], registry=REGISTRY)
+
+DB_POOL_CONNECTIONS = Gauge(
+    "face_db_pool_connections", "connection ใน pool แยกตามสถานะ", ["state"], registry=REGISTRY)
+
+GALLERY_USERS = Gauge(
+    "face_gallery_users", "จำนวน users ใน gallery ใน memory", registry=REGISTRY)
+
+MODEL_LOAD_SECONDS = Gauge(
+    "face_model_load_seconds", "เวลาโหลด model", ["model"], registry=REGISTRY)
+MODEL_WARMUP_SECONDS = Gauge(
+    "face_model_warmup_seconds", "เวลา warm-up inference ครั้งแรกของ model", ["model"], registry=REGISTRY)
+
+
+def timed_db(func: Callable) -> Callable:
+    """Decorator วัดเวลา/นับ error ของ database helper (ใช้ชื่อฟังก์ชันเป็น operation)"""
+    histogram = DB_QUERY_SECONDS.labels(operation=func.__name__)
+    errors = DB_ERRORS.labels(operation=func.__name__)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            histogram.observe(time.perf_counter() - start)
+    return wrapper
@@ -0,0 +1,119 @@
+"""
+Model Registry
+โหลด model แบบ lazy (ครั้งแรกที่ใช้งาน) และ warm-up ตอน startup
+
+- import core / services ไม่โหลด model อีกต่อไป (scripts และ tests เริ่มเร็ว)
+- server เรียก warm_up() ตอน startup: โหลด + รัน inference หลอกหนึ่งครั้งต่อ model
+  เพื่อให้ ONNX Runtime จัดสรร memory ให้เสร็จก่อนรับ request จริง
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+from .metrics import MODEL_LOAD_SECONDS, MODEL_WARMUP_SECONDS
+
+
+class _Entry:
+    def __init__(self, loader: Callable[[], Any], warmup: Optional[Callable[[Any], None]]):
+        self.loader = loader
+        self.warmup = warmup
+        self.model = None
+        self.lock = threading.Lock()
+        self.load_seconds: Optional[float] = None
+        self.warmup_seconds: Optional[float] = None
+        self.error: Optional[str] = None
+
+
+class ModelRegistry:
+    """เก็บ loader ของแต่ละ model แล้วโหลดเมื่อถูกเรียกครั้งแรก (thread-safe)"""
+
+    def __init__(self):
+        self._entries: Dict[str, _Entry] = {}
+        self.ready = False
+
+    def register(self, name: str, loader: Callable[[], Any], warmup: Optional[Callable[[Any], None]] = None):
+        """
+        ลงทะเบียน model
+
+        Args:
+            name: ชื่อ model
+            loader: ฟังก์ชันสร้าง model (เรียกครั้งเดียว)
+            warmup: ฟังก์ชันรัน inference หลอกกับ model ที่โหลดแล้ว
+        """
+        self._entries[name] = _Entry(loader, warmup)
+
+    def get(self, name: str) -> Any:
+        """คืน model (โหลดก่อนถ้ายังไม่ได้โหลด)"""
+        entry = self._entries[name]
+        if entry.model is None:
+            with entry.lock:
+                if entry.model is None:
+                    start = time.perf_counter()
+                    try:
+                        model = entry.loader()
+                    except Exception as e:
+                        entry.error = f"{type(e).__name__}: {e}"
+                        raise
+                    entry.load_seconds = time.perf_counter() - start
+                    entry.error = None
+                    MODEL_LOAD_SECONDS.labels(model=name).set(entry.load_seconds)
+                    entry.model = model
+        return entry.model
+
+    def warm_up(self, names: Optional[Iterable[str]] = None) -> Dict[str, Dict]:
+        """
+        โหลดและ warm-up models (default = ทุกตัว) - ตั้ง ready เมื่อสำเร็จทุกตัว
+
+        Returns:
+            dict: สถานะของแต่ละ model (เหมือน status())
+        """
+        ok = True
+        for name in names if names is not None else list(self._entries):
+            entry = self._entries[name]
+            try:
+                model = self.get(name)
+                if entry.warmup is not None and entry.warmup_seconds is None:
+                    start = time.perf_counter()
+                    entry.warmup(model)
+                    entry.warmup_seconds = time.perf_counter() - start
+                    MODEL_WARMUP_SECONDS.labels(model=name).set(entry.warmup_seconds)
+            except Exception as e:
+                entry.error = f"{type(e).__name__}: {e}"
+                ok = False
+        self.ready = ok
+        return self.status()
+
+    def status(self) -> Dict[str, Dict]:
+        return {
+            name: {
+                "loaded": entry.model is not None,
+                "load_seconds": round(entry.load_seconds, 3) if entry.load_seconds is not None else None,
+                "warmup_seconds": round(entry.warmup_seconds, 3) if entry.warmup_seconds is not None else None,
+                "error": entry.error,
+            }
+            for name, entry in self._entries.items()
+        }
+
+
+_registry = ModelRegistry()
+
+
+def register_model(name: str, loader: Callable[[], Any], warmup: Optional[Callable[[Any], None]] = None):
+    _registry.register(name, loader, warmup)
+
+
+def get_model(name: str) -> Any:
+    return _registry.get(name)
+
+
+def warm_up_models() -> Dict[str, Dict]:
+    """โหลดและ warm-up ทุก model (เรียกตอน startup)"""
+    return _registry.warm_up()
+
+
+def models_ready() -> bool:
+    return _registry.ready
+
+
+def get_model_status() -> Dict[str, Dict]:
+    return _registry.status()
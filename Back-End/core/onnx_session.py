@@ -0,0 +1,67 @@
+"""
+ONNX Runtime Session Module
+สร้าง InferenceSession ด้วย SessionOptions จาก settings (threads, graph optimization,
+execution mode, memory arena) - ใช้ร่วมกันทุก model
+
+InferenceSession.run เรียกพร้อมกันจากหลาย thread ได้ จึงแชร์ session เดียวต่อ model ได้เลย
+"""
+
+from typing import Optional
+import onnxruntime as ort
+from config.settings import (
+    ORT_INTRA_OP_THREADS,
+    ORT_INTER_OP_THREADS,
+    ORT_GRAPH_OPTIMIZATION,
+    ORT_EXECUTION_MODE,
+    ORT_ENABLE_MEM_ARENA,
+)
+
+
+_GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+_EXECUTION_MODES = {
+    "sequential": ort.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel": ort.ExecutionMode.ORT_PARALLEL,
+}
+
+
+def create_session_options() -> ort.SessionOptions:
+    """SessionOptions ตาม settings"""
+    if ORT_GRAPH_OPTIMIZATION not in _GRAPH_OPTIMIZATION_LEVELS:
+        raise ValueError(f"ไม่รู้จัก ORT_GRAPH_OPTIMIZATION: {ORT_GRAPH_OPTIMIZATION}")
+    if ORT_EXECUTION_MODE not in _EXECUTION_MODES:
+        raise ValueError(f"ไม่รู้จัก ORT_EXECUTION_MODE: {ORT_EXECUTION_MODE}")
+
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = ORT_INTRA_OP_THREADS
+    options.inter_op_num_threads = ORT_INTER_OP_THREADS
+    options.graph_optimization_level = _GRAPH_OPTIMIZATION_LEVELS[ORT_GRAPH_OPTIMIZATION]
+    options.execution_mode = _EXECUTION_MODES[ORT_EXECUTION_MODE]
+    options.enable_cpu_mem_arena = ORT_ENABLE_MEM_ARENA
+    return options
+
+
+def create_session(model_path: str, log_severity_level: Optional[int] = None) -> ort.InferenceSession:
+    """
+    สร้าง InferenceSession (CPU) ของ model
+
+    Args:
+        model_path: path ของไฟล์ .onnx
+        log_severity_level: ระดับ log ของ session (0=verbose ... 3=error, None = ค่าเริ่มต้นของ ORT)
+
+    Returns:
+        ort.InferenceSession
+    """
+    options = create_session_options()
+    if log_severity_level is not None:
+        options.log_severity_level = log_severity_level
+    return ort.InferenceSession(
+        model_path,
+        sess_options=options,
+        providers=["CPUExecutionProvider"],
+    )
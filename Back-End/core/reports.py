@@ -0,0 +1,358 @@
+"""
+Attendance Reports
+รายงาน attendance ที่คำนวณใน database (GROUP BY) แล้วแบ่งหน้าด้วย keyset cursor
+
+- แต่ละหน้า = users ถัดจาก cursor (เรียงตาม user_id) ไม่เกิน limit คน
+- aggregate เฉพาะแถวของ users ในหน้านั้นผ่าน index (user_id, timestamp)
+  เวลาต่อหน้าจึงขึ้นกับข้อมูลของหน้านั้น ไม่ขึ้นกับประวัติทั้งหมดในตาราง
+- cursor เป็น string ทึบ (base64) ส่งกลับมาเพื่อขอหน้าถัดไป
+
+Export: stream แถวดิบด้วย unbuffered cursor (อ่านจาก socket ทีละ batch) เป็น CSV / NDJSON
+และ gzip ระหว่างส่ง - memory คงที่ไม่ว่าช่วงวันที่จะยาวแค่ไหน
+"""
+
+import base64
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+from config.settings import WORK_START_TIMES, LATE_GRACE_MINUTES, EXPORT_FETCH_SIZE
+from .database import db_connection, get_pool
+from .metrics import timed_db
+
+
+# สรุปต่อ user ต่อวัน (ใช้ทั้งรายงานรายวันและรายเดือน)
+_DAILY_SQL = """
+    SELECT a.user_id, DATE(a.timestamp) AS day,
+           MIN(CASE WHEN a.action = 'check_in' THEN a.timestamp END) AS first_in,
+           MAX(CASE WHEN a.action = 'check_out' THEN a.timestamp END) AS last_out,
+           SUM(a.action = 'check_in') AS check_ins,
+           SUM(a.action = 'check_out') AS check_outs
+    FROM attendance a
+    WHERE a.user_id IN ({placeholders})
+      AND a.timestamp >= %s AND a.timestamp < %s
+    GROUP BY a.user_id, DATE(a.timestamp)
+"""
+
+
+def encode_cursor(user_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"after": user_id}).encode()).decode()
+
+
+def decode_cursor(cursor: Optional[str]) -> int:
+    """แปลง cursor เป็น user_id สุดท้ายของหน้าก่อน (ValueError ถ้า cursor ไม่ถูกต้อง)"""
+    if not cursor:
+        return 0
+    try:
+        return int(json.loads(base64.urlsafe_b64decode(cursor.encode()))["after"])
+    except Exception:
+        raise ValueError("cursor ไม่ถูกต้อง")
+
+
+def _date_range(start: date, end: date) -> Tuple[datetime, datetime]:
+    """ช่วงเวลา [start 00:00, end+1 00:00) - เทียบกับ column timestamp ตรงๆ เพื่อให้ใช้ index ได้"""
+    return datetime.combine(start, time.min), datetime.combine(end + timedelta(days=1), time.min)
+
+
+def _users_page(cur, after: int, limit: int, username: Optional[str]) -> List[Tuple[int, str]]:
+    """users ของหน้านี้ (keyset: id > after)"""
+    if username:
+        cur.execute("SELECT id, username FROM users WHERE username = %s AND id > %s", (username, after))
+    else:
+        cur.execute("SELECT id, username FROM users WHERE id > %s ORDER BY id LIMIT %s", (after, limit))
+    return cur.fetchall()
+
+
+def _page(users: List[Tuple[int, str]], limit: int, items: List[Dict]) -> Dict:
+    next_cursor = encode_cursor(users[-1][0]) if len(users) == limit else None
+    return {"items": items, "next_cursor": next_cursor, "limit": limit}
+
+
+def _format_time(value: Optional[datetime]) -> Optional[str]:
+    return value.strftime("%Y-%m-%d %H:%M:%S") if value is not None else None
+
+
+@timed_db
+def get_daily_report(start: date, end: date, limit: int, cursor: Optional[str] = None,
+                     username: Optional[str] = None) -> Dict:
+    """
+    เข้างานครั้งแรก / ออกงานครั้งสุดท้ายต่อ user ต่อวัน
+
+    Returns:
+        dict: {"items": [...], "next_cursor": str หรือ None, "limit": int}
+    """
+    after = decode_cursor(cursor)
+    with db_connection() as conn:
+        cur = conn.cursor()
+        users = _users_page(cur, after, limit, username)
+        rows = []
+        if users:
+            placeholders = ", ".join(["%s"] * len(users))
+            cur.execute(
+                _DAILY_SQL.format(placeholders=placeholders) + " ORDER BY a.user_id, day",
+                (*[user_id for user_id, _ in users], *_date_range(start, end))
+            )
+            rows = cur.fetchall()
+        cur.close()
+
+    names = dict(users)
+    items = [
+        {
+            "username": names[user_id],
+            "date": day.isoformat(),
+            "first_in": _format_time(first_in),
+            "last_out": _format_time(last_out),
+            "check_ins": int(check_ins),
+            "check_outs": int(check_outs),
+        }
+        for user_id, day, first_in, last_out, check_ins, check_outs in rows
+    ]
+    return _page(users, limit, items)
+
+
+@timed_db
+def get_lateness_report(start: date, end: date, limit: int, cursor: Optional[str] = None,
+                        username: Optional[str] = None) -> Dict:
+    """
+    การมาสายต่อ user ต่อ time_period: ใช้ check-in ครั้งแรกของแต่ละวันในช่วงนั้น
+    เทียบกับ WORK_START_TIMES (เกิน LATE_GRACE_MINUTES นับว่าสาย)
+
+    Returns:
+        dict: {"items": [...], "next_cursor": str หรือ None, "limit": int}
+    """
+    after = decode_cursor(cursor)
+    periods = list(WORK_START_TIMES.items())
+    with db_connection() as conn:
+        cur = conn.cursor()
+        users = _users_page(cur, after, limit, username)
+        rows = []
+        if users and periods:
+            user_placeholders = ", ".join(["%s"] * len(users))
+            period_placeholders = ", ".join(["%s"] * len(periods))
+            start_time_case = "CASE a.time_period " + " ".join(["WHEN %s THEN %s"] * len(periods)) + " END"
+            cur.execute(f"""
+                SELECT d.user_id, d.time_period,
+                       COUNT(*) AS days,
+                       SUM(d.late_minutes > 0) AS late_days,
+                       SUM(d.late_minutes) AS late_minutes,
+                       MAX(d.late_minutes) AS max_late_minutes
+                FROM (
+                    SELECT a.user_id, a.time_period,
+                           GREATEST(0, TIMESTAMPDIFF(
+                               MINUTE,
+                               TIMESTAMP(DATE(MIN(a.timestamp)), {start_time_case}),
+                               MIN(a.timestamp)
+                           ) - %s) AS late_minutes
+                    FROM attendance a
+                    WHERE a.user_id IN ({user_placeholders})
+                      AND a.timestamp >= %s AND a.timestamp < %s
+                      AND a.action = 'check_in'
+                      AND a.time_period IN ({period_placeholders})
+                    GROUP BY a.user_id, a.time_period, DATE(a.timestamp)
+                ) d
+                GROUP BY d.user_id, d.time_period
+                ORDER BY d.user_id, d.time_period
+            """, (
+                *[value for period, start_time in periods for value in (period, start_time)],
+                LATE_GRACE_MINUTES,
+                *[user_id for user_id, _ in users],
+                *_date_range(start, end),
+                *[period for period, _ in periods],
+            ))
+            rows = cur.fetchall()
+        cur.close()
+
+    names = dict(users)
+    items = [
+        {
+            "username": names[user_id],
+            "time_period": time_period,
+            "start_time": WORK_START_TIMES[time_period],
+            "days": int(days),
+            "late_days": int(late_days),
+            "late_minutes": int(late_minutes),
+            "max_late_minutes": int(max_late_minutes),
+        }
+        for user_id, time_period, days, late_days, late_minutes, max_late_minutes in rows
+    ]
+    return _page(users, limit, items)
+
+
+@timed_db
+def get_monthly_report(start: date, end: date, limit: int, cursor: Optional[str] = None,
+                       username: Optional[str] = None) -> Dict:
+    """
+    ยอดรวมต่อ user ต่อเดือน: จำนวนวันที่เข้างาน, จำนวน check-in/check-out
+    และชั่วโมงทำงาน (ผลรวมของ ออกงานครั้งสุดท้าย - เข้างานครั้งแรก ของแต่ละวัน)
+
+    Returns:
+        dict: {"items": [...], "next_cursor": str หรือ None, "limit": int}
+    """
+    after = decode_cursor(cursor)
+    with db_connection() as conn:
+        cur = conn.cursor()
+        users = _users_page(cur, after, limit, username)
+        rows = []
+        if users:
+            placeholders = ", ".join(["%s"] * len(users))
+            daily_sql = _DAILY_SQL.format(placeholders=placeholders)
+            cur.execute(f"""
+                SELECT d.user_id, DATE_FORMAT(d.day, '%%Y-%%m') AS month,
+                       SUM(d.first_in IS NOT NULL) AS days_present,
+                       SUM(d.check_ins) AS check_ins,
+                       SUM(d.check_outs) AS check_outs,
+                       SUM(CASE WHEN d.last_out > d.first_in
+                                THEN TIMESTAMPDIFF(SECOND, d.first_in, d.last_out) ELSE 0 END) AS worked_seconds
+                FROM ({daily_sql}) d
+                GROUP BY d.user_id, month
+                ORDER BY d.user_id, month
+            """, (*[user_id for user_id, _ in users], *_date_range(start, end)))
+            rows = cur.fetchall()
+        cur.close()
+
+    names = dict(users)
+    items = [
+        {
+            "username": names[user_id],
+            "month": month,
+            "days_present": int(days_present),
+            "check_ins": int(check_ins),
+            "check_outs": int(check_outs),
+            "worked_hours": round(int(worked_seconds) / 3600, 2),
+        }
+        for user_id, month, days_present, check_ins, check_outs, worked_seconds in rows
+    ]
+    return _page(users, limit, items)
+
+
+# ==================================================
+# Export (streaming)
+# ==================================================
+EXPORT_COLUMNS = ("id", "username", "action", "time_period", "similarity_score", "timestamp", "site_id")
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+class AttendanceExport:
+    """
+    ผลลัพธ์ของ query export ที่ยังอ่านไม่หมด - iterate ได้ทีละ batch
+    ถือ connection ไว้จนอ่านครบหรือ close() (client ตัดการเชื่อมต่อกลางทาง)
+    """
+
+    def __init__(self, pool, conn, cur, fetch_size: int):
+        self._pool = pool
+        self._conn = conn
+        self._cur = cur
+        self._fetch_size = fetch_size
+        self._finished = False
+
+    def __iter__(self) -> Iterator[List[Tuple]]:
+        while self._conn is not None:
+            rows = self._cur.fetchmany(self._fetch_size)
+            if not rows:
+                self._finished = True
+                break
+            yield rows
+        self.close()
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        if self._finished:
+            self._cur.close()
+        # ยังมีแถวค้างใน connection (unbuffered) - ปิดทิ้งแทนการคืนเข้า pool
+        self._pool.release(conn, discard=not self._finished)
+
+    def __del__(self):
+        # response ที่ไม่เคยถูกส่ง (iterator ไม่เคยเริ่ม) ก็ยังคืน connection
+        self.close()
+
+
+def open_attendance_export(start: date, end: date, username: Optional[str] = None,
+                           fetch_size: int = EXPORT_FETCH_SIZE) -> AttendanceExport:
+    """
+    เริ่ม query export (error ของ database เกิดตรงนี้ ก่อนเริ่มส่ง response)
+    เรียงตาม (timestamp, id) ตาม index จึงไม่ต้อง sort ทั้งช่วง
+    """
+    sql = """
+        SELECT a.id, u.username, a.action, a.time_period, a.similarity_score, a.timestamp, a.site_id
+        FROM attendance a
+        JOIN users u ON u.id = a.user_id
+        WHERE a.timestamp >= %s AND a.timestamp < %s
+    """
+    params = list(_date_range(start, end))
+    if username:
+        sql += " AND a.user_id = (SELECT id FROM users WHERE username = %s)"
+        params.append(username)
+    sql += " ORDER BY a.timestamp, a.id"
+
+    pool = get_pool()
+    conn = pool.acquire()
+    try:
+        # unbuffered: ไม่ดึงผลลัพธ์ทั้งหมดเข้า memory ตอน execute
+        cur = conn.cursor(buffered=False)
+        cur.execute(sql, tuple(params))
+    except Exception:
+        pool.release(conn, discard=True)
+        raise
+    return AttendanceExport(pool, conn, cur, fetch_size)
+
+
+def _export_row(row: Tuple) -> Tuple:
+    row_id, username, action, time_period, score, timestamp, site_id = row
+    return row_id, username, action, time_period, round(float(score), 4), _format_time(timestamp), site_id
+
+
+def _encode_csv(batches: AttendanceExport) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in batches:
+        writer.writerows(_export_row(row) for row in rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _encode_ndjson(batches: AttendanceExport) -> Iterator[bytes]:
+    for rows in batches:
+        yield "".join(
+            json.dumps(dict(zip(EXPORT_COLUMNS, _export_row(row))), ensure_ascii=False) + "\n"
+            for row in rows
+        ).encode("utf-8")
+
+
+def _gzip(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """gzip ระหว่าง stream (wbits=31 = gzip header)"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def encode_export(batches: AttendanceExport, fmt: str, compress: bool = False) -> Iterator[bytes]:
+    """
+    แปลง batch แถวเป็น bytes ของ CSV / NDJSON (gzip ถ้า compress)
+
+    Args:
+        batches: iterator จาก open_attendance_export()
+        fmt: "csv" หรือ "ndjson"
+        compress: gzip ระหว่าง stream
+    """
+    chunks = _encode_csv(batches) if fmt == "csv" else _encode_ndjson(batches)
+    if compress:
+        chunks = _gzip(chunks)
+    try:
+        yield from chunks
+    finally:
+        # ปิด cursor/คืน connection ทันทีแม้ response ถูกยกเลิกกลางทาง
+        batches.close()
@@ -0,0 +1,189 @@
+"""
+Site Index Module
+index ของสาขา/ไซต์ (พิกัด + รัศมี) ใน memory สำหรับหาว่าพิกัด GPS อยู่ในพื้นที่ของสาขาไหน
+
+- แบ่งพิกัดเป็น grid ขนาดเท่ากันทั้ง lat/lon (ช่องละ cell_deg องศา) แต่ละสาขาอยู่ในช่องของจุดศูนย์กลาง
+- ขนาดช่องอย่างน้อยเท่ารัศมีที่ใหญ่ที่สุด ทำให้ค้นหาแค่ช่องรอบพิกัด (ปกติ 3x3) ไม่ว่ามีกี่สาขา
+- คำนวณ haversine แบบ vectorized เฉพาะสาขาในช่องที่ค้นหา
+- ถ้ายังไม่มีสาขาในตาราง sites ใช้ OFFICE_LATITUDE / OFFICE_LONGITUDE / MAX_DISTANCE_METERS เป็นสาขาเดียว
+"""
+
+import math
+import threading
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from config.settings import (
+    OFFICE_LATITUDE,
+    OFFICE_LONGITUDE,
+    MAX_DISTANCE_METERS,
+    SITE_GRID_CELL_METERS,
+    SITE_REFRESH_INTERVAL,
+)
+
+
+EARTH_RADIUS_METERS = 6371000.0
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_METERS / 180.0
+
+
+def haversine_distances(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """
+    ระยะทาง (เมตร) จากจุดหนึ่งไปยังหลายจุดพร้อมกันด้วย Haversine formula
+
+    Args:
+        lat, lon: พิกัดต้นทาง (องศา)
+        lats, lons: พิกัดปลายทาง (องศา, numpy array)
+
+    Returns:
+        np.ndarray: ระยะทางเป็นเมตร
+    """
+    phi1 = math.radians(lat)
+    phi2 = np.radians(lats)
+    delta_phi = phi2 - phi1
+    delta_lambda = np.radians(lons) - math.radians(lon)
+    a = np.sin(delta_phi / 2) ** 2 + math.cos(phi1) * np.cos(phi2) * np.sin(delta_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class SiteIndex:
+    """
+    Grid index ของสาขา (สร้างครั้งเดียว อ่านอย่างเดียว - โหลดใหม่ด้วยการสร้าง index ใหม่แล้วสลับ)
+
+    Args:
+        sites: list ของ dict (id, name, latitude, longitude, radius_meters)
+        cell_meters: ขนาดช่องของ grid (0 = เท่ารัศมีที่ใหญ่ที่สุด)
+    """
+
+    def __init__(self, sites: List[Dict], cell_meters: float = 0):
+        self.sites = sites
+        self.latitudes = np.array([s["latitude"] for s in sites], dtype=np.float64)
+        self.longitudes = np.array([s["longitude"] for s in sites], dtype=np.float64)
+        self.radii = np.array([s["radius_meters"] for s in sites], dtype=np.float64)
+        self.max_radius = float(self.radii.max()) if sites else 0.0
+
+        cell_meters = max(cell_meters, self.max_radius, 1.0)
+        self.cell_deg = cell_meters / METERS_PER_DEGREE
+
+        buckets: Dict[Tuple[int, int], List[int]] = {}
+        for i, (lat, lon) in enumerate(zip(self.latitudes, self.longitudes)):
+            buckets.setdefault(self._cell(lat, lon), []).append(i)
+        self._buckets = {cell: np.array(rows, dtype=np.int64) for cell, rows in buckets.items()}
+
+    def __len__(self) -> int:
+        return len(self.sites)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg)
+
+    def candidates(self, lat: float, lon: float) -> np.ndarray:
+        """index ของสาขาที่อาจมีรัศมีครอบพิกัดนี้ (อยู่ในช่องที่ห่างไม่เกินรัศมีที่ใหญ่ที่สุด)"""
+        d_lat = self.max_radius / METERS_PER_DEGREE
+        # 1 องศาของ longitude สั้นลงตาม cos(latitude)
+        d_lon = min(180.0, d_lat / max(math.cos(math.radians(lat)), 1e-6))
+        row_min, row_max = math.floor((lat - d_lat) / self.cell_deg), math.floor((lat + d_lat) / self.cell_deg)
+
+        # ช่วง longitude ที่เลยเส้น ±180 ต่อไปอีกฝั่ง (สาขาที่ 179.9995 กับพิกัดที่ -179.9995 อยู่ห่างกันไม่กี่เมตร)
+        lon_ranges = [(lon - d_lon, lon + d_lon)]
+        if lon - d_lon < -180.0:
+            lon_ranges.append((lon - d_lon + 360.0, 180.0))
+        if lon + d_lon > 180.0:
+            lon_ranges.append((-180.0, lon + d_lon - 360.0))
+        col_ranges = [(math.floor(lo / self.cell_deg), math.floor(hi / self.cell_deg)) for lo, hi in lon_ranges]
+
+        # ใกล้ขั้วโลกช่องที่ต้องค้นหาอาจมากกว่าช่องที่มีสาขาอยู่จริง
+        n_cells = (row_max - row_min + 1) * sum(hi - lo + 1 for lo, hi in col_ranges)
+        if n_cells > len(self._buckets):
+            cells = [cell for cell in self._buckets
+                     if row_min <= cell[0] <= row_max and any(lo <= cell[1] <= hi for lo, hi in col_ranges)]
+        else:
+            cells = {(row, col) for row in range(row_min, row_max + 1)
+                     for lo, hi in col_ranges for col in range(lo, hi + 1)}
+
+        found = [self._buckets[cell] for cell in cells if cell in self._buckets]
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(found)
+
+    def locate(self, lat: float, lon: float) -> Optional[Dict]:
+        """
+        หาสาขาที่พิกัดนี้อยู่ในรัศมี (ถ้าอยู่ในหลายสาขา เลือกสาขาที่ใกล้ที่สุด)
+
+        Returns:
+            dict: site (dict ของสาขา), distance (เมตร), inside (อยู่ในรัศมีหรือไม่ -
+                  False = สาขาที่ใกล้ที่สุด ใช้แสดงระยะใน error) หรือ None ถ้าไม่มีสาขาเลย
+        """
+        if not self.sites:
+            return None
+        rows = self.candidates(lat, lon)
+        if rows.size:
+            distances = haversine_distances(lat, lon, self.latitudes[rows], self.longitudes[rows])
+            inside = distances <= self.radii[rows]
+        if rows.size == 0 or not inside.any():
+            # ไม่อยู่ในรัศมีของสาขาในช่องที่ค้นหา - คำนวณทุกสาขา (บอกระยะถึงสาขาที่ใกล้ที่สุด
+            # ซึ่งอาจอยู่นอกช่องที่ค้นหา และยังยอมรับถ้าอยู่ในรัศมีของสาขาใดจริง)
+            rows = np.arange(len(self.sites))
+            distances = haversine_distances(lat, lon, self.latitudes, self.longitudes)
+            inside = distances <= self.radii
+
+        pool = np.flatnonzero(inside) if inside.any() else rows
+        best = pool[np.argmin(distances[pool])]
+        return {
+            "site": self.sites[rows[best]],
+            "distance": float(distances[best]),
+            "inside": bool(inside[best]),
+        }
+
+
+def _office_index() -> SiteIndex:
+    """index ที่มีแค่ที่ทำงานจาก settings (ใช้เมื่อยังไม่มีสาขาในตาราง sites)"""
+    return SiteIndex([{
+        "id": None,
+        "name": "office",
+        "latitude": OFFICE_LATITUDE,
+        "longitude": OFFICE_LONGITUDE,
+        "radius_meters": MAX_DISTANCE_METERS,
+    }], SITE_GRID_CELL_METERS)
+
+
+_index = _office_index()
+_refresh_thread: Optional[threading.Thread] = None
+_refresh_stop = threading.Event()
+
+
+def load_sites() -> SiteIndex:
+    """โหลดสาขาที่เปิดใช้งานจาก database แล้วสลับ index (ตาราง sites ว่าง = ใช้ที่ทำงานจาก settings)"""
+    global _index
+    from .database import load_active_sites
+
+    sites = load_active_sites()
+    _index = SiteIndex(sites, SITE_GRID_CELL_METERS) if sites else _office_index()
+    return _index
+
+
+def get_site_index() -> SiteIndex:
+    return _index
+
+
+def _refresh_loop():
+    while not _refresh_stop.wait(SITE_REFRESH_INTERVAL):
+        try:
+            load_sites()
+        except Exception as e:
+            print(f"Site index refresh error: {e}")
+
+
+def start_site_refresh():
+    """โหลด sites ใหม่ทุก SITE_REFRESH_INTERVAL วินาที (ให้ทุก worker เห็นสาขาที่เพิ่ม/ปิด) - 0 = ปิด"""
+    global _refresh_thread
+    if SITE_REFRESH_INTERVAL <= 0 or _refresh_thread is not None:
+        return
+    _refresh_stop.clear()
+    _refresh_thread = threading.Thread(target=_refresh_loop, name="site-refresh", daemon=True)
+    _refresh_thread.start()
+
+
+def stop_site_refresh():
+    global _refresh_thread
+    _refresh_stop.set()
+    if _refresh_thread is not None:
+        _refresh_thread.join(timeout=1)
+        _refresh_thread = None
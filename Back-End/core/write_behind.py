@@ -0,0 +1,312 @@
+"""
+Write-Behind Queue
+รับ record (เช่น attendance) เข้าคิวใน memory แล้วตอบกลับทันที
+จากนั้น thread เบื้องหลังจะเขียนลง database เป็น batch (multi-row insert)
+
+ความทนทาน: ทุก record ถูกเขียนต่อท้าย spill file (JSON lines) ก่อนเข้าคิว
+ถ้า process ตายก่อน flush จะ replay จากไฟล์ตอน start ครั้งถัดไป
+(record มี entry_id ให้ฝั่ง database กันการบันทึกซ้ำ)
+
+หลาย worker (uvicorn --workers N): แต่ละ process ใช้ spill file ของตัวเอง (<path>.<pid>)
+และถือ flock ของ <path>.<pid>.lock ไว้ตลอดอายุ process - ตอน start จะ claim ไฟล์ของ process
+ที่ตายไปแล้ว (lock ว่าง) มา replay ภายใต้ <path>.lock จึงไม่มี worker ไหนล้างไฟล์ของ worker อื่น
+
+batch ที่ writer ปฏิเสธซ้ำ (ไม่ใช่ error ชั่วคราวเช่น database ล่ม) ครบ max_retries ครั้ง
+จะถูกเขียนทีละ record และ record ที่ยังไม่ผ่านถูกย้ายไป dead-letter file ไม่ให้ขวางคิว
+"""
+
+import glob
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple, Type
+
+try:
+    import fcntl
+except ImportError:  # Windows - ไม่มี file lock ข้าม process (ใช้ spill file เดียวได้กับ worker เดียว)
+    fcntl = None
+
+
+def _read_records(path: str) -> List[Dict]:
+    """อ่าน records จาก spill file (ข้ามบรรทัดที่เขียนไม่ครบตอน crash)"""
+    records = []
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return records
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class WriteBehindQueue:
+    """
+    Args:
+        writer: ฟังก์ชันที่รับ list ของ records แล้วเขียนลง database (raise ถ้าไม่สำเร็จ)
+        spill_path: path ตั้งต้นของ spill file (ไฟล์จริงคือ <spill_path>.<pid>)
+        flush_interval: ระยะเวลาสูงสุดก่อน flush (วินาที)
+        batch_size: จำนวน record สูงสุดต่อ batch (ครบแล้ว flush ทันที)
+        fsync: เรียก os.fsync ทุกครั้งที่เขียน spill file (ทนทานกว่า แต่ช้ากว่า)
+        max_retries: จำนวนครั้งที่ batch ล้มเหลว (ด้วย error ที่ไม่ใช่ชั่วคราว) ก่อนย้ายไป dead-letter
+        dead_letter_path: ไฟล์ JSON lines ของ records ที่เขียนไม่สำเร็จ (None = <spill_path ไม่มีนามสกุล>.dead<นามสกุล>)
+        transient_errors: ประเภท error ชั่วคราว (เช่น database ล่ม) - retry ไปเรื่อยๆ ไม่ย้ายไป dead-letter
+    """
+
+    def __init__(self, writer: Callable[[List[Dict]], None], spill_path: str,
+                 flush_interval: float = 1.0, batch_size: int = 500, fsync: bool = False,
+                 max_retries: int = 5, dead_letter_path: Optional[str] = None,
+                 transient_errors: Tuple[Type[BaseException], ...] = ()):
+        self._writer = writer
+        self.base_path = spill_path
+        self.spill_path = f"{spill_path}.{os.getpid()}" if fcntl is not None else spill_path
+        if dead_letter_path is None:
+            root, ext = os.path.splitext(spill_path)
+            dead_letter_path = f"{root}.dead{ext}"
+        self.dead_letter_path = dead_letter_path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.fsync = fsync
+        self.max_retries = max_retries
+        self.transient_errors = tuple(transient_errors)
+
+        self._cond = threading.Condition()
+        self._pending = deque()
+        self._spill = None
+        self._own_lock = None
+        self._thread = None
+        self._stopping = False
+        self._flushed_since_compact = 0
+        self._rejections = 0
+        self.flushed = 0
+        self.failures = 0
+        self.dead_lettered = 0
+
+    # --------------------------------------------------
+    # Spill file
+    # --------------------------------------------------
+    def _open_spill(self):
+        self._spill = open(self.spill_path, "a", encoding="utf-8")
+
+    def _write_spill(self, path: str, records):
+        """เขียน records ลงไฟล์ใหม่ทั้งไฟล์แบบ atomic (tmp + fsync + rename)"""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _compact_locked(self):
+        """เขียน spill file ใหม่ให้เหลือเฉพาะ records ที่ยังไม่ได้ flush"""
+        if self._spill is not None:
+            self._spill.close()
+        self._write_spill(self.spill_path, self._pending)
+        self._open_spill()
+        self._flushed_since_compact = 0
+
+    def _orphan_paths(self) -> List[str]:
+        """spill file ของ process อื่น (<base>.<pid>) และไฟล์เดียวจากเวอร์ชันก่อน (<base>)"""
+        paths = [self.base_path] if os.path.exists(self.base_path) else []
+        prefix = self.base_path + "."
+        for path in glob.glob(glob.escape(prefix) + "*"):
+            if path != self.spill_path and path[len(prefix):].isdigit():
+                paths.append(path)
+        return paths
+
+    def _claim_locked(self) -> List[Tuple[str, Optional[object]]]:
+        """
+        replay spill file ของตัวเอง (pid ซ้ำกับ process ที่ตายไป) และของ process ที่ตายแล้ว
+        ต้องเรียกขณะถือ <base>.lock
+
+        Returns:
+            list: (path, lock file ที่ถืออยู่) ของไฟล์ที่ claim มา - ลบได้หลังเขียน spill file ของตัวเองแล้ว
+        """
+        self._pending.extend(_read_records(self.spill_path))
+        claimed = []
+        for path in self._orphan_paths():
+            lock = None
+            if path != self.base_path:
+                lock = open(path + ".lock", "a")
+                try:
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    # process เจ้าของยังทำงานอยู่
+                    lock.close()
+                    continue
+            records = _read_records(path)
+            if records:
+                print(f"Write-behind: replay {len(records)} records from {path}")
+            self._pending.extend(records)
+            claimed.append((path, lock))
+        return claimed
+
+    def _release_claimed(self, claimed):
+        for path, lock in claimed:
+            _remove(path)
+            if lock is not None:
+                _remove(path + ".lock")
+                lock.close()
+
+    def _dead_letter(self, records: List[Dict]):
+        """ย้าย records ที่เขียนไม่สำเร็จไปต่อท้าย dead-letter file (แก้ข้อมูลแล้วย้ายกลับเป็น spill file ได้)"""
+        directory = os.path.dirname(self.dead_letter_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.dead_lettered += len(records)
+
+    # --------------------------------------------------
+    # Public API
+    # --------------------------------------------------
+    def start(self):
+        """claim + replay spill files ที่ค้างอยู่แล้วเริ่ม thread สำหรับ flush"""
+        with self._cond:
+            if self._thread is not None:
+                return
+            directory = os.path.dirname(self.spill_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            if fcntl is None:
+                self._pending.extend(_read_records(self.spill_path))
+                self._open_spill()
+            else:
+                self._own_lock = open(self.spill_path + ".lock", "a")
+                fcntl.flock(self._own_lock.fileno(), fcntl.LOCK_EX)
+                with open(self.base_path + ".lock", "a") as claim_lock:
+                    fcntl.flock(claim_lock.fileno(), fcntl.LOCK_EX)
+                    claimed = self._claim_locked()
+                    # records ที่ claim มาต้องอยู่ใน spill file ของเราก่อนลบไฟล์เดิม
+                    self._compact_locked()
+                    self._release_claimed(claimed)
+
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._thread.start()
+
+    def put(self, record: Dict):
+        """เพิ่ม record เข้าคิว (เขียนลง spill file ก่อน)"""
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._cond:
+            self._spill.write(line)
+            self._spill.flush()
+            if self.fsync:
+                os.fsync(self._spill.fileno())
+            self._pending.append(record)
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+
+    def _write_each(self, batch: List[Dict]) -> bool:
+        """
+        เขียน batch ที่ถูกปฏิเสธซ้ำทีละ record แล้วย้าย record ที่ไม่ผ่านไป dead-letter
+
+        Returns:
+            bool: False ถ้าเจอ error ชั่วคราวระหว่างทาง (เก็บทั้ง batch ไว้ลองใหม่ -
+                  record ที่เขียนไปแล้วถูกกันซ้ำด้วย entry_id)
+        """
+        rejected = []
+        for record in batch:
+            try:
+                self._writer([record])
+            except self.transient_errors:
+                return False
+            except Exception as e:
+                print(f"Write-behind: move record to dead-letter ({e}): {record}")
+                rejected.append(record)
+        if rejected:
+            self._dead_letter(rejected)
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if len(self._pending) < self.batch_size and not self._stopping:
+                    self._cond.wait(self.flush_interval)
+                if not self._pending:
+                    if self._stopping:
+                        return
+                    continue
+                batch = [self._pending[i] for i in range(min(self.batch_size, len(self._pending)))]
+
+            try:
+                self._writer(batch)
+            except Exception as e:
+                self.failures += 1
+                print(f"Write-behind flush failed ({len(batch)} records): {e}")
+                if not isinstance(e, self.transient_errors):
+                    self._rejections += 1
+                done = self._rejections >= self.max_retries and self._write_each(batch)
+                if not done:
+                    if self._stopping:
+                        return
+                    # รอแล้วลองใหม่ (records ยังอยู่ในคิวและ spill file)
+                    time.sleep(min(30.0, self.flush_interval * 2 ** min(self.failures, 5)))
+                    continue
+
+            with self._cond:
+                for _ in batch:
+                    self._pending.popleft()
+                self.flushed += len(batch)
+                self._flushed_since_compact += len(batch)
+                if not self._pending:
+                    # flush ครบแล้ว - ล้าง spill file (เป็นไฟล์ของ process นี้เท่านั้น)
+                    self._spill.truncate(0)
+                    self._spill.seek(0)
+                    self._flushed_since_compact = 0
+                elif self._flushed_since_compact >= self.batch_size * 20:
+                    self._compact_locked()
+            self.failures = 0
+            self._rejections = 0
+
+    def stop(self, timeout: float = 10.0):
+        """flush records ที่เหลือแล้วหยุด thread (ไฟล์ที่ยังมี records ค้างจะถูก claim ตอน start ครั้งถัดไป)"""
+        with self._cond:
+            if self._thread is None:
+                return
+            self._stopping = True
+            self._cond.notify()
+            thread = self._thread
+        thread.join(timeout)
+        with self._cond:
+            self._thread = None
+            if self._spill is not None:
+                self._spill.close()
+                self._spill = None
+            if self._own_lock is not None:
+                if not self._pending and not thread.is_alive():
+                    _remove(self.spill_path)
+                    _remove(self.spill_path + ".lock")
+                self._own_lock.close()
+                self._own_lock = None
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                "pending": len(self._pending),
+                "flushed": self.flushed,
+                "failures": self.failures,
+                "dead_lettered": self.dead_lettered,
+                "spill_path": self.spill_path,
+            }
@@ -3,15 +3,66 @@ Face Recognition API Routes
 รวม endpoints ทั้งหมดที่เกี่ยวกับ face recognition
 """
 
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from typing import Optional
-from core import face_to_embedding, save_user
-from core.database import get_user_embedding_count, record_attendance, get_last_attendance
-from services.face_user import verify_user, recognize_face
-from services.utils import read_image_from_upload
-from services.image_quality import check_image_quality
+import asyncio
+import json
+import numpy as np
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, WebSocket, WebSocketDisconnect
+from typing import Dict, List, Optional, Tuple
+from core import face_to_embedding, save_user, get_user_embedding
+from core.face_embedding import face_to_embedding_batch
+from core.database import (
+    get_user_embedding_count,
+    get_user_embedding_counts,
+    save_users_batch,
+    record_attendance,
+    get_last_attendance,
+)
+from core.attendance_dedup import (
+    dedup_enabled,
+    find_recent_attendance,
+    remember_attendance,
+    attendance_summary,
+)
+from core.gallery import get_gallery
+from services.face_user import verify_embedding, recognize_embedding
+from services.burst import rank_frames, fuse_embeddings
+from services.stream import StreamSession
+from services.face_tracking import track_face
+from services.utils import read_working_image, decode_image_scaled, bbox_to_original
+from services.upload_cache import (
+    UploadAnalysis,
+    upload_key,
+    get_upload_analysis,
+    put_upload_analysis,
+)
+from services.executor import run_in_stage
+from core.metrics import (
+    QUALITY_FAILURES,
+    DETECTION_FAILURES,
+    VERIFICATIONS,
+    ATTENDANCE_DUPLICATES,
+    KIOSK_CONNECTIONS,
+    KIOSK_FRAMES,
+)
+from services.image_quality import check_image_quality, face_sharpness
 from services.face_detection import detect_and_crop_face
 from services.location import check_location
+from config.settings import (
+    QUALITY_REGION,
+    IMAGE_WORKING_SIZE,
+    VERIFY_THRESHOLD,
+    BULK_MAX_FILES,
+    BURST_MAX_FRAMES,
+    BURST_CANDIDATES,
+    BURST_EARLY_EXIT_MARGIN,
+    BURST_FUSE,
+    KIOSK_PROCESS_FPS,
+    KIOSK_MAX_FRAME_AGE,
+    KIOSK_EVENT_COOLDOWN,
+    KIOSK_MAX_FRAME_BYTES,
+    FACE_TRACKING,
+)
 
 router = APIRouter(prefix="/face", tags=["Face Recognition"])
 
@@ -26,23 +77,11 @@ async def get_users():
     }
 
 
-def process_image_with_validation(img):
-    """
-    ตรวจสอบคุณภาพรูปภาพและ detect/crop ใบหน้า
-    
-    Args:
-        img: รูปภาพ BGR format (numpy array)
-    
-    Returns:
-        tuple: (cropped_face, quality_result, detection_result)
-    
-    Raises:
-        HTTPException: ถ้ารูปภาพไม่ผ่านการตรวจสอบ
-    """
-    # 1. ตรวจสอบคุณภาพรูปภาพ
-    quality_result = check_image_quality(img)
-    
+def _raise_if_quality_failed(quality_result):
     if not quality_result["passed"]:
+        for reason, check in quality_result["checks"].items():
+            if not check["passed"]:
+                QUALITY_FAILURES.labels(reason=reason).inc()
         raise HTTPException(
             status_code=400,
             detail={
@@ -51,11 +90,12 @@ def process_image_with_validation(img):
                 "checks": quality_result["checks"]
             }
         )
-    
-    # 2. ตรวจจับและ crop ใบหน้า
-    cropped_face, detection_result = detect_and_crop_face(img)
-    
+
+
+def _raise_if_no_face(detection_result):
+    # found เป็น False เฉพาะเมื่อไม่พบใบหน้า (หลายใบหน้าใช้ใบหน้าที่ใหญ่ที่สุด)
     if not detection_result["found"]:
+        DETECTION_FAILURES.labels(reason="no_face").inc()
         raise HTTPException(
             status_code=400,
             detail={
@@ -64,49 +104,192 @@ def process_image_with_validation(img):
                 "face_count": detection_result["face_count"]
             }
         )
+
+
+async def process_image_with_validation(img, scale: float = 1.0, fail_fast: bool = False, quality_result=None):
+    """
+    ตรวจสอบคุณภาพรูปภาพและ detect/crop ใบหน้า
+    (QUALITY_REGION="face": detect ก่อนแล้ววัดคุณภาพเฉพาะบริเวณใบหน้า)
+    
+    Args:
+        img: รูปภาพ BGR format (numpy array)
+        scale: ขนาดของ img เทียบกับรูปต้นฉบับ (bbox ใน detection_result จะถูกแปลงกลับเป็นพิกัดต้นฉบับ)
+        fail_fast: หยุด quality check ที่ข้อแรกที่ไม่ผ่าน (ใช้เมื่อต้องการแค่ผ่าน/ไม่ผ่าน)
+        quality_result: ผล quality ของทั้งรูปที่ตรวจไว้แล้ว (QUALITY_REGION="frame" จะไม่ตรวจซ้ำ)
+    
+    Returns:
+        tuple: (cropped_face, quality_result, detection_result)
+    
+    Raises:
+        HTTPException: ถ้ารูปภาพไม่ผ่านการตรวจสอบ
+    """
+    if QUALITY_REGION == "face":
+        # 1. ตรวจจับและ crop ใบหน้า
+        cropped_face, detection_result = await run_in_stage("detection", detect_and_crop_face, img)
+        _raise_if_no_face(detection_result)
+        
+        # 2. ตรวจสอบคุณภาพเฉพาะบริเวณใบหน้า
+        quality_result = await run_in_stage(
+            "quality", check_image_quality, img, detection_result["bbox"], fail_fast
+        )
+        _raise_if_quality_failed(quality_result)
+    else:
+        # 1. ตรวจสอบคุณภาพรูปภาพ
+        if quality_result is None:
+            quality_result = await run_in_stage("quality", check_image_quality, img, None, fail_fast)
+        _raise_if_quality_failed(quality_result)
+        
+        # 2. ตรวจจับและ crop ใบหน้า
+        cropped_face, detection_result = await run_in_stage("detection", detect_and_crop_face, img)
+        _raise_if_no_face(detection_result)
+    
+    detection_result["bbox"] = bbox_to_original(detection_result["bbox"], scale)
     
     return cropped_face, quality_result, detection_result
 
 
+async def _decode_upload(image_bytes: bytes):
+    """decode + ย่อรูปที่ upload (ไฟล์ที่ไม่ใช่รูปหรือเสีย = 400 invalid_image)"""
+    try:
+        return await run_in_stage("decode", decode_image_scaled, image_bytes, IMAGE_WORKING_SIZE)
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail={"error": "invalid_image", "message": "ไฟล์รูปภาพไม่ถูกต้อง"}
+        )
+
+
+async def validate_upload(file: UploadFile) -> UploadAnalysis:
+    """
+    อ่านไฟล์แล้วตรวจสอบคุณภาพและ crop ใบหน้า (process_image_with_validation)
+    ไฟล์ที่มี content เดียวกับที่เคยวิเคราะห์ใน worker นี้ใช้ผลจาก upload cache (ข้าม decode/quality/detection)
+    
+    Returns:
+        UploadAnalysis: ผลที่ผ่านการตรวจสอบ (embedding ดึงด้วย upload_embedding)
+    
+    Raises:
+        HTTPException: ถ้ารูปภาพไม่ผ่านการตรวจสอบ (ไฟล์เดิมได้ error เดิม)
+    """
+    image_bytes = await file.read()
+    key = upload_key(image_bytes)
+    
+    analysis = get_upload_analysis(key)
+    if analysis is None:
+        try:
+            img, scale = await _decode_upload(image_bytes)
+            cropped_face, quality_result, detection_result = await process_image_with_validation(img, scale)
+        except HTTPException as e:
+            put_upload_analysis(key, UploadAnalysis(error=(e.status_code, e.detail)))
+            raise
+        analysis = UploadAnalysis(cropped_face, quality_result, detection_result)
+        put_upload_analysis(key, analysis)
+    
+    if not analysis.passed:
+        status_code, detail = analysis.error
+        raise HTTPException(status_code=status_code, detail=detail)
+    return analysis
+
+
+async def upload_embedding(analysis: UploadAnalysis):
+    """embedding ของใบหน้าใน analysis (สร้างครั้งแรกแล้วเก็บไว้กับ entry ใน upload cache)"""
+    if analysis.embedding is None:
+        analysis.embedding = await run_in_stage("embedding", face_to_embedding, analysis.cropped_face)
+    return analysis.embedding
+
+
+async def verify_face(username: str, cropped_face, embed=None):
+    """
+    ยืนยันตัวตน (1:1) โดยรัน DB lookup และ embedding ใน executor
+    
+    Args:
+        embed: async function ที่คืน embedding ของใบหน้า (None = สร้างจาก cropped_face)
+    
+    Returns:
+        tuple: (is_verified, similarity_score)
+    """
+    # ดึง embedding ของ user ก่อน (ไม่พบ user = ไม่ต้องสร้าง embedding)
+    db_emb = await run_in_stage("db", get_user_embedding, username)
+    
+    if db_emb is None:
+        VERIFICATIONS.labels(mode="verify", outcome="unknown_user").inc()
+        return False, None
+    
+    if embed is not None:
+        input_emb = await embed()
+    else:
+        input_emb = await run_in_stage("embedding", face_to_embedding, cropped_face)
+    return verify_embedding(username, input_emb, db_emb=db_emb)
+
+
+async def recognize_face_async(cropped_face, embed=None):
+    """
+    ค้นหาใบหน้าจากทุก user (1:N) โดยรัน embedding และ matching ใน executor
+    
+    Args:
+        embed: async function ที่คืน embedding ของใบหน้า (None = สร้างจาก cropped_face)
+    
+    Returns:
+        tuple: (username, similarity_score) หรือ (None, score)
+    """
+    if embed is not None:
+        input_emb = await embed()
+    else:
+        input_emb = await run_in_stage("embedding", face_to_embedding, cropped_face)
+    return await run_in_stage("match", recognize_embedding, input_emb)
+
+
 @router.post("/check-quality")
 async def check_quality(file: UploadFile = File(...)):
     """
     ตรวจสอบคุณภาพรูปภาพและการตรวจจับใบหน้า
     ใช้สำหรับทดสอบก่อนลงทะเบียนหรือ verify
+    (รูปที่ผ่านจะถูกเก็บใน upload cache - ส่งไฟล์เดิมมา recognize/verify/register ต่อได้โดยไม่ต้องวิเคราะห์ใหม่)
     """
-    img = await read_image_from_upload(file)
+    image_bytes = await file.read()
+    key = upload_key(image_bytes)
     
-    # ตรวจสอบคุณภาพ
-    quality_result = check_image_quality(img)
+    analysis = get_upload_analysis(key, passed_only=True)
+    if analysis is not None:
+        return {"quality": analysis.quality, "detection": analysis.detection, "passed": True}
+    
+    img, scale = await _decode_upload(image_bytes)
     
     # ตรวจจับใบหน้า
-    cropped_face, detection_result = detect_and_crop_face(img)
+    cropped_face, detection_result = await run_in_stage("detection", detect_and_crop_face, img)
+    
+    # ตรวจสอบคุณภาพ (ทั้งรูป หรือเฉพาะใบหน้าตาม QUALITY_REGION)
+    roi = detection_result["bbox"] if QUALITY_REGION == "face" else None
+    quality_result = await run_in_stage("quality", check_image_quality, img, roi)
+    
+    detection_result["bbox"] = bbox_to_original(detection_result["bbox"], scale)
+    
+    passed = quality_result["passed"] and detection_result["found"]
+    if passed:
+        put_upload_analysis(key, UploadAnalysis(cropped_face, quality_result, detection_result))
     
     return {
         "quality": quality_result,
         "detection": detection_result,
-        "passed": quality_result["passed"] and detection_result["found"]
+        "passed": passed
     }
 
 
 @router.post("/embedding")
 async def create_embedding(file: UploadFile = File(...)):
     """สร้าง face embedding จากรูปภาพ"""
-    img = await read_image_from_upload(file)
-    
     # ตรวจสอบคุณภาพและ crop ใบหน้า
-    cropped_face, quality_result, detection_result = process_image_with_validation(img)
+    analysis = await validate_upload(file)
     
     # สร้าง embedding จากรูปใบหน้าที่ crop แล้ว
-    embedding = face_to_embedding(cropped_face)
+    embedding = await upload_embedding(analysis)
 
     return {
         "embedding": embedding.tolist(),
         "dim": len(embedding),
-        "quality": quality_result["checks"],
+        "quality": analysis.quality["checks"],
         "detection": {
-            "confidence": detection_result["confidence"],
-            "bbox": detection_result["bbox"]
+            "confidence": analysis.detection["confidence"],
+            "bbox": analysis.detection["bbox"]
         }
     }
 
@@ -121,17 +304,15 @@ async def register(
     - ถ้า user ใหม่: สร้าง user และเพิ่ม embedding แรก
     - ถ้า user มีอยู่แล้ว: เพิ่ม embedding ใหม่ (รองรับหลายรูป)
     """
-    img = await read_image_from_upload(file)
-    
     # ตรวจสอบคุณภาพและ crop ใบหน้า
-    cropped_face, quality_result, detection_result = process_image_with_validation(img)
+    analysis = await validate_upload(file)
     
     # สร้าง embedding และบันทึก
-    embedding = face_to_embedding(cropped_face)
-    save_user(username, embedding)
+    embedding = await upload_embedding(analysis)
+    await run_in_stage("db", save_user, username, embedding)
     
     # นับจำนวน embedding ทั้งหมดของ user
-    embedding_count = get_user_embedding_count(username)
+    embedding_count = await run_in_stage("db", get_user_embedding_count, username)
     
     return {
         "status": "registered",
@@ -140,7 +321,86 @@ async def register(
         "message": f"เพิ่มรูปหน้าสำเร็จ (รวม {embedding_count} รูป)",
         "quality_passed": True,
         "face_detected": True,
-        "detection_confidence": detection_result["confidence"]
+        "detection_confidence": analysis.detection["confidence"]
+    }
+
+
+@router.post("/register/bulk")
+async def register_bulk(
+    usernames: List[str] = Form(...),
+    files: List[UploadFile] = File(...)
+):
+    """
+    ลงทะเบียนหลายรูปในครั้งเดียว (เช่นตอน onboard สาขาใหม่)
+    - ส่ง username เดียว: ทุกรูปเป็นของ user นั้น
+    - ส่ง username เท่ากับจำนวนไฟล์: รูปที่ i เป็นของ username ที่ i
+    รูปที่ไม่ผ่านการตรวจสอบจะถูกข้าม (แจ้งใน results) ส่วนรูปที่ผ่าน
+    จะสร้าง embedding ด้วย batch inference และบันทึกด้วย multi-row insert
+    """
+    if len(files) > BULK_MAX_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "error": "too_many_files",
+                "message": f"ส่งได้ไม่เกิน {BULK_MAX_FILES} ไฟล์ต่อครั้ง (ส่งมา {len(files)})"
+            }
+        )
+    
+    if len(usernames) == 1:
+        usernames = usernames * len(files)
+    
+    if len(usernames) != len(files):
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "error": "username_count_mismatch",
+                "message": f"จำนวน username ({len(usernames)}) ต้องเป็น 1 หรือเท่ากับจำนวนไฟล์ ({len(files)})"
+            }
+        )
+    
+    results = [
+        {"filename": file.filename, "username": username, "registered": False, "error": None, "message": ""}
+        for username, file in zip(usernames, files)
+    ]
+    
+    async def validate(index: int, file: UploadFile):
+        try:
+            img, scale = await read_working_image(file)
+        except ValueError:
+            results[index].update(error="invalid_image", message="ไฟล์รูปภาพไม่ถูกต้อง")
+            return None
+        
+        try:
+            cropped_face, _, detection_result = await process_image_with_validation(img, scale, fail_fast=True)
+        except HTTPException as e:
+            results[index].update(error=e.detail["error"], message=e.detail["message"])
+            return None
+        
+        results[index]["detection_confidence"] = detection_result["confidence"]
+        return cropped_face
+    
+    # ตรวจสอบคุณภาพและ crop ใบหน้าทุกรูป (รันพร้อมกันตาม limit ของแต่ละ stage)
+    crops = await asyncio.gather(*(validate(i, file) for i, file in enumerate(files)))
+    
+    valid = [i for i, crop in enumerate(crops) if crop is not None]
+    
+    if valid:
+        # สร้าง embeddings ด้วย batch inference แล้วบันทึกครั้งเดียว
+        embeddings = await run_in_stage("embedding", face_to_embedding_batch, [crops[i] for i in valid])
+        await run_in_stage("db", save_users_batch, [(usernames[i], emb) for i, emb in zip(valid, embeddings)])
+        
+        for i in valid:
+            results[i].update(registered=True, message="เพิ่มรูปหน้าสำเร็จ")
+    
+    # นับจำนวน embedding ทั้งหมดของแต่ละ user
+    embedding_counts = await run_in_stage("db", get_user_embedding_counts, usernames)
+    
+    return {
+        "status": "completed",
+        "registered": len(valid),
+        "failed": len(files) - len(valid),
+        "embedding_counts": embedding_counts,
+        "results": results
     }
 
 
@@ -150,23 +410,139 @@ async def verify(
     file: UploadFile = File(...)
 ):
     """ยืนยันตัวตนด้วยรูปหน้า"""
-    img = await read_image_from_upload(file)
-    
     # ตรวจสอบคุณภาพและ crop ใบหน้า
-    cropped_face, quality_result, detection_result = process_image_with_validation(img)
+    analysis = await validate_upload(file)
     
     # verify ด้วยรูปใบหน้าที่ crop แล้ว
-    ok, score = verify_user(username, cropped_face)
+    ok, score = await verify_face(username, analysis.cropped_face, embed=lambda: upload_embedding(analysis))
 
     return {
         "verified": ok,
         "username": username if ok else None,
         "score": score,
         "quality_passed": True,
-        "detection_confidence": detection_result["confidence"]
+        "detection_confidence": analysis.detection["confidence"]
+    }
+
+
+# (username, action) ที่กำลังประมวลผลใน worker นี้ - request ที่กดซ้ำระหว่างรอผลจะรอตัวแรกก่อน
+_inflight_attendance: Dict[Tuple[str, str], asyncio.Event] = {}
+
+
+@asynccontextmanager
+async def _attendance_slot(username: str, action: str):
+    """ให้ request ของ (username, action) เดียวกันทำทีละ request เพื่อให้ request ถัดไปเห็นผลใน dedup cache"""
+    if not dedup_enabled():
+        yield
+        return
+
+    key = (username, action)
+    while key in _inflight_attendance:
+        await _inflight_attendance[key].wait()
+    event = _inflight_attendance[key] = asyncio.Event()
+    try:
+        yield
+    finally:
+        del _inflight_attendance[key]
+        event.set()
+
+
+def _attendance_response(summary, location_result, detection_confidence, duplicate: bool = False):
+    """สร้าง response ของ /recognize จาก attendance (ที่เพิ่งบันทึกหรือที่บันทึกไว้แล้วภายใน window)"""
+    score = summary["score"]
+    similarity_percent = round(score * 100, 1)
+    
+    # เตรียมข้อมูล location (ใช้ผลที่ตรวจไว้แล้วตอนต้น)
+    distance_info = None
+    if location_result is not None:
+        distance_info = round(location_result["distance"])
+    
+    # เตรียมข้อความช่วงเวลา
+    time_period_thai = summary["time_period_thai"]
+    action_text = "เข้างาน" if summary["action"] == "check_in" else "ออกงาน"
+    if duplicate:
+        message = f"{action_text}ช่วง{time_period_thai}ไปแล้วเมื่อ {summary['timestamp'][11:]} (ไม่บันทึกซ้ำ)"
+    else:
+        message = f"{action_text}ช่วง{time_period_thai}สำเร็จ (ความเหมือน {similarity_percent}%)"
+    
+    return {
+        "recognized": True,
+        "username": summary["username"],
+        "score": score,
+        "similarity_percent": similarity_percent,
+        "action": summary["action"],
+        "timestamp": summary["timestamp"],
+        "time_period": summary["time_period"],
+        "time_period_thai": time_period_thai,
+        "distance": distance_info,
+        "site_id": summary.get("site_id"),
+        "message": message,
+        "duplicate": duplicate,
+        "quality_passed": True,
+        "detection_confidence": detection_confidence
+    }
+
+
+def _check_location_or_raise(latitude: Optional[float], longitude: Optional[float]):
+    """ตรวจสอบว่าอยู่ในรัศมีของสาขาใดสาขาหนึ่ง (None ถ้าไม่ได้ส่งพิกัดมา)"""
+    if latitude is None or longitude is None:
+        return None
+    
+    location_result = check_location(latitude, longitude)
+    if not location_result["allowed"]:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "error": "location_not_allowed",
+                "message": location_result["message"],
+                "distance": location_result["distance"],
+                "max_distance": location_result["max_distance"],
+                "site_id": location_result["site_id"]
+            }
+        )
+    return location_result
+
+
+def _raise_verification_failed(username: str, score):
+    raise HTTPException(
+        status_code=400,
+        detail={
+            "error": "verification_failed",
+            "message": f"ไม่สามารถยืนยันตัวตนของ '{username}' ได้ กรุณาลองใหม่",
+            "username": username,
+            "score": score,
+            "similarity_percent": round(score * 100, 1) if score else 0
+        }
+    )
+
+
+def _not_recognized_response(score, detection_confidence):
+    return {
+        "recognized": False,
+        "username": None,
+        "score": score,
+        "message": "ไม่พบผู้ใช้ในระบบ กรุณาลงทะเบียนก่อน",
+        "quality_passed": True,
+        "detection_confidence": detection_confidence
     }
 
 
+async def _record_attendance_once(username: str, action: str, score: float, location_result, detection_confidence):
+    """บันทึก attendance (ถ้าภายใน window เคยบันทึกไว้แล้ว คืน record เดิมแทน)"""
+    if dedup_enabled():
+        existing = await run_in_stage("db", find_recent_attendance, username, action)
+        if existing is not None:
+            ATTENDANCE_DUPLICATES.labels(stage="after_match").inc()
+            return _attendance_response(existing, location_result, detection_confidence, duplicate=True)
+
+    site_id = location_result["site_id"] if location_result is not None else None
+    attendance = await run_in_stage("db", record_attendance, username, action, score, site_id)
+    summary = attendance_summary(attendance, score)
+    if dedup_enabled():
+        await run_in_stage("db", remember_attendance, summary)
+    return _attendance_response(summary, location_result, detection_confidence)
+
+
 @router.post("/recognize")
 async def recognize(
     file: UploadFile = File(...),
@@ -181,90 +557,380 @@ async def recognize(
     - ถ้าไม่ส่ง username: ค้นหาจากทุกคนในระบบ (ช้ากว่า)
     บันทึก attendance ตาม action ที่ส่งมา (check_in หรือ check_out)
     ตรวจสอบระยะทางจากที่ทำงาน (ถ้าส่ง latitude/longitude มา)
+    กดซ้ำภายใน ATTENDANCE_DEDUP_WINDOW: คืน record เดิม (duplicate=true) ไม่บันทึกซ้ำ
+    (ตรวจหลัง verify/matching ผ่านแล้วเสมอ)
     """
     # ตรวจสอบ action ที่ส่งมา
     if action not in ["check_in", "check_out"]:
         action = "check_in"
     
     # ตรวจสอบตำแหน่ง GPS ก่อน (ถ้ามี)
-    if latitude is not None and longitude is not None:
-        location_result = check_location(latitude, longitude)
+    location_result = _check_location_or_raise(latitude, longitude)
+    
+    if username:
+        # ถ้าส่ง username มา - dedup หลัง verify ผ่านเท่านั้น (username อย่างเดียวไม่ใช่หลักฐานตัวตน)
+        async with _attendance_slot(username, action):
+            # ตรวจสอบคุณภาพและ crop ใบหน้า
+            analysis = await validate_upload(file)
+            
+            # verify เฉพาะ user นั้น (เร็วกว่า)
+            ok, score = await verify_face(username, analysis.cropped_face, embed=lambda: upload_embedding(analysis))
+            
+            if not ok:
+                _raise_verification_failed(username, score)
+            
+            return await _record_attendance_once(
+                username, action, score, location_result, analysis.detection["confidence"]
+            )
+    
+    # ตรวจสอบคุณภาพและ crop ใบหน้า
+    analysis = await validate_upload(file)
+    detection_result = analysis.detection
+    
+    # ถ้าไม่ส่ง username - ค้นหาจากทุกคนในระบบ
+    matched_username, score = await recognize_face_async(
+        analysis.cropped_face, embed=lambda: upload_embedding(analysis)
+    )
+    
+    if matched_username is None:
+        return _not_recognized_response(score, detection_result["confidence"])
+    
+    # dedup หลัง matching (รู้ username แล้ว)
+    async with _attendance_slot(matched_username, action):
+        return await _record_attendance_once(
+            matched_username, action, score, location_result, detection_result["confidence"]
+        )
+
+
+async def _decode_frame(file: UploadFile):
+    try:
+        return await read_working_image(file)
+    except ValueError:
+        return None
+
+
+async def _select_burst_frame(files: List[UploadFile], score_embedding) -> Dict:
+    """
+    เลือก embedding ที่ดีที่สุดจากหลายเฟรม
+    1. decode + วัดคุณภาพทั้งรูปทุกเฟรม (ถูก) แล้วเรียงเฟรม
+    2. detect/crop + embed ทีละเฟรมเฉพาะ BURST_CANDIDATES เฟรมแรก
+       หยุดทันทีเมื่อ score ≥ VERIFY_THRESHOLD + BURST_EARLY_EXIT_MARGIN
+    3. ไม่มีเฟรมไหนเกิน margin: ลองรวม embeddings ของเฟรมที่ผ่าน (BURST_FUSE) แล้วใช้ตัวที่ score สูงสุด
+    
+    Args:
+        files: เฟรมที่ส่งมา
+        score_embedding: async function(embedding) -> score (None = ไม่มีอะไรให้เทียบ)
+    
+    Returns:
+        dict: embedding, score, frame_index (None ถ้าใช้ embedding ที่รวมแล้ว), fused, detection_confidence, frames
+    
+    Raises:
+        HTTPException: ถ้าไม่มีเฟรมไหนผ่านการตรวจสอบ
+    """
+    decoded = await asyncio.gather(*(_decode_frame(file) for file in files))
+    
+    async def frame_quality(frame):
+        if frame is None:
+            return None
+        return await run_in_stage("quality", check_image_quality, frame[0])
+    
+    qualities = await asyncio.gather(*(frame_quality(frame) for frame in decoded))
+    
+    frames = [
+        {
+            "index": i,
+            "filename": file.filename,
+            "quality_passed": quality["passed"] if quality else None,
+            "score": None,
+            "error": None if quality else "invalid_image",
+        }
+        for i, (file, quality) in enumerate(zip(files, qualities))
+    ]
+    
+    candidates = []  # (embedding, score, frame_index, detection_confidence)
+    first_error = None
+    for i in rank_frames(qualities)[:BURST_CANDIDATES]:
+        img, scale = decoded[i]
+        try:
+            cropped_face, _, detection_result = await process_image_with_validation(
+                img, scale, quality_result=None if QUALITY_REGION == "face" else qualities[i]
+            )
+        except HTTPException as e:
+            frames[i]["error"] = e.detail["error"]
+            first_error = first_error or e
+            continue
         
-        if not location_result["allowed"]:
+        embedding = await run_in_stage("embedding", face_to_embedding, cropped_face)
+        score = await score_embedding(embedding)
+        frames[i]["score"] = score
+        candidates.append((embedding, score, i, detection_result["confidence"]))
+        
+        if score is not None and score >= VERIFY_THRESHOLD + BURST_EARLY_EXIT_MARGIN:
+            break
+    
+    if not candidates:
+        if first_error is None:
             raise HTTPException(
                 status_code=400,
-                detail={
-                    "error": "location_not_allowed",
-                    "message": location_result["message"],
-                    "distance": location_result["distance"],
-                    "max_distance": location_result["max_distance"]
-                }
+                detail={"error": "invalid_image", "message": "ไฟล์รูปภาพไม่ถูกต้อง", "frames": frames}
             )
+        raise HTTPException(
+            status_code=first_error.status_code,
+            detail={**first_error.detail, "frames": frames}
+        )
     
-    img = await read_image_from_upload(file)
+    best = max(candidates, key=lambda c: -1.0 if c[1] is None else c[1])
+    result = {
+        "embedding": best[0],
+        "score": best[1],
+        "frame_index": best[2],
+        "fused": False,
+        "detection_confidence": best[3],
+        "frames": frames,
+    }
     
-    # ตรวจสอบคุณภาพและ crop ใบหน้า
-    cropped_face, quality_result, detection_result = process_image_with_validation(img)
+    early_exit = best[1] is not None and best[1] >= VERIFY_THRESHOLD + BURST_EARLY_EXIT_MARGIN
+    if BURST_FUSE and not early_exit and len(candidates) > 1:
+        fused = fuse_embeddings([c[0] for c in candidates])
+        fused_score = await score_embedding(fused)
+        if fused_score is not None and (best[1] is None or fused_score > best[1]):
+            result.update(embedding=fused, score=fused_score, frame_index=None, fused=True)
+    
+    return result
+
+
+def _burst_summary(selected: Dict) -> Dict:
+    return {
+        "frame_index": selected["frame_index"],
+        "fused": selected["fused"],
+        "frames": selected["frames"],
+    }
+
+
+@router.post("/recognize/burst")
+async def recognize_burst(
+    files: List[UploadFile] = File(...),
+    action: Optional[str] = Form("check_in"),
+    username: Optional[str] = Form(None),
+    latitude: Optional[float] = Form(None),
+    longitude: Optional[float] = Form(None)
+):
+    """
+    เหมือน /recognize แต่รับหลายเฟรมใน request เดียว (เช่นถ่ายต่อเนื่อง 3-5 รูป) แทนการถ่ายใหม่ทีละรูป
+    - วัดคุณภาพทุกเฟรมก่อน แล้ว detect/embed เฉพาะ BURST_CANDIDATES เฟรมที่ดีที่สุด
+    - หยุดทันทีเมื่อเฟรมใด score ≥ VERIFY_THRESHOLD + BURST_EARLY_EXIT_MARGIN
+    - response มี burst.frames (ผลของแต่ละเฟรม) และ burst.frame_index ของเฟรมที่ใช้ (null = รวมหลายเฟรม)
+    """
+    if action not in ["check_in", "check_out"]:
+        action = "check_in"
+    
+    if len(files) > BURST_MAX_FRAMES:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "error": "too_many_frames",
+                "message": f"ส่งได้ไม่เกิน {BURST_MAX_FRAMES} เฟรมต่อครั้ง (ส่งมา {len(files)})"
+            }
+        )
+    
+    location_result = _check_location_or_raise(latitude, longitude)
     
-    # ยืนยันตัวตน
     if username:
-        # ถ้าส่ง username มา - verify เฉพาะ user นั้น (เร็วกว่า)
-        ok, score = verify_user(username, cropped_face)
-        
-        if not ok:
-            raise HTTPException(
-                status_code=400,
-                detail={
-                    "error": "verification_failed",
-                    "message": f"ไม่สามารถยืนยันตัวตนของ '{username}' ได้ กรุณาลองใหม่",
-                    "username": username,
-                    "score": score,
-                    "similarity_percent": round(score * 100, 1) if score else 0
-                }
+        async with _attendance_slot(username, action):
+            db_emb = await run_in_stage("db", get_user_embedding, username)
+            if db_emb is None:
+                VERIFICATIONS.labels(mode="verify", outcome="unknown_user").inc()
+                _raise_verification_failed(username, None)
+            
+            async def score_against_user(embedding):
+                return float(np.dot(embedding, db_emb))
+            
+            selected = await _select_burst_frame(files, score_against_user)
+            ok, score = verify_embedding(username, selected["embedding"], db_emb=db_emb)
+            if not ok:
+                _raise_verification_failed(username, score)
+            
+            response = await _record_attendance_once(
+                username, action, score, location_result, selected["detection_confidence"]
             )
-        
-        matched_username = username
+            response["burst"] = _burst_summary(selected)
+            return response
+    
+    async def score_against_gallery(embedding):
+        _, score = await run_in_stage("match", get_gallery().search, embedding, VERIFY_THRESHOLD)
+        return score
+    
+    selected = await _select_burst_frame(files, score_against_gallery)
+    matched_username, score = await run_in_stage("match", recognize_embedding, selected["embedding"])
+    
+    if matched_username is None:
+        response = _not_recognized_response(score, selected["detection_confidence"])
     else:
-        # ถ้าไม่ส่ง username - ค้นหาจากทุกคนในระบบ
-        matched_username, score = recognize_face(cropped_face)
-        
-        if matched_username is None:
-            return {
-                "recognized": False,
-                "username": None,
-                "score": score,
-                "message": "ไม่พบผู้ใช้ในระบบ กรุณาลงทะเบียนก่อน",
-                "quality_passed": True,
-                "detection_confidence": detection_result["confidence"]
-            }
+        async with _attendance_slot(matched_username, action):
+            response = await _record_attendance_once(
+                matched_username, action, score, location_result, selected["detection_confidence"]
+            )
+    response["burst"] = _burst_summary(selected)
+    return response
+
+
+def _stream_status(session: StreamSession, status: str, message: str, **extra) -> Optional[Dict]:
+    """status event (ส่งเฉพาะตอนสถานะเปลี่ยน - kiosk ส่งเฟรมที่ไม่มีใครอยู่ตลอดเวลา)"""
+    if not session.status_changed(status):
+        return None
+    return {"type": "status", "status": status, "message": message, **extra}
+
+
+async def _stream_frame_event(session: StreamSession, frame: bytes) -> Optional[Dict]:
+    """
+    ประมวลผลเฟรมหนึ่งเฟรมจาก kiosk: detect → quality (fail fast) → embed → match → attendance
+    เฟรมที่ไม่มีใบหน้า/ไม่ผ่านคุณภาพไม่นับใน failure metrics (เป็นเรื่องปกติของ stream)
+    FACE_TRACKING: ค้นหาใบหน้าเฉพาะ ROI รอบตำแหน่งเดิม และใช้ผล matching เดิมในเฟรม ROI ของ track
+    ที่ match ได้แล้ว (embed ใหม่ทุกครั้งที่ detect ทั้งเฟรม, ยังไม่รู้ว่าเป็นใคร หรือใบหน้าคมชัดขึ้น)
     
-    # บันทึก attendance ตาม action ที่ส่งมา
-    attendance = record_attendance(matched_username, action, score)
+    Returns:
+        dict: event ที่ต้องส่งกลับ หรือ None ถ้าไม่มีอะไรเปลี่ยน
+    """
+    try:
+        img, scale = await run_in_stage("decode", decode_image_scaled, frame, IMAGE_WORKING_SIZE)
+    except ValueError:
+        KIOSK_FRAMES.labels(result="invalid").inc()
+        return {"type": "error", "error": "invalid_image", "message": "ไฟล์รูปภาพไม่ถูกต้อง"}
     
-    # แปลง similarity เป็น % (0-100)
-    similarity_percent = round(score * 100, 1)
+    if FACE_TRACKING:
+        cropped_face, detection_result, session.track = await run_in_stage(
+            "detection", track_face, img, session.track
+        )
+    else:
+        cropped_face, detection_result = await run_in_stage("detection", detect_and_crop_face, img)
+    if not detection_result["found"]:
+        return _stream_status(session, "no_face", detection_result["message"])
     
-    # เตรียมข้อมูล location (ถ้ามี)
-    distance_info = None
-    if latitude is not None and longitude is not None:
-        location_result = check_location(latitude, longitude)
-        distance_info = round(location_result["distance"])
+    roi = detection_result["bbox"] if QUALITY_REGION == "face" else None
+    quality_result = await run_in_stage("quality", check_image_quality, img, roi, True)
+    if not quality_result["passed"]:
+        return _stream_status(session, "image_quality_failed", quality_result["message"])
     
-    # เตรียมข้อความช่วงเวลา
-    time_period_thai = attendance.get("time_period_thai", "")
-    action_text = "เข้างาน" if action == "check_in" else "ออกงาน"
+    if FACE_TRACKING:
+        identity = session.identity
+        track_id = detection_result["track_id"]
+        # ความคมชัดของใบหน้าเท่านั้น (QUALITY_REGION=frame ทำให้ checks.blur เป็นค่าของทั้งเฟรม)
+        if roi is not None:
+            sharpness = quality_result["checks"]["blur"]["value"]
+        else:
+            sharpness = await run_in_stage("quality", face_sharpness, img, detection_result["bbox"])
+        if identity.needs_embedding(track_id, sharpness, detection_result["mode"]):
+            matched_username, score = await recognize_face_async(cropped_face)
+            identity.update(track_id, sharpness, matched_username, score)
+        else:
+            matched_username, score = identity.username, identity.score
+    else:
+        matched_username, score = await recognize_face_async(cropped_face)
+    if matched_username is None:
+        return _stream_status(session, "unknown", "ไม่พบผู้ใช้ในระบบ กรุณาลงทะเบียนก่อน", score=score)
     
-    return {
-        "recognized": True,
-        "username": matched_username,
-        "score": score,
-        "similarity_percent": similarity_percent,
-        "action": action,
-        "timestamp": attendance["timestamp"].strftime("%Y-%m-%d %H:%M:%S"),
-        "time_period": attendance.get("time_period"),
-        "time_period_thai": time_period_thai,
-        "distance": distance_info,
-        "message": f"{action_text}ช่วง{time_period_thai}สำเร็จ (ความเหมือน {similarity_percent}%)",
-        "quality_passed": True,
-        "detection_confidence": detection_result["confidence"]
-    }
+    # คนเดิมยังยืนอยู่หน้ากล้อง - ไม่ส่ง attendance event ซ้ำ
+    if session.in_cooldown(matched_username):
+        return _stream_status(session, "recorded", f"บันทึกของ {matched_username} แล้ว", username=matched_username)
+    
+    async with _attendance_slot(matched_username, session.action):
+        response = await _record_attendance_once(
+            matched_username, session.action, score, session.location_result, detection_result["confidence"]
+        )
+    session.mark_event(matched_username)
+    session.last_status = "recorded"
+    return {"type": "attendance", **response}
+
+
+async def _stream_control(session: StreamSession, text: str) -> Dict:
+    """จัดการ text message จาก kiosk: {"action": "check_out"} หรือ {"type": "stats"}"""
+    try:
+        message = json.loads(text)
+    except ValueError:
+        return {"type": "error", "error": "invalid_message", "message": "ต้องเป็น JSON"}
+    if not isinstance(message, dict):
+        return {"type": "error", "error": "invalid_message", "message": "ต้องเป็น JSON object"}
+    
+    if message.get("type") == "stats":
+        return {"type": "stats", **session.stats()}
+    
+    action = message.get("action")
+    if action not in ["check_in", "check_out"]:
+        return {"type": "error", "error": "invalid_action", "message": "action ต้องเป็น check_in หรือ check_out"}
+    session.action = action
+    session.last_status = None
+    return {"type": "config", "action": action}
+
+
+@router.websocket("/stream")
+async def kiosk_stream(
+    websocket: WebSocket,
+    action: str = "check_in",
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None
+):
+    """
+    Kiosk mode: รับเฟรม (JPEG/PNG เป็น binary message) ต่อเนื่องผ่าน WebSocket แล้วส่ง event กลับเป็น JSON
+    - ประมวลผลไม่เกิน KIOSK_PROCESS_FPS เฟรม/วินาที ใช้เฉพาะเฟรมล่าสุด (เฟรมที่ค้างหรือเก่ากว่า KIOSK_MAX_FRAME_AGE ถูกทิ้ง)
+    - text message: {"action": "check_out"} เปลี่ยน action, {"type": "stats"} ขอสถิติของ connection
+    - events: ready, status (เฉพาะตอนเปลี่ยน), attendance (response เดียวกับ /recognize), config, stats, error
+    """
+    await websocket.accept()
+    
+    if action not in ["check_in", "check_out"]:
+        action = "check_in"
+    
+    # ตำแหน่งของ kiosk ตรวจครั้งเดียวตอนเชื่อมต่อ
+    try:
+        location_result = _check_location_or_raise(latitude, longitude)
+    except HTTPException as e:
+        await websocket.send_json({"type": "error", **e.detail})
+        await websocket.close(code=1008)
+        return
+    
+    session = StreamSession(action, location_result, KIOSK_PROCESS_FPS, KIOSK_EVENT_COOLDOWN)
+    send_lock = asyncio.Lock()
+    
+    async def send(event: Dict):
+        async with send_lock:
+            await websocket.send_json(event)
+    
+    async def receive_frames():
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("bytes") is not None:
+                    if len(message["bytes"]) > KIOSK_MAX_FRAME_BYTES:
+                        KIOSK_FRAMES.labels(result="invalid").inc()
+                        await send({"type": "error", "error": "frame_too_large", "message": "เฟรมใหญ่เกินไป"})
+                        continue
+                    session.frames.put(message["bytes"])
+                elif message.get("text") is not None:
+                    await send(await _stream_control(session, message["text"]))
+        except WebSocketDisconnect:
+            pass
+        finally:
+            session.frames.close()
+    
+    with KIOSK_CONNECTIONS.track_inprogress():
+        receiver = asyncio.create_task(receive_frames())
+        try:
+            await send({"type": "ready", "action": session.action, "fps": KIOSK_PROCESS_FPS})
+            while True:
+                frame = await session.next_frame(KIOSK_MAX_FRAME_AGE)
+                if frame is None:
+                    break
+                try:
+                    event = await _stream_frame_event(session, frame)
+                except Exception as e:
+                    # error ของเฟรมเดียว (เช่น database) ไม่ตัด connection ของ kiosk
+                    print(f"Kiosk stream error: {e}")
+                    event = {"type": "error", "error": "processing_failed", "message": str(e)}
+                if event is not None:
+                    await send(event)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            receiver.cancel()
@@ -0,0 +1,114 @@
+"""
+Attendance Report Routes
+รายงาน attendance (รายวัน / การมาสาย / รายเดือน) ที่ aggregate ใน database
+แบ่งหน้าด้วย keyset cursor: ส่ง next_cursor ของหน้าก่อนมาเป็น cursor เพื่อขอหน้าถัดไป
+และ export แถวดิบแบบ streaming (CSV / NDJSON)
+"""
+
+from datetime import date
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from core.reports import (
+    get_daily_report,
+    get_lateness_report,
+    get_monthly_report,
+    open_attendance_export,
+    encode_export,
+    EXPORT_FORMATS,
+)
+from services.executor import run_in_stage
+from config.settings import REPORT_PAGE_SIZE, REPORT_MAX_PAGE_SIZE
+
+router = APIRouter(prefix="/reports", tags=["Attendance Reports"])
+
+
+async def _run_report(report, start: date, end: date, limit: int, cursor: Optional[str], username: Optional[str]):
+    if end < start:
+        raise HTTPException(
+            status_code=400,
+            detail={"error": "invalid_date_range", "message": "end ต้องไม่ก่อน start"}
+        )
+    try:
+        result = await run_in_stage("db", report, start, end, limit, cursor, username)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail={"error": "invalid_cursor", "message": str(e)})
+
+    result["start"] = start.isoformat()
+    result["end"] = end.isoformat()
+    return result
+
+
+@router.get("/daily")
+async def daily_report(
+    start: date = Query(..., description="วันแรก (YYYY-MM-DD)"),
+    end: date = Query(..., description="วันสุดท้าย (YYYY-MM-DD, รวมวันนี้)"),
+    username: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None, description="next_cursor จากหน้าก่อน"),
+    limit: int = Query(REPORT_PAGE_SIZE, ge=1, le=REPORT_MAX_PAGE_SIZE, description="จำนวน users ต่อหน้า"),
+):
+    """เข้างานครั้งแรก / ออกงานครั้งสุดท้ายของแต่ละ user ในแต่ละวัน"""
+    return await _run_report(get_daily_report, start, end, limit, cursor, username)
+
+
+@router.get("/lateness")
+async def lateness_report(
+    start: date = Query(..., description="วันแรก (YYYY-MM-DD)"),
+    end: date = Query(..., description="วันสุดท้าย (YYYY-MM-DD, รวมวันนี้)"),
+    username: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None, description="next_cursor จากหน้าก่อน"),
+    limit: int = Query(REPORT_PAGE_SIZE, ge=1, le=REPORT_MAX_PAGE_SIZE, description="จำนวน users ต่อหน้า"),
+):
+    """จำนวนวัน/นาทีที่มาสายของแต่ละ user แยกตาม time_period (เทียบกับ WORK_START_TIMES)"""
+    return await _run_report(get_lateness_report, start, end, limit, cursor, username)
+
+
+@router.get("/monthly")
+async def monthly_report(
+    start: date = Query(..., description="วันแรก (YYYY-MM-DD)"),
+    end: date = Query(..., description="วันสุดท้าย (YYYY-MM-DD, รวมวันนี้)"),
+    username: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None, description="next_cursor จากหน้าก่อน"),
+    limit: int = Query(REPORT_PAGE_SIZE, ge=1, le=REPORT_MAX_PAGE_SIZE, description="จำนวน users ต่อหน้า"),
+):
+    """ยอดรวมรายเดือนของแต่ละ user: วันที่เข้างาน, check-in/check-out, ชั่วโมงทำงาน"""
+    return await _run_report(get_monthly_report, start, end, limit, cursor, username)
+
+
+@router.get("/export")
+async def export_attendance(
+    start: date = Query(..., description="วันแรก (YYYY-MM-DD)"),
+    end: date = Query(..., description="วันสุดท้าย (YYYY-MM-DD, รวมวันนี้)"),
+    username: Optional[str] = Query(None),
+    format: str = Query("csv", description="csv หรือ ndjson"),
+    gzip: bool = Query(True, description="บีบอัดเป็น .gz ระหว่างส่ง"),
+):
+    """
+    Export attendance ทุกแถวในช่วงวันที่ (ทุกสาขา) แบบ streaming
+    อ่านจาก MySQL ทีละ batch แล้วส่งออกทันที - memory ของ worker คงที่ไม่ว่าข้อมูลจะกี่แถว
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail={"error": "invalid_format", "message": f"format ต้องเป็น {', '.join(EXPORT_FORMATS)}"}
+        )
+    if end < start:
+        raise HTTPException(
+            status_code=400,
+            detail={"error": "invalid_date_range", "message": "end ต้องไม่ก่อน start"}
+        )
+
+    # execute query ก่อนเริ่มส่ง response (error ของ database ยังตอบเป็น 500 ได้ตามปกติ)
+    batches = await run_in_stage("db", open_attendance_export, start, end, username)
+
+    filename = f"attendance_{start.isoformat()}_{end.isoformat()}.{format}"
+    media_type = EXPORT_FORMATS[format]
+    if gzip:
+        filename += ".gz"
+        media_type = "application/gzip"
+
+    return StreamingResponse(
+        encode_export(batches, format, compress=gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
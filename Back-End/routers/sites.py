@@ -0,0 +1,54 @@
+"""
+Site Routes
+จัดการสาขา/จุดที่อนุญาตให้ check-in (multi-site geofencing)
+เพิ่ม/ปิดสาขาแล้วโหลด site index ใหม่ทันที (worker อื่นเห็นภายใน SITE_REFRESH_INTERVAL)
+"""
+
+from fastapi import APIRouter, Form, HTTPException, Query
+from core.database import create_site, deactivate_site, load_active_sites
+from core.site_index import load_sites
+from services.location import check_location
+from services.executor import run_in_stage
+
+router = APIRouter(prefix="/sites", tags=["Sites"])
+
+
+@router.get("")
+async def list_sites():
+    """สาขาที่เปิดใช้งานทั้งหมด"""
+    sites = await run_in_stage("db", load_active_sites)
+    return {"sites": sites, "count": len(sites)}
+
+
+@router.post("")
+async def add_site(
+    name: str = Form(...),
+    latitude: float = Form(..., ge=-90, le=90),
+    longitude: float = Form(..., ge=-180, le=180),
+    radius_meters: int = Form(200, gt=0),
+):
+    """เพิ่มสาขาใหม่ (พิกัดศูนย์กลาง + รัศมีที่อนุญาต)"""
+    site = await run_in_stage("db", create_site, name, latitude, longitude, radius_meters)
+    await run_in_stage("db", load_sites)
+    return {"success": True, "site": site}
+
+
+@router.delete("/{site_id}")
+async def remove_site(site_id: int):
+    """ปิดใช้งานสาขา (attendance เดิมยังอ้างอิง site_id ได้)"""
+    if not await run_in_stage("db", deactivate_site, site_id):
+        raise HTTPException(
+            status_code=404,
+            detail={"error": "site_not_found", "message": f"ไม่พบสาขา {site_id}"}
+        )
+    await run_in_stage("db", load_sites)
+    return {"success": True, "site_id": site_id}
+
+
+@router.get("/locate")
+async def locate_site(
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+):
+    """ตรวจว่าพิกัดอยู่ในรัศมีของสาขาไหน (ไม่บันทึกอะไร)"""
+    return check_location(latitude, longitude)
@@ -0,0 +1,131 @@
+"""
+Embedding Encoding Migration
+แปลง embeddings ที่เก็บอยู่ใน face_embeddings เป็น encoding ใหม่ (float32 / float16 / int8)
+และวัดความคลาดเคลื่อนของ match score เทียบกับ float32 ก่อนแปลง
+
+- แปลงทีละ batch ตาม id (commit ทุก batch, รันซ้ำได้ - ข้ามแถวที่เป็น encoding เป้าหมายแล้ว)
+- user_centroids ไม่เปลี่ยน (คำนวณจาก float32 ตอนลงทะเบียนอยู่แล้ว)
+- แปลงจาก float16/int8 กลับเป็น float32 ได้ แต่ความละเอียดที่เสียไปจะไม่กลับมา
+
+Usage:
+    python -m scripts.migrate_embeddings --measure               # วัดอย่างเดียว ไม่แก้ข้อมูล
+    python -m scripts.migrate_embeddings --to float16
+    python -m scripts.migrate_embeddings --to int8 --batch-size 2000 --report encoding_report.json
+
+หลังแปลงแล้วตั้ง EMBEDDING_STORAGE_ENCODING ให้ตรงกัน เพื่อให้รูปที่ลงทะเบียนใหม่ใช้ encoding เดียวกัน
+"""
+
+import argparse
+import json
+from typing import Dict, List
+import numpy as np
+from config.settings import EMBEDDING_STORAGE_ENCODING, VERIFY_THRESHOLD
+from core.database import db_connection, init_db
+from core.embedding_codec import ENCODINGS, decode_embedding, encode_embedding, measure_score_error
+
+
+def table_usage() -> Dict[str, Dict]:
+    """จำนวนแถวและขนาดข้อมูล embedding แยกตาม encoding"""
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT encoding, COUNT(*), COALESCE(SUM(LENGTH(embedding)), 0)
+            FROM face_embeddings GROUP BY encoding
+        """)
+        usage = {encoding: {"rows": int(rows), "bytes": int(size)} for encoding, rows, size in cur.fetchall()}
+        cur.close()
+    return usage
+
+
+def sample_float32_embeddings(limit: int) -> List[np.ndarray]:
+    """ตัวอย่าง embeddings ที่ยังเป็น float32 (ต้นฉบับ) สำหรับวัดความคลาดเคลื่อน (อ่านตาม primary key ไม่ sort ทั้งตาราง)"""
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT embedding FROM face_embeddings WHERE encoding = 'float32' ORDER BY id LIMIT %s",
+            (limit,)
+        )
+        embeddings = [decode_embedding(blob, "float32") for (blob,) in cur.fetchall()]
+        cur.close()
+    return embeddings
+
+
+def migrate(target: str, batch_size: int = 1000) -> int:
+    """
+    แปลงทุกแถวที่ยังไม่ใช่ target
+
+    Returns:
+        int: จำนวนแถวที่แปลง
+    """
+    converted = 0
+    last_id = 0
+    while True:
+        with db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT id, embedding, encoding FROM face_embeddings
+                WHERE id > %s AND encoding <> %s
+                ORDER BY id LIMIT %s
+            """, (last_id, target, batch_size))
+            rows = cur.fetchall()
+            if not rows:
+                cur.close()
+                break
+
+            cur.executemany(
+                "UPDATE face_embeddings SET embedding = %s, encoding = %s WHERE id = %s",
+                [(encode_embedding(decode_embedding(blob, encoding), target), target, row_id)
+                 for row_id, blob, encoding in rows]
+            )
+            conn.commit()
+            cur.close()
+
+        converted += len(rows)
+        last_id = rows[-1][0]
+        print(f"  แปลงแล้ว {converted} แถว (id <= {last_id})")
+    return converted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-encode stored face embeddings")
+    parser.add_argument("--to", default=EMBEDDING_STORAGE_ENCODING, choices=ENCODINGS, help="encoding เป้าหมาย")
+    parser.add_argument("--batch-size", type=int, default=1000, help="จำนวนแถวต่อ transaction")
+    parser.add_argument("--sample", type=int, default=500, help="จำนวน embeddings ที่ใช้วัดความคลาดเคลื่อน")
+    parser.add_argument("--measure", action="store_true", help="วัดความคลาดเคลื่อนอย่างเดียว ไม่แก้ข้อมูล")
+    parser.add_argument("--report", default=None, help="บันทึกรายงานเป็น JSON")
+    args = parser.parse_args()
+
+    # เพิ่ม column encoding ให้ database เก่าก่อน
+    init_db()
+
+    report = {"before": table_usage()}
+    print(f"ก่อนแปลง: {report['before']}")
+
+    # วัดจาก float32 ต้นฉบับ (ต้องวัดก่อนแปลง)
+    sample = sample_float32_embeddings(args.sample)
+    if len(sample) >= 2:
+        report["score_error"] = [
+            measure_score_error(sample, encoding, VERIFY_THRESHOLD)
+            for encoding in ENCODINGS if encoding != "float32"
+        ]
+        for item in report["score_error"]:
+            print(json.dumps(item))
+    else:
+        print("ไม่มี embeddings float32 พอสำหรับวัดความคลาดเคลื่อน")
+
+    if not args.measure:
+        print(f"แปลงเป็น {args.to}")
+        report["converted"] = migrate(args.to, args.batch_size)
+        report["after"] = table_usage()
+        print(f"หลังแปลง: {report['after']}")
+        if args.to != EMBEDDING_STORAGE_ENCODING:
+            print(f"ตั้ง EMBEDDING_STORAGE_ENCODING={args.to} ให้รูปที่ลงทะเบียนใหม่ใช้ encoding เดียวกัน")
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"บันทึกรายงาน: {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""
+Model Quantization Script
+แปลง det_500m.onnx (SCRFD) และ w600k_mbf.onnx (ArcFace) เป็น static INT8
+โดย calibrate กับโฟลเดอร์รูปใบหน้าของเราเอง แล้วรายงาน latency / ความคลาดเคลื่อนเทียบ FP32
+
+ต้องติดตั้ง onnx เพิ่ม (ใช้เฉพาะตอน quantize ไม่ต้องมีบน server):
+    pip install onnx
+
+Usage:
+    python -m scripts.quantize_models --calibration faces/
+    python -m scripts.quantize_models --calibration faces/ --eval faces_eval/ --report quantization_report.json
+
+หลังจากนั้นตั้ง USE_QUANTIZED_MODELS=true ให้ server โหลด model INT8 ทั้งคู่
+"""
+
+import argparse
+import json
+import os
+import time
+import cv2
+import numpy as np
+from typing import Dict, List
+from config.settings import (
+    FACE_MODEL_FP32_PATH,
+    FACE_MODEL_INT8_PATH,
+    FACE_DETECTION_MODEL_FP32_PATH,
+    FACE_DETECTION_MODEL_INT8_PATH,
+    FACE_DETECTION_INPUT_SIZE,
+    FACE_DETECTION_NMS_THRESHOLD,
+)
+
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def load_folder(folder: str, limit: int = 0) -> List[np.ndarray]:
+    """โหลดรูปทั้งหมดในโฟลเดอร์ (BGR)"""
+    paths = sorted(
+        os.path.join(folder, name) for name in os.listdir(folder)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    if limit > 0:
+        paths = paths[:limit]
+
+    images = []
+    for path in paths:
+        img = cv2.imread(path)
+        if img is not None:
+            images.append(img)
+    if not images:
+        raise ValueError(f"ไม่พบรูปใน {folder}")
+    return images
+
+
+# ==================================================
+# Calibration
+# ==================================================
+def _calibration_reader(input_name: str, blobs: List[np.ndarray]):
+    from onnxruntime.quantization import CalibrationDataReader
+
+    class _Reader(CalibrationDataReader):
+        def __init__(self):
+            self._iter = iter(blobs)
+
+        def get_next(self):
+            blob = next(self._iter, None)
+            return None if blob is None else {input_name: blob}
+
+        def rewind(self):
+            self._iter = iter(blobs)
+
+    return _Reader()
+
+
+def _ensure_opset(model_path: str, min_opset: int):
+    """
+    อัปเกรด opset ของ model (in place) ถ้าต่ำกว่า min_opset
+    per-channel QDQ ต้องใช้ attribute axis ของ DequantizeLinear ซึ่งมีตั้งแต่ opset 13
+    (det_500m.onnx ของ InsightFace export ด้วย opset 11)
+    """
+    import onnx
+    from onnx import version_converter
+
+    model = onnx.load(model_path)
+    opset = next((o.version for o in model.opset_import if o.domain in ("", "ai.onnx")), None)
+    if opset is not None and opset < min_opset:
+        model = version_converter.convert_version(model, min_opset)
+        onnx.save(model, model_path)
+
+
+def quantize_model(fp32_path: str, int8_path: str, blobs: List[np.ndarray], per_channel: bool = True):
+    """
+    Static INT8 (QDQ format) ด้วย calibration blobs
+
+    Args:
+        fp32_path: model ต้นฉบับ
+        int8_path: path ของ model INT8 ที่จะสร้าง
+        blobs: input ของ model (แต่ละตัว batch = 1) สำหรับ calibrate
+        per_channel: quantize weight แยก channel (แม่นกว่า)
+    """
+    import onnxruntime as ort
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    input_name = ort.InferenceSession(fp32_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+    # optimize + shape inference ก่อน quantize (แนะนำโดย ONNX Runtime)
+    prepared_path = int8_path + ".prep.onnx"
+    quant_pre_process(fp32_path, prepared_path, skip_symbolic_shape=True)
+    _ensure_opset(prepared_path, 13 if per_channel else 10)
+
+    try:
+        quantize_static(
+            prepared_path,
+            int8_path,
+            _calibration_reader(input_name, blobs),
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=per_channel,
+            calibrate_method=CalibrationMethod.Percentile,
+        )
+    finally:
+        if os.path.exists(prepared_path):
+            os.remove(prepared_path)
+
+
+# ==================================================
+# Evaluation
+# ==================================================
+def _latency_ms(func, inputs: List, repeat: int = 3) -> float:
+    func(inputs[0])  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for item in inputs:
+            func(item)
+    return (time.perf_counter() - start) * 1000 / (repeat * len(inputs))
+
+
+def _iou(a: List[int], b: List[int]) -> float:
+    w = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    h = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = w * h
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def evaluate_embedding(images: List[np.ndarray], fp32_path: str, int8_path: str) -> Dict:
+    """เทียบ embeddings ของ FP32 กับ INT8: cosine ต่อรูป และความต่างของ match score ระหว่างรูป"""
+    from core.face_embedding import create_embedder, _preprocess
+
+    blobs = [np.expand_dims(_preprocess(img), axis=0) for img in images]
+    fp32 = create_embedder("onnxruntime", fp32_path)
+    int8 = create_embedder("onnxruntime", int8_path)
+
+    def embed(embedder):
+        out = np.concatenate([embedder.run(blob) for blob in blobs], axis=0)
+        return out / np.linalg.norm(out, axis=1, keepdims=True)
+
+    emb32, emb8 = embed(fp32), embed(int8)
+    cosine = np.sum(emb32 * emb8, axis=1)
+    score_diff = np.abs(emb32 @ emb32.T - emb8 @ emb8.T)
+
+    return {
+        "images": len(images),
+        "latency_ms": {
+            "fp32": round(_latency_ms(fp32.run, blobs), 3),
+            "int8": round(_latency_ms(int8.run, blobs), 3),
+        },
+        "cosine_fp32_vs_int8": {
+            "mean": round(float(cosine.mean()), 5),
+            "min": round(float(cosine.min()), 5),
+        },
+        # การเปลี่ยนแปลงของ similarity score ระหว่างรูป (เทียบกับ VERIFY_THRESHOLD)
+        "match_score_abs_diff": {
+            "mean": round(float(score_diff.mean()), 5),
+            "max": round(float(score_diff.max()), 5),
+        },
+    }
+
+
+def evaluate_detection(images: List[np.ndarray], fp32_path: str, int8_path: str, conf_threshold: float = 0.5) -> Dict:
+    """เทียบใบหน้าที่ใหญ่ที่สุดของ FP32 กับ INT8 ด้วย IoU"""
+    from services.face_detection import ScrfdDetector
+
+    input_size = (FACE_DETECTION_INPUT_SIZE, FACE_DETECTION_INPUT_SIZE)
+    fp32 = ScrfdDetector(fp32_path, input_size=input_size, nms_threshold=FACE_DETECTION_NMS_THRESHOLD)
+    int8 = ScrfdDetector(int8_path, input_size=input_size, nms_threshold=FACE_DETECTION_NMS_THRESHOLD)
+
+    ious, missed, extra = [], 0, 0
+    for img in images:
+        faces32 = fp32.detect(img, conf_threshold)
+        faces8 = int8.detect(img, conf_threshold)
+        if faces32 and faces8:
+            ious.append(_iou(faces32[0]["bbox"], faces8[0]["bbox"]))
+        elif faces32:
+            missed += 1
+        elif faces8:
+            extra += 1
+
+    return {
+        "images": len(images),
+        "latency_ms": {
+            "fp32": round(_latency_ms(fp32.detect, images), 3),
+            "int8": round(_latency_ms(int8.detect, images), 3),
+        },
+        "iou": {
+            "mean": round(float(np.mean(ious)), 4) if ious else None,
+            "min": round(float(np.min(ious)), 4) if ious else None,
+        },
+        "missed_by_int8": missed,
+        "extra_in_int8": extra,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantize face models to static INT8")
+    parser.add_argument("--calibration", "-c", required=True, help="โฟลเดอร์รูปใบหน้าสำหรับ calibrate")
+    parser.add_argument("--eval", "-e", default=None, help="โฟลเดอร์รูปสำหรับวัดผล (default = calibration)")
+    parser.add_argument("--limit", type=int, default=200, help="จำนวนรูปสูงสุดที่ใช้ calibrate")
+    parser.add_argument("--models", default="detection,embedding", help="model ที่จะ quantize")
+    parser.add_argument("--report", "-r", default="quantization_report.json", help="ไฟล์รายงาน (JSON)")
+    args = parser.parse_args()
+
+    models = {m.strip() for m in args.models.split(",") if m.strip()}
+    calibration = load_folder(args.calibration, args.limit)
+    evaluation = load_folder(args.eval) if args.eval else calibration
+    print(f"calibration: {len(calibration)} รูป, evaluation: {len(evaluation)} รูป")
+
+    report = {}
+
+    if "detection" in models:
+        from services.face_detection import _preprocess_for_detection
+        input_size = (FACE_DETECTION_INPUT_SIZE, FACE_DETECTION_INPUT_SIZE)
+        blobs = [_preprocess_for_detection(img, input_size)[0] for img in calibration]
+
+        print(f"Quantize {FACE_DETECTION_MODEL_FP32_PATH} → {FACE_DETECTION_MODEL_INT8_PATH}")
+        quantize_model(FACE_DETECTION_MODEL_FP32_PATH, FACE_DETECTION_MODEL_INT8_PATH, blobs)
+        report["detection"] = evaluate_detection(evaluation, FACE_DETECTION_MODEL_FP32_PATH, FACE_DETECTION_MODEL_INT8_PATH)
+        print(json.dumps(report["detection"], indent=2))
+
+    if "embedding" in models:
+        from core.face_embedding import _preprocess
+        blobs = [np.expand_dims(_preprocess(img), axis=0) for img in calibration]
+
+        print(f"Quantize {FACE_MODEL_FP32_PATH} → {FACE_MODEL_INT8_PATH}")
+        quantize_model(FACE_MODEL_FP32_PATH, FACE_MODEL_INT8_PATH, blobs)
+        report["embedding"] = evaluate_embedding(evaluation, FACE_MODEL_FP32_PATH, FACE_MODEL_INT8_PATH)
+        print(json.dumps(report["embedding"], indent=2))
+
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"บันทึกรายงาน: {args.report}")
+    print("ตั้ง USE_QUANTIZED_MODELS=true เพื่อให้ server ใช้ model INT8")
+
+
+if __name__ == "__main__":
+    main()
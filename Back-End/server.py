@@ -3,9 +3,34 @@ Face Recognition API Server
 Entry point สำหรับ FastAPI application
 """
 
-from fastapi import FastAPI
+import asyncio
+import time
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
 from routers.face import router as face_router
-from core.database import init_db
+from routers.reports import router as reports_router
+from routers.sites import router as sites_router
+from core.database import (
+    init_db,
+    get_pool_stats,
+    get_attendance_queue_stats,
+    start_attendance_writer,
+    stop_attendance_writer,
+)
+from core.gallery import get_gallery, is_gallery_loaded
+from core.attendance_dedup import get_dedup_stats
+from core.site_index import load_sites, start_site_refresh, stop_site_refresh
+from services.upload_cache import get_upload_cache_stats
+from core.model_registry import warm_up_models, models_ready, get_model_status
+from core.metrics import (
+    CONTENT_TYPE,
+    HTTP_IN_FLIGHT,
+    HTTP_REQUESTS,
+    HTTP_REQUEST_SECONDS,
+    render_metrics,
+)
+from services.executor import shutdown_executors, get_thread_pool
+from config.settings import MODEL_WARMUP, GALLERY_LOAD_RETRY_MAX_INTERVAL
 
 app = FastAPI(
     title="Face Recognition API",
@@ -13,17 +38,111 @@ app = FastAPI(
     version="1.0.0"
 )
 
+_gallery_retry_task = None
+
+
+async def _retry_gallery_load(db_initialized: bool):
+    """ลองสร้างตาราง + โหลด gallery ใหม่จนสำเร็จ (backoff 1, 2, 4, ... วินาที ไม่เกิน GALLERY_LOAD_RETRY_MAX_INTERVAL)"""
+    delay = min(1.0, GALLERY_LOAD_RETRY_MAX_INTERVAL)
+    loop = asyncio.get_running_loop()
+    while not is_gallery_loaded():
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, GALLERY_LOAD_RETRY_MAX_INTERVAL)
+        try:
+            if not db_initialized:
+                await loop.run_in_executor(get_thread_pool(), init_db)
+                db_initialized = True
+                print("Database initialized successfully")
+            gallery = await loop.run_in_executor(get_thread_pool(), get_gallery)
+            print(f"Gallery loaded: {len(gallery)} users")
+        except Exception as e:
+            print(f"Gallery load retry error (next in {delay:.0f}s): {e}")
+
+
 # Initialize database tables
 @app.on_event("startup")
 async def startup_event():
+    global _gallery_retry_task
+    db_initialized = False
     try:
         init_db()
+        db_initialized = True
         print("Database initialized successfully")
     except Exception as e:
         print(f"Database initialization error: {e}")
+    
+    # โหลด embeddings เข้า gallery ใน memory ครั้งเดียว (ไม่สำเร็จ = ลองใหม่เบื้องหลัง, /ready ตอบ 503 จนกว่าจะโหลดได้)
+    try:
+        gallery = get_gallery()
+        print(f"Gallery loaded: {len(gallery)} users")
+    except Exception as e:
+        print(f"Gallery load error: {e}")
+        _gallery_retry_task = asyncio.create_task(_retry_gallery_load(db_initialized))
+    
+    # เริ่ม write-behind ของ attendance (ถ้าเปิดใช้)
+    try:
+        start_attendance_writer()
+    except Exception as e:
+        print(f"Attendance writer start error: {e}")
+    
+    # โหลดสาขาเข้า site index (ไม่มีสาขา = ใช้พิกัดที่ทำงานจาก settings)
+    try:
+        site_index = load_sites()
+        print(f"Site index loaded: {len(site_index)} sites")
+    except Exception as e:
+        print(f"Site index load error: {e}")
+    start_site_refresh()
+    
+    # โหลด + warm-up models เบื้องหลัง (/health ตอบได้ทันที, /ready รอจนเสร็จ)
+    if MODEL_WARMUP:
+        asyncio.get_running_loop().run_in_executor(get_thread_pool(), _warm_up)
+
+
+def _warm_up():
+    start = time.perf_counter()
+    status = warm_up_models()
+    for name, info in status.items():
+        if info["error"]:
+            print(f"Model {name} warm-up error: {info['error']}")
+        else:
+            print(f"Model {name}: load {info['load_seconds']}s, warm-up {info['warmup_seconds']}s")
+    print(f"Models warm-up finished in {time.perf_counter() - start:.2f}s")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if _gallery_retry_task is not None:
+        _gallery_retry_task.cancel()
+    stop_attendance_writer()
+    stop_site_refresh()
+    shutdown_executors()
 
 # Include routers
 app.include_router(face_router)
+app.include_router(reports_router)
+app.include_router(sites_router)
+
+
+@app.middleware("http")
+async def track_requests(request: Request, call_next):
+    """นับ request, วัดเวลาตอบ และจำนวน request ที่กำลังประมวลผล"""
+    if request.url.path == "/metrics":
+        return await call_next(request)
+    
+    start = time.perf_counter()
+    status = 500
+    HTTP_IN_FLIGHT.inc()
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        HTTP_IN_FLIGHT.dec()
+        # ใช้ path template ของ route (ไม่ใช่ URL จริง) เพื่อไม่ให้ label มีจำนวนไม่จำกัด
+        route = request.scope.get("route")
+        route_path = getattr(route, "path", "unmatched")
+        HTTP_REQUEST_SECONDS.labels(method=request.method, route=route_path).observe(time.perf_counter() - start)
+        HTTP_REQUESTS.labels(method=request.method, route=route_path, status=status).inc()
 
 
 @app.get("/")
@@ -36,4 +155,39 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+
+@app.get("/ready")
+async def readiness_check():
+    """
+    Readiness probe: 200 เมื่อ models warm-up เสร็จและโหลด gallery แล้ว, 503 ถ้ายังไม่พร้อม
+    (MODEL_WARMUP=false: พร้อมทันทีที่โหลด gallery - model โหลดตอน request แรก)
+    """
+    gallery_loaded = is_gallery_loaded()
+    ready = gallery_loaded and (models_ready() or not MODEL_WARMUP)
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "ready": ready,
+            "gallery_loaded": gallery_loaded,
+            "models": get_model_status(),
+        }
+    )
+
+
+@app.get("/health/db")
+async def db_pool_stats():
+    """สถิติของ database connection pool (in use, waiting, created), write-behind queue, dedup cache และ upload cache"""
+    return {
+        "pool": get_pool_stats(),
+        "attendance_queue": get_attendance_queue_stats(),
+        "attendance_dedup": get_dedup_stats(),
+        "upload_cache": get_upload_cache_stats(),
+    }
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Metrics ในรูปแบบ Prometheus text format (latency แต่ละ stage, counters, gauges)"""
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE)
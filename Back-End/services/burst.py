@@ -0,0 +1,39 @@
+"""
+Burst Services
+เลือกเฟรมที่ดีที่สุดจากรูปหลายเฟรมที่ถ่ายต่อเนื่อง (/face/recognize/burst)
+"""
+
+from typing import Dict, List
+import numpy as np
+
+
+def frame_rank_key(quality_result: Dict) -> tuple:
+    """
+    key สำหรับเรียงเฟรมจากผล check_image_quality (มากก่อน = ดีกว่า)
+    ผ่านทุกข้อก่อน → จำนวนข้อที่ผ่าน → ความคมชัด (Laplacian variance)
+    """
+    checks = quality_result["checks"]
+    return (
+        quality_result["passed"],
+        sum(1 for check in checks.values() if check["passed"]),
+        checks.get("blur", {}).get("value", 0.0),
+    )
+
+
+def rank_frames(quality_results: List[Dict]) -> List[int]:
+    """
+    เรียง index ของเฟรมจากคุณภาพดีที่สุดไปแย่ที่สุด (เฟรมที่ decode ไม่ได้ = None อยู่ท้ายและไม่ถูกเลือก)
+
+    Returns:
+        list: index ของเฟรมที่ decode ได้ เรียงตามคุณภาพ
+    """
+    valid = [i for i, result in enumerate(quality_results) if result is not None]
+    return sorted(valid, key=lambda i: frame_rank_key(quality_results[i]), reverse=True)
+
+
+def fuse_embeddings(embeddings: List[np.ndarray]) -> np.ndarray:
+    """รวม embeddings ของหลายเฟรม (ค่าเฉลี่ยของ vector ที่ normalize แล้ว แล้ว normalize อีกครั้ง)"""
+    stacked = np.stack([np.asarray(e, dtype=np.float32) for e in embeddings])
+    stacked /= np.linalg.norm(stacked, axis=1, keepdims=True)
+    fused = stacked.mean(axis=0)
+    return fused / np.linalg.norm(fused)
@@ -0,0 +1,88 @@
+"""
+Executor Service
+รันงาน blocking (OpenCV, ONNX Runtime, MySQL) นอก asyncio event loop
+พร้อมจำกัดจำนวนงานที่รันพร้อมกันในแต่ละ stage
+"""
+
+import asyncio
+import functools
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from config.settings import WORKER_THREADS, WORKER_PROCESSES, STAGE_CONCURRENCY
+from core.metrics import STAGE_SECONDS, STAGE_WAIT_SECONDS, STAGE_IN_FLIGHT
+
+
+# stage ที่ใช้ CPU ล้วน (ส่งไป process pool ได้ถ้าเปิดใช้)
+CPU_STAGES = {"decode", "quality", "detection", "embedding"}
+
+_thread_pool: Optional[ThreadPoolExecutor] = None
+_process_pool: Optional[ProcessPoolExecutor] = None
+_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+
+def get_thread_pool() -> ThreadPoolExecutor:
+    """Thread pool หลัก (สร้างครั้งแรกที่ใช้งาน)"""
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(max_workers=WORKER_THREADS, thread_name_prefix="face-worker")
+    return _thread_pool
+
+
+def get_process_pool() -> Optional[ProcessPoolExecutor]:
+    """Process pool (None ถ้า WORKER_PROCESSES = 0)"""
+    global _process_pool
+    if _process_pool is None and WORKER_PROCESSES > 0:
+        _process_pool = ProcessPoolExecutor(max_workers=WORKER_PROCESSES)
+    return _process_pool
+
+
+def _executor_for(stage: str) -> Executor:
+    if stage in CPU_STAGES:
+        process_pool = get_process_pool()
+        if process_pool is not None:
+            return process_pool
+    return get_thread_pool()
+
+
+def _semaphore_for(stage: str) -> asyncio.Semaphore:
+    sem = _semaphores.get(stage)
+    if sem is None:
+        sem = asyncio.Semaphore(STAGE_CONCURRENCY.get(stage, WORKER_THREADS))
+        _semaphores[stage] = sem
+    return sem
+
+
+async def run_in_stage(stage: str, func: Callable, *args, **kwargs) -> Any:
+    """
+    รันฟังก์ชัน blocking ใน executor ของ stage นั้น
+
+    Args:
+        stage: ชื่อ stage ("decode", "quality", "detection", "embedding", "match", "db")
+        func: ฟังก์ชันที่จะรัน (ถ้าใช้ process pool ต้องเป็นฟังก์ชันระดับ module)
+
+    Returns:
+        ผลลัพธ์ของ func
+    """
+    loop = asyncio.get_running_loop()
+    queued_at = time.perf_counter()
+    with STAGE_IN_FLIGHT.labels(stage=stage).track_inprogress():
+        async with _semaphore_for(stage):
+            started_at = time.perf_counter()
+            STAGE_WAIT_SECONDS.labels(stage=stage).observe(started_at - queued_at)
+            try:
+                return await loop.run_in_executor(_executor_for(stage), functools.partial(func, *args, **kwargs))
+            finally:
+                STAGE_SECONDS.labels(stage=stage).observe(time.perf_counter() - started_at)
+
+
+def shutdown_executors():
+    """ปิด executors ทั้งหมด (เรียกตอน shutdown)"""
+    global _thread_pool, _process_pool
+    if _thread_pool is not None:
+        _thread_pool.shutdown(wait=False)
+        _thread_pool = None
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False)
+        _process_pool = None
+    _semaphores.clear()
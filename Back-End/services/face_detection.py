@@ -3,18 +3,177 @@ Face Detection Service
 ตรวจจับและ crop ใบหน้าด้วย ONNX Runtime (det_500m.onnx)
 """
 
+import threading
 import cv2
 import numpy as np
-import onnxruntime as ort
 from typing import Tuple, List, Optional, Dict
-from config.settings import FACE_DETECTION_MODEL_PATH
+from config.settings import (
+    FACE_DETECTION_MODEL_PATH,
+    FACE_DETECTION_INPUT_SIZE,
+    FACE_DETECTION_NMS_THRESHOLD,
+    FACE_DETECTOR_ORDER,
+)
+from core.onnx_session import create_session
+from core.model_registry import register_model, get_model
 
 
 # ==================================================
-# Load detection model once with ONNX Runtime
+# SCRFD (det_500m.onnx) detector engine
 # ==================================================
-_det_session = ort.InferenceSession(FACE_DETECTION_MODEL_PATH, providers=['CPUExecutionProvider'])
-_det_input_name = _det_session.get_inputs()[0].name
+class ScrfdDetector:
+    """
+    Face detector สำหรับ SCRFD (det_500m.onnx จาก InsightFace)
+
+    - anchor centers ของแต่ละ stride (8/16/32) คำนวณครั้งเดียวต่อขนาด input แล้ว cache ไว้
+    - decode bbox/landmarks และกรอง score ด้วย NumPy array ops
+    - ตัดกล่องซ้อนด้วย NMS แบบ vectorized
+    """
+
+    STRIDES = (8, 16, 32)
+
+    def __init__(self, model_path: str, input_size: Tuple[int, int] = (640, 640), nms_threshold: float = 0.4):
+        # model ประกาศ shape ของ output ตาม input 640 ไว้ - input ขนาดอื่น (ROI ของ tracker) รันได้
+        # แต่ ORT จะเตือน shape ไม่ตรงทุกครั้ง จึงแสดงเฉพาะ log ระดับ error
+        self.session = create_session(model_path, log_severity_level=3)
+        self.input_name = self.session.get_inputs()[0].name
+        self.input_size = input_size
+        self.nms_threshold = nms_threshold
+        self._anchor_cache: Dict[Tuple[int, int, int], np.ndarray] = {}
+
+    def _anchor_centers(self, height: int, width: int, stride: int, num_anchors: int) -> np.ndarray:
+        """anchor centers (x, y) ของ feature map ขนาด height x width (cache ตามขนาด)"""
+        key = (height, width, stride)
+        centers = self._anchor_cache.get(key)
+        if centers is None:
+            centers = np.stack(np.mgrid[:height, :width][::-1], axis=-1).astype(np.float32)
+            centers = (centers * stride).reshape(-1, 2)
+            if num_anchors > 1:
+                centers = np.repeat(centers, num_anchors, axis=0)
+            self._anchor_cache[key] = centers
+        return centers
+
+    @staticmethod
+    def _nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float) -> np.ndarray:
+        """Non-maximum suppression (คืน index ของกล่องที่เก็บไว้ เรียงตาม score)"""
+        x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+        areas = (x2 - x1) * (y2 - y1)
+        order = np.argsort(-scores)
+
+        keep = []
+        while order.size > 0:
+            i = order[0]
+            keep.append(i)
+            rest = order[1:]
+
+            # IoU ของกล่อง i กับกล่องที่เหลือทั้งหมดในครั้งเดียว
+            w = np.maximum(0.0, np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]))
+            h = np.maximum(0.0, np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]))
+            inter = w * h
+            iou = inter / (areas[i] + areas[rest] - inter + 1e-6)
+
+            order = rest[iou <= iou_threshold]
+        return np.array(keep, dtype=np.int64)
+
+    def _decode(self, outputs: List[np.ndarray], conf_threshold: float,
+                input_size: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """แปลง raw outputs (score/bbox/kps ต่อ stride) เป็นกล่องในพิกัดของ input"""
+        input_w, input_h = input_size
+        fmc = len(self.STRIDES)
+        all_scores, all_boxes, all_kps = [], [], []
+
+        for idx, stride in enumerate(self.STRIDES):
+            scores = outputs[idx].reshape(-1)
+            bbox_preds = outputs[idx + fmc].reshape(-1, 4) * stride
+            kps_preds = outputs[idx + fmc * 2].reshape(-1, 10) * stride if len(outputs) > fmc * 2 else None
+
+            height, width = input_h // stride, input_w // stride
+            num_anchors = len(scores) // (height * width)
+            centers = self._anchor_centers(height, width, stride, num_anchors)
+
+            pos = np.flatnonzero(scores >= conf_threshold)
+            if pos.size == 0:
+                continue
+
+            c = centers[pos]
+            d = bbox_preds[pos]
+            # distance → bbox: (cx - left, cy - top, cx + right, cy + bottom)
+            all_boxes.append(np.concatenate([c - d[:, :2], c + d[:, 2:]], axis=1))
+            all_scores.append(scores[pos])
+            if kps_preds is not None:
+                all_kps.append(np.tile(c, 5) + kps_preds[pos])
+
+        if not all_scores:
+            empty = np.empty((0,), dtype=np.float32)
+            return empty, np.empty((0, 4), dtype=np.float32), np.empty((0, 10), dtype=np.float32)
+
+        scores = np.concatenate(all_scores)
+        boxes = np.concatenate(all_boxes)
+        kps = np.concatenate(all_kps) if all_kps else np.zeros((len(scores), 10), dtype=np.float32)
+
+        keep = self._nms(boxes, scores, self.nms_threshold)
+        return scores[keep], boxes[keep], kps[keep]
+
+    def detect(self, image: np.ndarray, conf_threshold: float = 0.5,
+               input_size: Optional[Tuple[int, int]] = None) -> List[Dict]:
+        """
+        ตรวจจับใบหน้า คืนรายการใบหน้าในพิกัดของรูปต้นฉบับ
+        input_size: ขนาด input ของครั้งนี้ (ต้องหารด้วย 32 ลงตัว เช่น input เล็กสำหรับ ROI ของ tracker)
+        """
+        h, w = image.shape[:2]
+        input_size = input_size or self.input_size
+
+        blob, scale, (pad_x, pad_y) = _preprocess_for_detection(image, input_size)
+        outputs = self.session.run(None, {self.input_name: blob})
+        scores, boxes, kps = self._decode(outputs, conf_threshold, input_size)
+
+        # แปลงกลับเป็นพิกัดจริง แล้ว clamp ให้อยู่ในรูป
+        boxes = (boxes - [pad_x, pad_y, pad_x, pad_y]) / scale
+        boxes = np.clip(boxes, 0, [w, h, w, h]).astype(np.int64)
+        kps = (kps - [pad_x, pad_y] * 5) / scale
+
+        faces = []
+        for score, (x1, y1, x2, y2), landmarks in zip(scores, boxes.tolist(), kps):
+            if x2 > x1 and y2 > y1:
+                faces.append({
+                    "bbox": [x1, y1, x2, y2],
+                    "confidence": float(score),
+                    "width": x2 - x1,
+                    "height": y2 - y1,
+                    "landmarks": landmarks.reshape(5, 2).round(1).tolist()
+                })
+
+        # เรียงตามขนาด (ใบหน้าใหญ่สุดก่อน)
+        faces.sort(key=lambda f: f["width"] * f["height"], reverse=True)
+        return faces
+
+
+# ==================================================
+# Load detection model once with ONNX Runtime (ตอนใช้งานครั้งแรก / ตอน warm-up)
+# ==================================================
+def _create_detector() -> ScrfdDetector:
+    return ScrfdDetector(
+        FACE_DETECTION_MODEL_PATH,
+        input_size=(FACE_DETECTION_INPUT_SIZE, FACE_DETECTION_INPUT_SIZE),
+        nms_threshold=FACE_DETECTION_NMS_THRESHOLD
+    )
+
+
+def _warm_up_detector(detector: ScrfdDetector):
+    detector.detect(np.zeros((FACE_DETECTION_INPUT_SIZE, FACE_DETECTION_INPUT_SIZE, 3), dtype=np.uint8))
+
+
+register_model("scrfd", _create_detector, _warm_up_detector)
+
+# Haar Cascade (fallback) - โหลด XML ครั้งเดียวต่อ thread (CascadeClassifier ไม่ thread-safe)
+_cascade_local = threading.local()
+
+
+def _get_cascade() -> "cv2.CascadeClassifier":
+    cascade = getattr(_cascade_local, "cascade", None)
+    if cascade is None:
+        cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        _cascade_local.cascade = cascade
+    return cascade
 
 
 def _preprocess_for_detection(image: np.ndarray, input_size: Tuple[int, int] = (640, 640)) -> Tuple[np.ndarray, float, Tuple[int, int]]:
@@ -51,84 +210,45 @@ def _preprocess_for_detection(image: np.ndarray, input_size: Tuple[int, int] = (
     return blob, scale, (pad_x, pad_y)
 
 
-def detect_faces(image: np.ndarray, conf_threshold: float = 0.5) -> List[Dict]:
+def detect_faces(image: np.ndarray, conf_threshold: float = 0.5, input_size: Optional[int] = None) -> List[Dict]:
     """
-    ตรวจจับใบหน้าในรูปภาพด้วย ONNX Runtime
+    ตรวจจับใบหน้าในรูปภาพด้วย ONNX Runtime (SCRFD)
     
     Args:
         image: รูปภาพ BGR format (numpy array)
         conf_threshold: ค่า confidence ต่ำสุด
+        input_size: ขนาด input ของ model (None = FACE_DETECTION_INPUT_SIZE)
     
     Returns:
-        list: รายการใบหน้าที่ตรวจพบ พร้อม bounding box และ confidence
+        list: รายการใบหน้าที่ตรวจพบ พร้อม bounding box, confidence และ landmarks 5 จุด
     """
-    h, w = image.shape[:2]
-    input_size = (640, 640)
-    
-    # Preprocess
-    blob, scale, (pad_x, pad_y) = _preprocess_for_detection(image, input_size)
-    
-    # Inference with ONNX Runtime
-    outputs = _det_session.run(None, {_det_input_name: blob})
-    
-    faces = []
-    
-    # Parse outputs (format อาจต่างกันตาม model)
-    # สำหรับ det_500m.onnx จาก InsightFace
-    for output in outputs:
-        if output.ndim == 3:
-            output = output[0]
-        for detection in output:
-            # detection format: [x1, y1, x2, y2, confidence, ...]
-            if len(detection) >= 5:
-                confidence = float(detection[4])
-                
-                if confidence >= conf_threshold:
-                    # แปลงกลับเป็นพิกัดจริง
-                    x1 = int((detection[0] - pad_x) / scale)
-                    y1 = int((detection[1] - pad_y) / scale)
-                    x2 = int((detection[2] - pad_x) / scale)
-                    y2 = int((detection[3] - pad_y) / scale)
-                    
-                    # Clamp to image bounds
-                    x1 = max(0, min(x1, w))
-                    y1 = max(0, min(y1, h))
-                    x2 = max(0, min(x2, w))
-                    y2 = max(0, min(y2, h))
-                    
-                    if x2 > x1 and y2 > y1:
-                        faces.append({
-                            "bbox": [x1, y1, x2, y2],
-                            "confidence": confidence,
-                            "width": x2 - x1,
-                            "height": y2 - y1
-                        })
-    
-    # เรียงตามขนาด (ใบหน้าใหญ่สุดก่อน)
-    faces.sort(key=lambda f: f["width"] * f["height"], reverse=True)
-    
-    return faces
+    return get_model("scrfd").detect(image, conf_threshold, (input_size, input_size) if input_size else None)
 
 
-def detect_faces_simple(image: np.ndarray, conf_threshold: float = 0.5) -> List[Dict]:
+def detect_faces_simple(image: np.ndarray, conf_threshold: float = 0.5, input_size: Optional[int] = None) -> List[Dict]:
     """
     ตรวจจับใบหน้าด้วย OpenCV Haar Cascade (fallback method)
-    ใช้ในกรณี ONNX model มีปัญหา
     
     Args:
         image: รูปภาพ BGR format
         conf_threshold: ไม่ใช้ใน Haar Cascade
+        input_size: ย่อรูปให้ด้านยาวไม่เกินค่านี้ก่อน detect (None = ใช้ขนาดเดิม)
     
     Returns:
         list: รายการใบหน้าที่ตรวจพบ
     """
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    ratio = 1.0
+    if input_size and max(image.shape[:2]) > input_size:
+        ratio = input_size / max(image.shape[:2])
+        image = cv2.resize(image, None, fx=ratio, fy=ratio, interpolation=cv2.INTER_AREA)
     
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    detected = face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
+    detected = _get_cascade().detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
+    if ratio != 1.0:
+        detected = np.round(np.asarray(detected, dtype=np.float64).reshape(-1, 4) / ratio).astype(np.int64)
     
     faces = []
-    for (x, y, w, h) in detected:
+    for (x, y, w, h) in np.asarray(detected).reshape(-1, 4).tolist():
         faces.append({
             "bbox": [x, y, x + w, y + h],
             "confidence": 1.0,  # Haar cascade ไม่มี confidence
@@ -142,6 +262,61 @@ def detect_faces_simple(image: np.ndarray, conf_threshold: float = 0.5) -> List[
     return faces
 
 
+# ลำดับ detector ที่ใช้ (ตัวแรกเป็นหลัก ตัวถัดไปเป็น fallback)
+_DETECTORS = {
+    "onnx": detect_faces,
+    "haar": detect_faces_simple,
+}
+
+
+def detect_faces_with_fallback(image: np.ndarray, conf_threshold: float = 0.5,
+                               input_size: Optional[int] = None) -> List[Dict]:
+    """ตรวจจับใบหน้าด้วย detector ตามลำดับใน FACE_DETECTOR_ORDER (ถ้าตัวแรกไม่พบ ลองตัวถัดไป)"""
+    faces = []
+    for name in FACE_DETECTOR_ORDER:
+        try:
+            faces = _DETECTORS[name](image, conf_threshold, input_size)
+        except Exception as e:
+            print(f"{name} detection failed: {e}")
+            faces = []
+        if len(faces) > 0:
+            break
+    return faces
+
+
+def detect_faces_in_roi(image: np.ndarray, bbox: List[int], padding: float = 0.5,
+                        input_size: Optional[int] = None, conf_threshold: float = 0.5) -> List[Dict]:
+    """
+    ตรวจจับใบหน้าเฉพาะบริเวณรอบ bbox เดิม (ใช้กับเฟรมต่อเนื่องที่ใบหน้าขยับไม่มาก)
+    
+    Args:
+        image: รูปภาพ BGR format
+        bbox: [x1, y1, x2, y2] ของใบหน้าในเฟรมก่อน
+        padding: ขยาย ROI ออกแต่ละด้านเป็นสัดส่วนของขนาดใบหน้า
+        input_size: ขนาด input ของ model สำหรับ ROI (เล็กกว่าทั้งเฟรม)
+        conf_threshold: ค่า confidence ต่ำสุด
+    
+    Returns:
+        list: ใบหน้าที่พบใน ROI (bbox/landmarks เป็นพิกัดของทั้งรูป)
+    """
+    h, w = image.shape[:2]
+    x1, y1, x2, y2 = bbox
+    pad_x = int((x2 - x1) * padding)
+    pad_y = int((y2 - y1) * padding)
+    rx1, ry1 = max(0, x1 - pad_x), max(0, y1 - pad_y)
+    rx2, ry2 = min(w, x2 + pad_x), min(h, y2 + pad_y)
+    if rx2 <= rx1 or ry2 <= ry1:
+        return []
+    
+    faces = detect_faces_with_fallback(image[ry1:ry2, rx1:rx2], conf_threshold, input_size)
+    for face in faces:
+        fx1, fy1, fx2, fy2 = face["bbox"]
+        face["bbox"] = [fx1 + rx1, fy1 + ry1, fx2 + rx1, fy2 + ry1]
+        if "landmarks" in face:
+            face["landmarks"] = [[x + rx1, y + ry1] for x, y in face["landmarks"]]
+    return faces
+
+
 def crop_face(image: np.ndarray, bbox: List[int], margin: float = 0.2) -> np.ndarray:
     """
     Crop ใบหน้าจากรูปภาพพร้อม margin
@@ -194,15 +369,8 @@ def detect_and_crop_face(image: np.ndarray, conf_threshold: float = 0.5, margin:
         "confidence": None
     }
     
-    # ใช้ Haar Cascade เป็นหลัก (เสถียรกว่า)
-    faces = detect_faces_simple(image, conf_threshold)
-    
-    # ถ้า Haar Cascade ไม่พบ ลอง ONNX model
-    if len(faces) == 0:
-        try:
-            faces = detect_faces(image, conf_threshold)
-        except Exception as e:
-            print(f"ONNX detection also failed: {e}")
+    # ใช้ detector ตามลำดับใน FACE_DETECTOR_ORDER (ถ้าตัวแรกไม่พบ ลองตัวถัดไป)
+    faces = detect_faces_with_fallback(image, conf_threshold)
     
     result["face_count"] = len(faces)
     
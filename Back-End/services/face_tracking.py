@@ -0,0 +1,132 @@
+"""
+Face Tracking Service
+ติดตามใบหน้าข้ามเฟรมของกล้องตัวเดียว (kiosk stream) เพื่อไม่ต้อง detect ทั้งเฟรมทุกครั้ง
+- หลัง detect ทั้งเฟรมครั้งแรก เฟรมถัดไปค้นหาเฉพาะ ROI รอบ bbox เดิม (input ของ model เล็กลง)
+- detect ทั้งเฟรมใหม่เมื่อหาใน ROI ไม่เจอ (track หลุด) หรือทุก FACE_TRACK_REDETECT_INTERVAL เฟรม
+- TrackedIdentity: ใช้ผล matching ซ้ำเฉพาะเฟรม ROI ของ track เดิมที่ match ได้แล้ว
+  embed ใหม่ทุกครั้งที่ detect ทั้งเฟรม (คนถัดไปอาจยืนตำแหน่งเดิมจน track_id ไม่เปลี่ยน),
+  ทุกเฟรมที่ยังไม่รู้ว่าเป็นใคร และเมื่อใบหน้าคมชัดขึ้น
+"""
+
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from config.settings import (
+    FACE_DETECTION_CONFIDENCE,
+    FACE_CROP_MARGIN,
+    FACE_TRACK_REDETECT_INTERVAL,
+    FACE_TRACK_ROI_PADDING,
+    FACE_TRACK_INPUT_SIZE,
+    FACE_TRACK_MIN_IOU,
+)
+from .face_detection import detect_and_crop_face, detect_faces_in_roi, crop_face
+
+
+class FaceTrack:
+    """
+    state ของ track (เล็กและ pickle ได้ - ส่งเข้า process pool พร้อมเฟรมได้)
+
+    Attributes:
+        track_id: เลขของ track ปัจจุบัน (เพิ่มขึ้นทุกครั้งที่เริ่ม track ใหม่)
+        bbox: bbox ของใบหน้าในเฟรมล่าสุด (None = ไม่มี track)
+        frames_since_detect: จำนวนเฟรมที่ใช้ ROI ต่อกันตั้งแต่ detect ทั้งเฟรมครั้งล่าสุด
+    """
+
+    __slots__ = ("track_id", "bbox", "frames_since_detect")
+
+    def __init__(self):
+        self.track_id = 0
+        self.bbox: Optional[List[int]] = None
+        self.frames_since_detect = 0
+
+
+def bbox_iou(a: List[int], b: List[int]) -> float:
+    """IoU ของ bbox สองกล่อง [x1, y1, x2, y2]"""
+    w = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    h = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = w * h
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def track_face(image: np.ndarray, track: FaceTrack) -> Tuple[Optional[np.ndarray], Dict, FaceTrack]:
+    """
+    หาใบหน้าในเฟรมถัดไปของ track (แทน detect_and_crop_face สำหรับ stream)
+
+    Args:
+        image: เฟรม BGR format
+        track: state จากเฟรมก่อน (FaceTrack() สำหรับเฟรมแรก)
+
+    Returns:
+        tuple: (cropped_face, detection_info, track)
+            - detection_info เหมือน detect_and_crop_face และมี track_id, mode ("roi" / "full")
+            - track: state สำหรับเฟรมถัดไป
+    """
+    if track.bbox is not None and track.frames_since_detect < FACE_TRACK_REDETECT_INTERVAL:
+        faces = detect_faces_in_roi(
+            image, track.bbox, FACE_TRACK_ROI_PADDING, FACE_TRACK_INPUT_SIZE, FACE_DETECTION_CONFIDENCE
+        )
+        if faces:
+            # ใบหน้าที่ทับกับตำแหน่งเดิมมากที่สุด
+            face = max(faces, key=lambda f: bbox_iou(f["bbox"], track.bbox))
+            if bbox_iou(face["bbox"], track.bbox) >= FACE_TRACK_MIN_IOU:
+                track.bbox = face["bbox"]
+                track.frames_since_detect += 1
+                return crop_face(image, face["bbox"], FACE_CROP_MARGIN), {
+                    "found": True,
+                    "face_count": 1,
+                    "message": "พบใบหน้าสำเร็จ",
+                    "bbox": face["bbox"],
+                    "confidence": face["confidence"],
+                    "track_id": track.track_id,
+                    "mode": "roi",
+                }, track
+
+    # track หลุด / ครบรอบ / ยังไม่มี track: detect ทั้งเฟรม
+    cropped, result = detect_and_crop_face(image, FACE_DETECTION_CONFIDENCE, FACE_CROP_MARGIN)
+    track.frames_since_detect = 0
+    if not result["found"]:
+        track.bbox = None
+    else:
+        if track.bbox is None or bbox_iou(result["bbox"], track.bbox) < FACE_TRACK_MIN_IOU:
+            track.track_id += 1
+        track.bbox = result["bbox"]
+    result["track_id"] = track.track_id if result["found"] else None
+    result["mode"] = "full"
+    return cropped, result, track
+
+
+class TrackedIdentity:
+    """
+    ผล matching ของ track ปัจจุบัน - เฟรม ROI ของ track ที่ match user ได้แล้วใช้ผลเดิม
+    embed ใหม่เมื่อเปลี่ยน track, detect ทั้งเฟรม, ยังไม่ match ใคร หรือใบหน้าคมชัดขึ้นอย่างน้อย gain เท่า
+
+    Args:
+        gain: อัตราส่วนความคมชัดของใบหน้า (Laplacian variance ใน bbox) ที่ถือว่าดีขึ้นพอจะ embed ใหม่
+    """
+
+    def __init__(self, gain: float):
+        self.gain = gain
+        self.track_id: Optional[int] = None
+        self.sharpness = 0.0
+        self.username: Optional[str] = None
+        self.score: Optional[float] = None
+
+    def needs_embedding(self, track_id: int, sharpness: float, mode: str = "roi") -> bool:
+        """
+        Args:
+            track_id: track ของเฟรมนี้
+            sharpness: ความคมชัดของใบหน้า (face_sharpness)
+            mode: "full" = เฟรมนี้ detect ทั้งเฟรม (ยืนยันตัวตนใหม่เสมอ), "roi" = ติดตามจาก bbox เดิม
+        """
+        return (
+            track_id != self.track_id
+            or mode == "full"
+            or self.username is None
+            or sharpness >= self.sharpness * self.gain
+        )
+
+    def update(self, track_id: int, sharpness: float, username: Optional[str], score: Optional[float]):
+        self.track_id = track_id
+        self.sharpness = sharpness
+        self.username = username
+        self.score = score
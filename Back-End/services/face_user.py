@@ -5,7 +5,8 @@ Face User Services
 
 import numpy as np
 from core import face_to_embedding, save_user, get_user_embedding
-from core.database import load_all_users
+from core.gallery import get_gallery
+from core.metrics import VERIFICATIONS
 from config.settings import VERIFY_THRESHOLD
 
 
@@ -31,44 +32,39 @@ def recognize_face(face_img, threshold=None):
     Returns:
         tuple: (username, similarity_score) หรือ (None, None) ถ้าไม่พบ
     """
-    if threshold is None:
-        threshold = VERIFY_THRESHOLD
-    
     # สร้าง embedding จากรูปที่ส่งมา
     input_emb = face_to_embedding(face_img)
     
-    # โหลด users ทั้งหมด
-    users = load_all_users()
+    return recognize_embedding(input_emb, threshold)
+
+
+def recognize_embedding(input_emb, threshold=None):
+    """
+    ค้นหาว่า embedding นี้เป็นของใคร (เทียบกับ gallery ของทุก user)
     
-    if not users:
-        return None, None
+    Args:
+        input_emb: face embedding ที่ normalize แล้ว
+        threshold: ค่า threshold สำหรับการยืนยัน (default จาก settings)
     
-    # หา user ที่ match มากที่สุด
-    best_match = None
-    best_score = -1
+    Returns:
+        tuple: (username, similarity_score) หรือ (None, None) ถ้าไม่พบ
+    """
+    if threshold is None:
+        threshold = VERIFY_THRESHOLD
     
-    # Group embeddings by username และหาค่าเฉลี่ย
-    user_embeddings = {}
-    for username, emb in users:
-        if username not in user_embeddings:
-            user_embeddings[username] = []
-        user_embeddings[username].append(emb)
+    # ค้นหาจาก gallery ใน memory (matrix-vector product ครั้งเดียว)
+    best_match, best_score = get_gallery().search(input_emb, threshold)
     
-    for username, embeddings in user_embeddings.items():
-        # คำนวณค่าเฉลี่ยของ embeddings
-        avg_emb = np.mean(embeddings, axis=0)
-        avg_emb = avg_emb / np.linalg.norm(avg_emb)
-        
-        score = cosine_similarity(input_emb, avg_emb)
-        
-        if score > best_score:
-            best_score = score
-            best_match = username
+    if best_match is None:
+        VERIFICATIONS.labels(mode="recognize", outcome="empty_gallery").inc()
+        return None, None
     
     # ตรวจสอบว่าผ่าน threshold หรือไม่
     if best_score >= threshold:
+        VERIFICATIONS.labels(mode="recognize", outcome="matched").inc()
         return best_match, best_score
     
+    VERIFICATIONS.labels(mode="recognize", outcome="rejected").inc()
     return None, best_score
 
 
@@ -84,21 +80,48 @@ def verify_user(username: str, face_img, threshold=None):
     Returns:
         tuple: (is_verified, similarity_score)
     """
-    if threshold is None:
-        threshold = VERIFY_THRESHOLD
-        
     # 1. ดึง embedding จาก DB ของ user คนนี้
     db_emb = get_user_embedding(username)
 
     if db_emb is None:
         # ไม่พบ user
+        VERIFICATIONS.labels(mode="verify", outcome="unknown_user").inc()
         return False, None
 
     # 2. สร้าง embedding จากรูปที่ส่งมา
     input_emb = face_to_embedding(face_img)
 
+    return verify_embedding(username, input_emb, threshold, db_emb=db_emb)
+
+
+def verify_embedding(username: str, input_emb, threshold=None, db_emb=None):
+    """
+    ยืนยันตัวตนของ user ด้วย embedding ที่สร้างไว้แล้ว
+    
+    Args:
+        username: ชื่อ user ที่ต้องการยืนยัน
+        input_emb: face embedding ที่ normalize แล้ว
+        threshold: ค่า threshold สำหรับการยืนยัน (default จาก settings)
+        db_emb: embedding ของ user จาก DB (ถ้าไม่ระบุ จะดึงให้)
+    
+    Returns:
+        tuple: (is_verified, similarity_score)
+    """
+    if threshold is None:
+        threshold = VERIFY_THRESHOLD
+
+    if db_emb is None:
+        db_emb = get_user_embedding(username)
+
+        if db_emb is None:
+            # ไม่พบ user
+            VERIFICATIONS.labels(mode="verify", outcome="unknown_user").inc()
+            return False, None
+
     # 3. เปรียบเทียบ
     score = cosine_similarity(input_emb, db_emb)
 
     # 4. ตัดสินใจ
-    return score >= threshold, score
\ No newline at end of file
+    verified = score >= threshold
+    VERIFICATIONS.labels(mode="verify", outcome="matched" if verified else "rejected").inc()
+    return verified, score
\ No newline at end of file
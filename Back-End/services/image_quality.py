@@ -5,11 +5,13 @@ Image Quality Service
 
 import cv2
 import numpy as np
-from typing import Tuple, Dict
+from typing import Dict, List, Optional, Tuple
 from config.settings import (
     BRIGHTNESS_MIN,
     BRIGHTNESS_MAX,
     BLUR_THRESHOLD,
+    CONTRAST_MIN,
+    QUALITY_ANALYSIS_SIZE,
 )
 
 
@@ -27,6 +29,10 @@ def check_brightness(image: np.ndarray) -> Tuple[bool, float, str]:
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     brightness = np.mean(gray)
     
+    return _judge_brightness(brightness)
+
+
+def _judge_brightness(brightness: float) -> Tuple[bool, float, str]:
     if brightness < BRIGHTNESS_MIN:
         return False, brightness, f"รูปภาพมืดเกินไป (ความสว่าง: {brightness:.1f}, ต้องการ: ≥{BRIGHTNESS_MIN})"
     
@@ -54,13 +60,17 @@ def check_blur(image: np.ndarray) -> Tuple[bool, float, str]:
     laplacian = cv2.Laplacian(gray, cv2.CV_64F)
     sharpness = laplacian.var()
     
+    return _judge_blur(sharpness)
+
+
+def _judge_blur(sharpness: float) -> Tuple[bool, float, str]:
     if sharpness < BLUR_THRESHOLD:
         return False, sharpness, f"รูปภาพเบลอเกินไป (ความคมชัด: {sharpness:.1f}, ต้องการ: ≥{BLUR_THRESHOLD})"
     
     return True, sharpness, "ความคมชัดผ่าน"
 
 
-def check_contrast(image: np.ndarray, min_contrast: float = 30.0) -> Tuple[bool, float, str]:
+def check_contrast(image: np.ndarray, min_contrast: float = CONTRAST_MIN) -> Tuple[bool, float, str]:
     """
     ตรวจสอบ contrast ของรูปภาพ
     
@@ -74,18 +84,59 @@ def check_contrast(image: np.ndarray, min_contrast: float = 30.0) -> Tuple[bool,
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     contrast = gray.std()
     
+    return _judge_contrast(contrast, min_contrast)
+
+
+def _judge_contrast(contrast: float, min_contrast: float = CONTRAST_MIN) -> Tuple[bool, float, str]:
     if contrast < min_contrast:
         return False, contrast, f"รูปภาพ contrast ต่ำเกินไป (contrast: {contrast:.1f}, ต้องการ: ≥{min_contrast})"
     
     return True, contrast, "Contrast ผ่าน"
 
 
-def check_image_quality(image: np.ndarray) -> Dict:
+def _analysis_gray(image: np.ndarray, roi: Optional[List[int]] = None,
+                   max_size: int = QUALITY_ANALYSIS_SIZE) -> np.ndarray:
+    """
+    เตรียม grayscale สำหรับวัดคุณภาพ: crop ROI (ถ้ามี) แล้วย่อให้ด้านยาวไม่เกิน max_size
+    ก่อนแปลงสีครั้งเดียว (ย่อก่อนแปลงสี = แปลงสีน้อย pixel กว่า)
     """
-    ตรวจสอบคุณภาพรูปภาพทั้งหมด
+    if roi is not None:
+        h, w = image.shape[:2]
+        x1, y1, x2, y2 = roi
+        x1, y1 = max(0, int(x1)), max(0, int(y1))
+        x2, y2 = min(w, int(x2)), min(h, int(y2))
+        if x2 > x1 and y2 > y1:
+            image = image[y1:y2, x1:x2]
+
+    h, w = image.shape[:2]
+    if max_size > 0 and max(h, w) > max_size:
+        ratio = max_size / max(h, w)
+        image = cv2.resize(image, (max(1, round(w * ratio)), max(1, round(h * ratio))), interpolation=cv2.INTER_AREA)
+
+    if image.ndim == 2:
+        return image
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+def face_sharpness(image: np.ndarray, bbox: List[int]) -> float:
+    """
+    ความคมชัด (Laplacian variance) เฉพาะบริเวณใบหน้า - เทียบกันได้ระหว่างเฟรมของ track เดียวกัน
+    (ค่าเดียวกับ checks.blur ของ check_image_quality เมื่อส่ง roi เป็น bbox ของใบหน้า)
+    """
+    _, lap_std = cv2.meanStdDev(cv2.Laplacian(_analysis_gray(image, bbox), cv2.CV_16S))
+    return float(lap_std[0, 0]) ** 2
+
+
+def check_image_quality(image: np.ndarray, roi: Optional[List[int]] = None, fail_fast: bool = False) -> Dict:
+    """
+    ตรวจสอบคุณภาพรูปภาพทั้งหมด (แปลง grayscale ครั้งเดียวบนรูปที่ย่อแล้ว)
+    - brightness และ contrast ได้จาก cv2.meanStdDev ครั้งเดียว
+    - blur ใช้ Laplacian แบบ CV_16S (พอสำหรับ uint8 และเล็กกว่า CV_64F 4 เท่า)
     
     Args:
         image: รูปภาพ BGR format (numpy array)
+        roi: [x1, y1, x2, y2] ถ้าต้องการวัดเฉพาะบริเวณ (เช่นใบหน้า) - None = ทั้งรูป
+        fail_fast: หยุดที่การตรวจสอบแรกที่ไม่ผ่าน (checks จะมีเฉพาะที่ตรวจแล้ว)
     
     Returns:
         dict: ผลการตรวจสอบทั้งหมด
@@ -100,38 +151,37 @@ def check_image_quality(image: np.ndarray) -> Dict:
         "failed_reasons": []
     }
     
-    # 1. ตรวจสอบความสว่าง
-    brightness_passed, brightness_val, brightness_msg = check_brightness(image)
-    results["checks"]["brightness"] = {
-        "passed": brightness_passed,
-        "value": float(brightness_val),
-        "message": brightness_msg
-    }
-    if not brightness_passed:
-        results["passed"] = False
-        results["failed_reasons"].append(brightness_msg)
-    
-    # 2. ตรวจสอบความเบลอ
-    blur_passed, sharpness_val, blur_msg = check_blur(image)
-    results["checks"]["blur"] = {
-        "passed": blur_passed,
-        "value": float(sharpness_val),
-        "message": blur_msg
-    }
-    if not blur_passed:
-        results["passed"] = False
-        results["failed_reasons"].append(blur_msg)
-    
-    # 3. ตรวจสอบ contrast
-    contrast_passed, contrast_val, contrast_msg = check_contrast(image)
-    results["checks"]["contrast"] = {
-        "passed": contrast_passed,
-        "value": float(contrast_val),
-        "message": contrast_msg
-    }
-    if not contrast_passed:
-        results["passed"] = False
-        results["failed_reasons"].append(contrast_msg)
+    gray = _analysis_gray(image, roi)
+    mean, std = cv2.meanStdDev(gray)
+    
+    def blur():
+        _, lap_std = cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_16S))
+        return _judge_blur(float(lap_std[0, 0]) ** 2)
+    
+    # brightness / contrast (ได้มาฟรีจาก meanStdDev) ตรวจก่อน blur ที่ต้องคำนวณ Laplacian
+    evaluations = [
+        (1, "brightness", lambda: _judge_brightness(float(mean[0, 0]))),
+        (3, "contrast", lambda: _judge_contrast(float(std[0, 0]))),
+        (2, "blur", blur),
+    ]
+    
+    done = []
+    for order, name, evaluate in evaluations:
+        passed, value, message = evaluate()
+        done.append((order, name, passed, value, message))
+        if not passed and fail_fast:
+            break
+    
+    # เรียงผลตามลำดับเดิมของ API: brightness, blur, contrast
+    for _, name, passed, value, message in sorted(done):
+        results["checks"][name] = {
+            "passed": passed,
+            "value": float(value),
+            "message": message
+        }
+        if not passed:
+            results["passed"] = False
+            results["failed_reasons"].append(message)
     
     # สรุปผล
     if not results["passed"]:
@@ -1,10 +1,10 @@
 """
 Location Service
-คำนวณระยะทางระหว่างพิกัด GPS ด้วย Haversine formula
+คำนวณระยะทางระหว่างพิกัด GPS ด้วย Haversine formula และหาสาขาที่พิกัดอยู่ในรัศมี
 """
 
 import math
-from config.settings import OFFICE_LATITUDE, OFFICE_LONGITUDE, MAX_DISTANCE_METERS
+from core.site_index import get_site_index
 
 
 def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
@@ -38,7 +38,7 @@ def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
 
 def check_location(user_lat: float, user_lon: float) -> dict:
     """
-    ตรวจสอบว่าผู้ใช้อยู่ในระยะที่อนุญาตหรือไม่
+    ตรวจสอบว่าผู้ใช้อยู่ในรัศมีของสาขาใดสาขาหนึ่งหรือไม่ (ค้นหาผ่าน site index)
     
     Args:
         user_lat: latitude ของผู้ใช้
@@ -47,28 +47,35 @@ def check_location(user_lat: float, user_lon: float) -> dict:
     Returns:
         dict: {
             "allowed": bool,
-            "distance": float (เมตร),
-            "max_distance": int,
+            "distance": float (เมตร, ระยะถึงสาขาที่อยู่ในรัศมี หรือสาขาที่ใกล้ที่สุด),
+            "max_distance": int (รัศมีของสาขานั้น),
+            "site_id": int หรือ None (None = ใช้พิกัดที่ทำงานจาก settings),
+            "site_name": str,
             "message": str
         }
     """
-    distance = haversine_distance(user_lat, user_lon, OFFICE_LATITUDE, OFFICE_LONGITUDE)
-    distance_rounded = round(distance, 1)
-    
-    allowed = distance <= MAX_DISTANCE_METERS
+    found = get_site_index().locate(user_lat, user_lon)
+    site = found["site"]
+    distance_rounded = round(found["distance"], 1)
+    max_distance = site["radius_meters"]
+    allowed = found["inside"]
     
     if allowed:
         message = f"อยู่ในระยะที่อนุญาต ({distance_rounded:.0f} ม.)"
+    elif site["id"] is None:
+        message = f"คุณอยู่ห่างจากที่ทำงาน {distance_rounded:.0f} เมตร (เกิน {max_distance} ม.)"
     else:
-        message = f"คุณอยู่ห่างจากที่ทำงาน {distance_rounded:.0f} เมตร (เกิน {MAX_DISTANCE_METERS} ม.)"
+        message = f"คุณอยู่ห่างจากสาขา {site['name']} {distance_rounded:.0f} เมตร (เกิน {max_distance} ม.)"
     
     return {
         "allowed": allowed,
         "distance": distance_rounded,
-        "max_distance": MAX_DISTANCE_METERS,
+        "max_distance": max_distance,
+        "site_id": site["id"],
+        "site_name": site["name"],
         "office_location": {
-            "latitude": OFFICE_LATITUDE,
-            "longitude": OFFICE_LONGITUDE
+            "latitude": site["latitude"],
+            "longitude": site["longitude"]
         },
         "message": message
     }
@@ -0,0 +1,146 @@
+"""
+Stream Services
+state ต่อ connection ของ kiosk WebSocket (/face/stream)
+- LatestFrame: เก็บเฉพาะเฟรมล่าสุด เฟรมที่ยังไม่ได้ประมวลผลเมื่อมีเฟรมใหม่เข้ามาจะถูกทิ้ง
+- StreamSession: action, ผลตรวจตำแหน่ง, การจำกัด FPS, cooldown ของ event ต่อ user และ face track
+"""
+
+import asyncio
+import time
+from typing import Dict, Optional, Tuple
+from config.settings import FACE_TRACK_REEMBED_GAIN
+from core.metrics import KIOSK_FRAMES
+from .face_tracking import FaceTrack, TrackedIdentity
+
+_dropped = KIOSK_FRAMES.labels(result="dropped")
+_stale = KIOSK_FRAMES.labels(result="stale")
+_processed = KIOSK_FRAMES.labels(result="processed")
+
+
+class LatestFrame:
+    """mailbox ขนาด 1 ช่องระหว่าง loop ที่รับเฟรมกับ loop ที่ประมวลผล"""
+
+    def __init__(self):
+        self._frame: Optional[bytes] = None
+        self._received_at = 0.0
+        self._event = asyncio.Event()
+        self.closed = False
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, frame: bytes):
+        """เก็บเฟรมใหม่ (แทนที่เฟรมเดิมที่ยังไม่ได้ประมวลผล)"""
+        if self._frame is not None:
+            self.dropped += 1
+            _dropped.inc()
+        self._frame = frame
+        self._received_at = time.monotonic()
+        self.received += 1
+        self._event.set()
+
+    def take(self) -> Optional[Tuple[bytes, float]]:
+        """เอาเฟรมล่าสุดออกทันที (None ถ้าไม่มี)"""
+        if self._frame is None:
+            return None
+        frame, received_at = self._frame, self._received_at
+        self._frame = None
+        self._event.clear()
+        return frame, received_at
+
+    async def get(self) -> Optional[Tuple[bytes, float]]:
+        """รอเฟรมถัดไป (None เมื่อ connection ปิด)"""
+        while not self.closed:
+            item = self.take()
+            if item is not None:
+                return item
+            await self._event.wait()
+        return None
+
+    def close(self):
+        self.closed = True
+        self._event.set()
+
+
+class StreamSession:
+    """
+    state ของ kiosk หนึ่ง connection
+
+    Args:
+        action: "check_in" หรือ "check_out" (เปลี่ยนได้ระหว่าง connection)
+        location_result: ผล check_location ของตำแหน่ง kiosk (None ถ้าไม่ได้ส่งพิกัด)
+        fps: จำนวนเฟรมสูงสุดที่ประมวลผลต่อวินาที (0 = ไม่จำกัด)
+        cooldown: วินาทีที่ไม่ส่ง attendance event ของ user เดิมซ้ำ (คนที่ยืนอยู่หน้ากล้อง)
+    """
+
+    def __init__(self, action: str, location_result: Optional[Dict], fps: float, cooldown: float):
+        self.action = action
+        self.location_result = location_result
+        self.interval = 1.0 / fps if fps > 0 else 0.0
+        self.cooldown = cooldown
+        self.frames = LatestFrame()
+        self.processed = 0
+        self.stale = 0
+        self.last_status: Optional[str] = None
+        self._next_at = 0.0
+        self._recent: Dict[Tuple[str, str], float] = {}
+        self.track = FaceTrack()
+        self.identity = TrackedIdentity(FACE_TRACK_REEMBED_GAIN)
+
+    async def next_frame(self, max_age: float) -> Optional[bytes]:
+        """
+        รอเฟรมถัดไปตาม FPS ที่กำหนด (เฟรมที่รอนานเกิน max_age วินาทีถูกนับเป็น stale และข้าม)
+
+        Returns:
+            bytes: เฟรมล่าสุด หรือ None เมื่อ connection ปิด
+        """
+        while True:
+            item = await self.frames.get()
+            if item is None:
+                return None
+
+            delay = self._next_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                # ระหว่างรออาจมีเฟรมใหม่กว่าเข้ามา
+                newer = self.frames.take()
+                if newer is not None:
+                    self.frames.dropped += 1
+                    _dropped.inc()
+                    item = newer
+
+            frame, received_at = item
+            now = time.monotonic()
+            if max_age > 0 and now - received_at > max_age:
+                self.stale += 1
+                _stale.inc()
+                continue
+
+            self._next_at = now + self.interval
+            self.processed += 1
+            _processed.inc()
+            return frame
+
+    def status_changed(self, status: str) -> bool:
+        """True ถ้าสถานะต่างจากครั้งก่อน (ส่ง status event เฉพาะตอนเปลี่ยน)"""
+        changed = status != self.last_status
+        self.last_status = status
+        return changed
+
+    def in_cooldown(self, username: str) -> bool:
+        last = self._recent.get((username, self.action))
+        return last is not None and time.monotonic() - last < self.cooldown
+
+    def mark_event(self, username: str):
+        now = time.monotonic()
+        self._recent[(username, self.action)] = now
+        # ลบ entry ที่หมด cooldown แล้ว (kiosk หนึ่งตัวเห็นคนไม่กี่คนต่อช่วง)
+        for key in [key for key, at in self._recent.items() if now - at >= self.cooldown]:
+            del self._recent[key]
+
+    def stats(self) -> Dict:
+        return {
+            "received": self.frames.received,
+            "processed": self.processed,
+            "dropped": self.frames.dropped,
+            "stale": self.stale,
+        }
@@ -0,0 +1,105 @@
+"""
+Upload Cache
+จำผลวิเคราะห์ของรูปที่ upload ซ้ำ (client retry, /face/check-quality แล้วตามด้วย /face/recognize)
+key = BLAKE2b (128-bit) ของ bytes ในไฟล์ - ไฟล์เดียวกันข้าม decode, quality, detection และ embedding
+ไปที่ matching ได้ทันที
+
+เก็บเฉพาะใบหน้าที่ crop แล้ว + ผล quality/detection + embedding (ไม่เก็บรูปเต็ม)
+รูปที่ไม่ผ่านการตรวจสอบเก็บเฉพาะ error เพื่อตอบ error เดิมซ้ำ
+"""
+
+import hashlib
+from typing import Dict, Optional, Tuple
+import numpy as np
+from config.settings import UPLOAD_CACHE_SIZE, UPLOAD_CACHE_TTL
+from core.cache import LRUCache
+from core.metrics import REGISTRY, UPLOAD_CACHE_REQUESTS
+
+
+class UploadAnalysis:
+    """
+    ผลวิเคราะห์ของไฟล์รูปหนึ่งไฟล์
+
+    Attributes:
+        cropped_face: ใบหน้าที่ crop แล้ว (None ถ้าไม่ผ่านการตรวจสอบ)
+        quality: ผลของ check_image_quality
+        detection: ผลของ detect_and_crop_face (bbox เป็นพิกัดรูปต้นฉบับ)
+        error: (status_code, detail) ของ HTTPException ถ้าไม่ผ่านการตรวจสอบ
+        embedding: embedding ของ cropped_face (สร้างเมื่อใช้ครั้งแรก)
+    """
+
+    __slots__ = ("cropped_face", "quality", "detection", "error", "embedding")
+
+    def __init__(
+        self,
+        cropped_face: Optional[np.ndarray] = None,
+        quality: Optional[Dict] = None,
+        detection: Optional[Dict] = None,
+        error: Optional[Tuple[int, Dict]] = None,
+    ):
+        self.cropped_face = cropped_face
+        self.quality = quality
+        self.detection = detection
+        self.error = error
+        self.embedding: Optional[np.ndarray] = None
+
+    @property
+    def passed(self) -> bool:
+        return self.error is None
+
+
+_cache = LRUCache(maxsize=UPLOAD_CACHE_SIZE, ttl=UPLOAD_CACHE_TTL)
+_hits = UPLOAD_CACHE_REQUESTS.labels(result="hit")
+_misses = UPLOAD_CACHE_REQUESTS.labels(result="miss")
+
+
+def upload_cache_enabled() -> bool:
+    return UPLOAD_CACHE_SIZE > 0
+
+
+def upload_key(image_bytes: bytes) -> Optional[str]:
+    """hash ของ bytes ในไฟล์ (None ถ้าปิด cache - ไม่ต้องเสียเวลา hash)"""
+    if not upload_cache_enabled():
+        return None
+    return hashlib.blake2b(image_bytes, digest_size=16).hexdigest()
+
+
+def get_upload_analysis(key: Optional[str], passed_only: bool = False) -> Optional[UploadAnalysis]:
+    """
+    คืนผลวิเคราะห์ของไฟล์ที่เคยเห็น (None ถ้าไม่มีใน cache)
+
+    Args:
+        key: ผลจาก upload_key
+        passed_only: ใช้เฉพาะผลที่ผ่านการตรวจสอบ (ผลที่เก็บแค่ error นับเป็น miss)
+    """
+    if key is None:
+        return None
+    analysis = _cache.get(key)
+    if analysis is None or (passed_only and not analysis.passed):
+        _misses.inc()
+        return None
+    _hits.inc()
+    return analysis
+
+
+def put_upload_analysis(key: Optional[str], analysis: UploadAnalysis):
+    if key is None:
+        return
+    _cache.put(key, analysis)
+
+
+def _cache_requests(result: str) -> float:
+    return REGISTRY.get_sample_value("face_upload_cache_requests_total", {"result": result}) or 0.0
+
+
+def get_upload_cache_stats() -> Optional[Dict]:
+    """สถิติของ upload cache (None ถ้าปิดใช้งาน)"""
+    if not upload_cache_enabled():
+        return None
+    return {
+        "size": len(_cache),
+        "maxsize": UPLOAD_CACHE_SIZE,
+        "ttl": UPLOAD_CACHE_TTL,
+        "hits": int(_cache_requests("hit")),
+        "misses": int(_cache_requests("miss")),
+    }
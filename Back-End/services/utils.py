@@ -3,9 +3,24 @@ Utility Functions
 ฟังก์ชันช่วยเหลือทั่วไป
 """
 
+import struct
 import cv2
 import numpy as np
 from fastapi import UploadFile
+from typing import List, Optional, Tuple
+from config.settings import IMAGE_WORKING_SIZE
+from .executor import run_in_stage
+
+
+# (factor, flag) เรียงจากย่อมากไปน้อย
+_REDUCED_FLAGS = [
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+]
+
+# SOF markers ของ JPEG (ยกเว้น DHT=C4, JPG=C8, DAC=CC)
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
 
 
 async def read_image_from_upload(file: UploadFile) -> np.ndarray:
@@ -17,13 +32,144 @@ async def read_image_from_upload(file: UploadFile) -> np.ndarray:
     # อ่านไฟล์เป็น bytes
     image_bytes = await file.read()
 
-    # bytes -> numpy array
-    np_arr = np.frombuffer(image_bytes, np.uint8)
+    # decode ใน executor (ไม่ block event loop)
+    return await run_in_stage("decode", decode_image, image_bytes)
+
+
+async def read_working_image(file: UploadFile) -> Tuple[np.ndarray, float]:
+    """
+    อ่านรูปจาก UploadFile แล้วย่อให้ไม่เกิน IMAGE_WORKING_SIZE ระหว่าง decode
+
+    Returns:
+        tuple: (image, scale) - scale = ขนาดรูปที่ได้ / ขนาดรูปต้นฉบับ (ใช้แปลง bbox กลับ)
+    """
+    image_bytes = await file.read()
+    return await run_in_stage("decode", decode_image_scaled, image_bytes, IMAGE_WORKING_SIZE)
 
-    # decode เป็น image
-    img = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
 
+def _imdecode(image_bytes: bytes, flag: int) -> np.ndarray:
+    """cv2.imdecode ที่ raise ValueError เสมอเมื่อไฟล์เสีย (ไฟล์ว่างทำให้ OpenCV raise cv2.error)"""
+    if not image_bytes:
+        raise ValueError("Invalid image file")
+    try:
+        img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), flag)
+    except cv2.error as e:
+        raise ValueError("Invalid image file") from e
     if img is None:
         raise ValueError("Invalid image file")
-
     return img
+
+
+def decode_image(image_bytes: bytes) -> np.ndarray:
+    """
+    Decode bytes ของไฟล์รูป (jpg, png) เป็น OpenCV image (BGR)
+    raise ValueError ถ้าไฟล์ไม่ใช่รูปหรือเสีย
+    """
+    return _imdecode(image_bytes, cv2.IMREAD_COLOR)
+
+
+def get_image_size(image_bytes: bytes) -> Optional[Tuple[int, int]]:
+    """
+    อ่านขนาดรูปจาก header ของ JPEG / PNG โดยไม่ต้อง decode
+
+    Returns:
+        tuple: (width, height) หรือ None ถ้าไม่รู้จัก format หรือ header ไม่ครบ
+               (ให้ผู้เรียก decode เต็มแทน - ไฟล์เสียจะได้ ValueError จากตอน decode)
+    """
+    size = len(image_bytes)
+
+    # PNG: signature 8 bytes แล้วตามด้วย IHDR chunk (width, height เป็น big-endian)
+    if image_bytes[:8] == b"\x89PNG\r\n\x1a\n" and image_bytes[12:16] == b"IHDR":
+        if size < 24:
+            return None
+        width, height = struct.unpack(">II", image_bytes[16:24])
+        return (width, height) if width and height else None
+
+    # JPEG: ไล่ markers จนเจอ SOF (Start Of Frame)
+    if image_bytes[:2] != b"\xff\xd8":
+        return None
+    pos = 2
+    while pos + 4 <= size:
+        if image_bytes[pos] != 0xFF:
+            return None
+        marker = image_bytes[pos + 1]
+        if marker == 0xFF:
+            # fill byte
+            pos += 1
+            continue
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+            # marker ที่ไม่มี length
+            pos += 2
+            continue
+        length = struct.unpack(">H", image_bytes[pos + 2:pos + 4])[0]
+        if marker in _JPEG_SOF_MARKERS:
+            if pos + 9 > size:
+                return None
+            height, width = struct.unpack(">HH", image_bytes[pos + 5:pos + 9])
+            return (width, height) if width and height else None
+        pos += 2 + length
+    return None
+
+
+def decode_image_scaled(image_bytes: bytes, max_size: int = IMAGE_WORKING_SIZE) -> Tuple[np.ndarray, float]:
+    """
+    Decode รูปแล้วย่อให้ด้านยาวไม่เกิน max_size
+    - JPEG: อ่านขนาดจาก header แล้วใช้ IMREAD_REDUCED_* ให้ libjpeg decode ที่ 1/2, 1/4, 1/8 เลย
+      (เร็วกว่าและใช้ memory น้อยกว่า decode เต็มแล้วค่อย resize)
+    - ส่วนที่ยังเกิน max_size ค่อย resize
+    - scale คิดจากด้านยาว จึงไม่ขึ้นกับ EXIF orientation ที่ imdecode หมุนให้
+
+    Args:
+        image_bytes: bytes ของไฟล์รูป
+        max_size: ด้านยาวสูงสุด (0 = ไม่ย่อ)
+
+    Returns:
+        tuple: (image, scale) - scale = ขนาดรูปที่ได้ / ขนาดรูปต้นฉบับ
+    """
+    if max_size <= 0:
+        return decode_image(image_bytes), 1.0
+
+    flag = cv2.IMREAD_COLOR
+    original_long_side = None
+    dims = get_image_size(image_bytes)
+    if dims is not None:
+        original_long_side = max(dims)
+    if dims is not None and image_bytes[:2] == b"\xff\xd8":
+        # reduced decode เร็วจริงเฉพาะ JPEG (DCT scaling) - format อื่น OpenCV decode เต็มแล้ว resize เอง
+        for factor, reduced_flag in _REDUCED_FLAGS:
+            if original_long_side // factor >= max_size:
+                flag = reduced_flag
+                break
+
+    img = _imdecode(image_bytes, flag)
+
+    h, w = img.shape[:2]
+    if original_long_side is None:
+        original_long_side = max(h, w)
+    scale = max(h, w) / original_long_side
+
+    ratio = max_size / max(h, w)
+    if ratio <= 0.5:
+        # ย่อเป็นจำนวนเท่าเต็มก่อน (INTER_AREA มี fast path เมื่อสัดส่วนเป็นจำนวนเต็ม)
+        # ตัดขอบขวา/ล่างไม่เกิน k-1 pixel ให้หารลงตัว - พิกัดจากมุมซ้ายบนไม่เปลี่ยน
+        k = int(1 / ratio)
+        img = img[:h - h % k, :w - w % k]
+        img = cv2.resize(img, ((w - w % k) // k, (h - h % k) // k), interpolation=cv2.INTER_AREA)
+        scale /= k
+        h, w = img.shape[:2]
+        ratio = max_size / max(h, w)
+
+    if ratio < 1.0:
+        # เหลือย่อไม่ถึงครึ่ง ใช้ INTER_LINEAR ได้ (เร็วกว่า INTER_AREA ที่สัดส่วนไม่ลงตัวหลายเท่า)
+        new_w, new_h = max(1, round(w * ratio)), max(1, round(h * ratio))
+        img = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        scale *= max(new_w, new_h) / max(h, w)
+
+    return img, scale
+
+
+def bbox_to_original(bbox: Optional[List[int]], scale: float) -> Optional[List[int]]:
+    """แปลง bbox [x1, y1, x2, y2] จากพิกัดของรูปที่ย่อแล้วกลับเป็นพิกัดของรูปต้นฉบับ"""
+    if bbox is None or scale == 1.0:
+        return bbox
+    return [int(round(v / scale)) for v in bbox]
@@ -0,0 +1,63 @@
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+
+import pytest
+
+import core.database as database
+
+
+def test_time_period_sql_matches_get_time_period():
+    # CASE ฝั่ง MySQL ต้องให้ช่วงเวลาเดียวกับ get_time_period (ประเมินด้วย sqlite แทน HOUR(NOW()))
+    conn = sqlite3.connect(":memory:")
+    for hour in range(24):
+        sql = database._TIME_PERIOD_SQL.replace("HOUR(NOW())", str(hour))
+        assert conn.execute(f"SELECT {sql}").fetchone()[0] == database.get_time_period(hour)[0]
+
+
+def test_record_attendance_uses_database_clock(monkeypatch):
+    executed = []
+
+    class Cursor:
+        rowcount = 1
+        lastrowid = 7
+
+        def execute(self, sql, params):
+            executed.append((sql, params))
+
+        def fetchone(self):
+            return datetime(2024, 1, 1, 12, 30), "noon"
+
+        def close(self):
+            pass
+
+    class Connection:
+        def cursor(self):
+            return Cursor()
+
+        def commit(self):
+            pass
+
+    @contextmanager
+    def fake_connection():
+        yield Connection()
+
+    monkeypatch.setattr(database, "ATTENDANCE_WRITE_BEHIND", False)
+    monkeypatch.setattr(database, "db_connection", fake_connection)
+
+    record = database.record_attendance("john", "check_in", 0.9)
+    insert_sql, insert_params = executed[0]
+    assert "NOW()" in insert_sql
+    assert not any(isinstance(p, datetime) for p in insert_params)
+    assert executed[1][1] == (7,)
+    assert record["timestamp"] == datetime(2024, 1, 1, 12, 30)
+    assert (record["time_period"], record["time_period_thai"]) == ("noon", "กลางวัน")
+
+
+def test_write_behind_requires_app_timezone(monkeypatch):
+    monkeypatch.setattr(database, "ATTENDANCE_WRITE_BEHIND", True)
+    monkeypatch.setattr(database, "APP_TIMEZONE", "")
+    with pytest.raises(ValueError):
+        database.start_attendance_writer()
+    with pytest.raises(ValueError):
+        database.record_attendance("john", "check_in", 0.9)
@@ -0,0 +1,79 @@
+from contextlib import contextmanager
+
+import numpy as np
+
+import core.database as database
+from core.cache import LRUCache
+
+
+def test_put_skipped_when_invalidated_after_read():
+    cache = LRUCache(maxsize=10)
+    generation = cache.generation()
+    cache.invalidate("john")
+    cache.put("john", "old", generation=generation)
+    assert cache.get("john") is None
+
+    cache.put("john", "new", generation=cache.generation())
+    assert cache.get("john") == "new"
+
+
+def test_invalidation_of_other_keys_does_not_block_put():
+    cache = LRUCache(maxsize=10)
+    generation = cache.generation()
+    cache.invalidate("jane")
+    cache.put("john", "value", generation=generation)
+    assert cache.get("john") == "value"
+
+
+def test_forgotten_invalidations_are_treated_as_stale():
+    cache = LRUCache(maxsize=2)
+    generation = cache.generation()
+    for key in ("john", "a", "b", "c"):
+        cache.invalidate(key)
+    # ประวัติของ john ถูกลบแล้ว แต่ค่าที่อ่านก่อนยังต้องไม่ถูกเก็บ
+    cache.put("john", "old", generation=generation)
+    assert cache.get("john") is None
+
+
+def test_get_user_centroid_does_not_cache_row_read_before_save(monkeypatch):
+    monkeypatch.setattr(database, "_centroid_cache", LRUCache(maxsize=10))
+    old_centroid = np.ones(4, dtype=np.float32)
+
+    class Cursor:
+        def execute(self, sql, params):
+            pass
+
+        def fetchone(self):
+            # save_user commit + invalidate ระหว่างที่ reader ได้แถวเก่าไปแล้ว
+            database._centroid_cache.invalidate("john")
+            return (old_centroid.tobytes(),)
+
+        def close(self):
+            pass
+
+    class Connection:
+        def cursor(self):
+            return Cursor()
+
+    @contextmanager
+    def fake_connection():
+        yield Connection()
+
+    monkeypatch.setattr(database, "db_connection", fake_connection)
+
+    np.testing.assert_array_equal(database.get_user_centroid("john"), old_centroid)
+    assert database._centroid_cache.get("john") is None
+
+
+def test_zero_embedding_sum_writes_finite_centroid():
+    executed = []
+
+    class Cursor:
+        def execute(self, sql, params):
+            executed.append(params)
+
+    database._write_centroid(Cursor(), 1, np.zeros(4, dtype=np.float32), 2)
+
+    centroid = np.frombuffer(executed[0][1], dtype=np.float32)
+    assert np.all(np.isfinite(centroid))
+    assert not centroid.any()
@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+from core.db_pool import ConnectionPool
+
+
+class FakeConnection:
+    def __init__(self):
+        self.in_transaction = False
+        self.rolled_back = 0
+        self.closed = False
+
+    def is_connected(self):
+        return not self.closed
+
+    def rollback(self):
+        self.rolled_back += 1
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.mark.parametrize("exc", [asyncio.CancelledError, KeyboardInterrupt, GeneratorExit, RuntimeError])
+def test_connection_released_on_any_exception(exc):
+    pool = ConnectionPool(FakeConnection, size=1, max_overflow=0, timeout=0.1)
+
+    with pytest.raises(exc):
+        with pool.connection() as conn:
+            raise exc()
+
+    stats = pool.stats()
+    assert stats["in_use"] == 0
+    assert stats["idle"] == 1
+    assert conn.rolled_back == 1
+
+    # slot ถูกคืนแล้ว - ยืมต่อได้โดยไม่ timeout
+    with pool.connection() as again:
+        assert again is conn
+
+
+def test_connection_discarded_when_rollback_fails():
+    class BrokenConnection(FakeConnection):
+        def rollback(self):
+            raise OSError("connection lost")
+
+    pool = ConnectionPool(BrokenConnection, size=1, max_overflow=0, timeout=0.1)
+    with pytest.raises(asyncio.CancelledError):
+        with pool.connection() as conn:
+            raise asyncio.CancelledError()
+
+    stats = pool.stats()
+    assert stats["in_use"] == 0 and stats["open"] == 0
+    assert conn.closed
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from core.embedding_codec import ENCODINGS, decode_embedding, encode_embedding, measure_score_error
+
+
+def _embeddings(n=32, dim=512, seed=0):
+    x = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize("encoding, size", [("float32", 2048), ("float16", 1024), ("int8", 516)])
+def test_bytes_per_embedding(encoding, size):
+    assert len(encode_embedding(_embeddings(1)[0], encoding)) == size
+
+
+def test_float32_round_trip_is_exact():
+    e = _embeddings(1)[0]
+    np.testing.assert_array_equal(decode_embedding(encode_embedding(e, "float32"), "float32"), e)
+    # แถวเก่าที่ยังไม่มี column encoding
+    np.testing.assert_array_equal(decode_embedding(e.tobytes(), None), e)
+
+
+def test_float16_error_bound():
+    for e in _embeddings():
+        decoded = decode_embedding(encode_embedding(e, "float16"), "float16")
+        assert decoded.dtype == np.float32
+        # half precision: ความคลาดเคลื่อนสัมพัทธ์ ≤ 2^-11 (ปัดเศษ mantissa 10 bits)
+        assert np.all(np.abs(decoded - e) <= np.abs(e) * 2.0 ** -11 + 1e-7)
+
+
+def test_int8_error_bound():
+    for e in _embeddings():
+        decoded = decode_embedding(encode_embedding(e, "int8"), "int8")
+        scale = np.max(np.abs(e)) / 127.0
+        # ปัดเป็นจำนวนเต็มที่ใกล้ที่สุด: คลาดไม่เกินครึ่ง step
+        assert np.all(np.abs(decoded - e) <= scale / 2 + 1e-7)
+        assert np.argmax(np.abs(decoded)) == np.argmax(np.abs(e))
+
+
+def test_int8_zero_vector():
+    decoded = decode_embedding(encode_embedding(np.zeros(8), "int8"), "int8")
+    np.testing.assert_array_equal(decoded, np.zeros(8, dtype=np.float32))
+
+
+def test_unknown_encoding():
+    with pytest.raises(ValueError):
+        encode_embedding(np.zeros(4), "int4")
+    with pytest.raises(ValueError):
+        decode_embedding(b"\x00" * 4, "int4")
+
+
+def test_measure_score_error_bounds():
+    embeddings = list(_embeddings(64))
+    limits = {"float32": 0.0, "float16": 1e-3, "int8": 2e-2}
+    assert set(limits) == set(ENCODINGS)
+    for encoding, limit in limits.items():
+        result = measure_score_error(embeddings, encoding, threshold=0.0)
+        assert result["pairs"] == 64 * 63
+        assert result["score_abs_diff"]["max"] <= limit
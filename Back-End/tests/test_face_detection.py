@@ -0,0 +1,111 @@
+import numpy as np
+
+from services.face_detection import ScrfdDetector
+
+
+INPUT = 64
+
+
+class FakeInput:
+    name = "input.1"
+
+
+class FakeSession:
+    """คืน raw outputs ที่กำหนดไว้ (ลำดับเดียวกับ det_500m: score x3, bbox x3, kps x3)"""
+
+    def __init__(self, outputs):
+        self.outputs = outputs
+
+    def get_inputs(self):
+        return [FakeInput()]
+
+    def run(self, names, feed):
+        return self.outputs
+
+
+def _detector(outputs=None, nms_threshold=0.4):
+    detector = ScrfdDetector.__new__(ScrfdDetector)
+    detector.session = FakeSession(outputs)
+    detector.input_name = "input.1"
+    detector.input_size = (INPUT, INPUT)
+    detector.nms_threshold = nms_threshold
+    detector._anchor_cache = {}
+    return detector
+
+
+def _anchor(stride, row, col, anchor=0, num_anchors=2):
+    return (row * (INPUT // stride) + col) * num_anchors + anchor
+
+
+def _synthetic_outputs():
+    """
+    กล่องที่รู้ค่า (พิกัดของ input 64x64):
+    - A: stride 8, anchor center (32, 24), score 0.9 → (16, 16, 48, 48)
+    - B: stride 8, anchor center (32, 24) anchor ที่ 2, score 0.8 → (16, 16, 48, 40) ซ้อน A (ต้องถูกตัดด้วย NMS)
+    - C: stride 16, anchor center (0, 0), score 0.7 → (0, 0, 8, 8)
+    - D: stride 32, score 0.3 (ต่ำกว่า threshold)
+    """
+    scores, bboxes, kps = [], [], []
+    for stride in ScrfdDetector.STRIDES:
+        n = (INPUT // stride) ** 2 * 2
+        scores.append(np.zeros((n, 1), dtype=np.float32))
+        bboxes.append(np.zeros((n, 4), dtype=np.float32))
+        kps.append(np.zeros((n, 10), dtype=np.float32))
+
+    a = _anchor(8, 3, 4)
+    scores[0][a] = 0.9
+    bboxes[0][a] = [2, 1, 2, 3]
+    kps[0][a] = np.arange(10, dtype=np.float32) / 8
+
+    b = _anchor(8, 3, 4, anchor=1)
+    scores[0][b] = 0.8
+    bboxes[0][b] = [2, 1, 2, 2]
+
+    c = _anchor(16, 0, 0)
+    scores[1][c] = 0.7
+    bboxes[1][c] = [0, 0, 0.5, 0.5]
+
+    scores[2][_anchor(32, 1, 1)] = 0.3
+    bboxes[2][_anchor(32, 1, 1)] = [1, 1, 1, 1]
+    return scores + bboxes + kps
+
+
+def test_anchor_centers_are_row_major_and_repeated_per_anchor():
+    centers = _detector()._anchor_centers(2, 3, 8, 2)
+    expected = [(0, 0), (8, 0), (16, 0), (0, 8), (8, 8), (16, 8)]
+    assert centers.tolist() == [list(c) for c in expected for _ in range(2)]
+
+
+def test_nms_keeps_highest_score_of_overlapping_boxes():
+    boxes = np.array([[0, 0, 10, 10], [1, 1, 10, 10], [20, 20, 30, 30], [0, 0, 10, 5]], dtype=np.float32)
+    scores = np.array([0.6, 0.9, 0.5, 0.8], dtype=np.float32)
+    keep = ScrfdDetector._nms(boxes, scores, 0.4)
+    # กล่อง 0 ทับกล่อง 1 (IoU 0.81) ถูกตัด, กล่อง 3 ทับกล่อง 1 แค่ 0.38 จึงเก็บไว้
+    assert keep.tolist() == [1, 3, 2]
+
+
+def test_decode_recovers_known_boxes():
+    scores, boxes, kps = _detector()._decode(_synthetic_outputs(), 0.5, (INPUT, INPUT))
+
+    np.testing.assert_allclose(scores, [0.9, 0.7])
+    np.testing.assert_allclose(boxes, [[16, 16, 48, 48], [0, 0, 8, 8]])
+    # landmarks = anchor center + offset * stride
+    np.testing.assert_allclose(kps[0], np.tile([32, 24], 5) + np.arange(10))
+
+
+def test_decode_without_detections_returns_empty_arrays():
+    outputs = _synthetic_outputs()
+    scores, boxes, kps = _detector()._decode(outputs, 0.95, (INPUT, INPUT))
+    assert scores.shape == (0,) and boxes.shape == (0, 4) and kps.shape == (0, 10)
+
+
+def test_detect_maps_boxes_back_to_original_image():
+    # 128x64 → letterbox 64x32 (scale 0.5) วางกลาง input ที่ pad_y = 16
+    # กล่อง C อยู่ใน padding ทั้งกล่อง (กว้าง/สูงเป็น 0 หลัง clamp) จึงถูกทิ้ง
+    image = np.zeros((64, 128, 3), dtype=np.uint8)
+    faces = _detector(_synthetic_outputs()).detect(image, conf_threshold=0.5)
+
+    assert [f["bbox"] for f in faces] == [[32, 0, 96, 64]]
+    assert abs(faces[0]["confidence"] - 0.9) < 1e-6
+    # landmark แรก (32, 25) ใน input → ((32 - 0) / 0.5, (25 - 16) / 0.5)
+    assert faces[0]["landmarks"][0] == [64.0, 18.0]
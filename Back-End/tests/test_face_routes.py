@@ -0,0 +1,56 @@
+import numpy as np
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from config.settings import BULK_MAX_FILES
+from routers.face import router
+
+app = FastAPI()
+app.include_router(router)
+client = TestClient(app)
+
+
+def test_register_bulk_rejects_too_many_files():
+    files = [("files", (f"{i}.jpg", b"x", "image/jpeg")) for i in range(BULK_MAX_FILES + 1)]
+    response = client.post("/face/register/bulk", data={"usernames": ["john"]}, files=files)
+    assert response.status_code == 400
+    assert response.json()["detail"]["error"] == "too_many_files"
+
+
+TRUNCATED_PNG = b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00"
+TRUNCATED_JPEG = b"\xff\xd8\xff\xc0\x00\x11\x08"
+
+
+def test_check_quality_rejects_truncated_image():
+    for data in (TRUNCATED_PNG, TRUNCATED_JPEG):
+        response = client.post("/face/check-quality", files={"file": ("face.png", data, "image/png")})
+        assert response.status_code == 400
+        assert response.json()["detail"]["error"] == "invalid_image"
+
+
+def test_recognize_burst_rejects_truncated_frames():
+    files = [("files", ("a.png", TRUNCATED_PNG, "image/png")), ("files", ("b.jpg", TRUNCATED_JPEG, "image/jpeg"))]
+    response = client.post("/face/recognize/burst", files=files)
+    assert response.status_code == 400
+    detail = response.json()["detail"]
+    assert detail["error"] == "invalid_image"
+    assert [frame["error"] for frame in detail["frames"]] == ["invalid_image", "invalid_image"]
+
+
+def test_recognize_with_username_verifies_before_returning_duplicate(monkeypatch):
+    import routers.face as face
+
+    existing = {"username": "alice", "action": "check_in", "score": 0.9, "timestamp": "2024-01-01 08:00:00",
+                "time_period": "morning", "time_period_thai": "เช้า"}
+    monkeypatch.setattr(face, "dedup_enabled", lambda: True)
+    monkeypatch.setattr(face, "find_recent_attendance", lambda username, action: existing)
+    monkeypatch.setattr(face, "get_user_embedding", lambda username: np.ones(512, dtype=np.float32) / np.sqrt(512))
+
+    # username ของคนอื่น + ไฟล์ที่ไม่ใช่รูปหน้า: ต้องไม่ได้ record ของ alice คืน
+    response = client.post("/face/recognize", data={"username": "alice"},
+                           files={"file": ("face.png", TRUNCATED_PNG, "image/png")})
+    assert response.status_code == 400
+    response = client.post("/face/recognize/burst", data={"username": "alice"},
+                           files=[("files", ("a.png", TRUNCATED_PNG, "image/png"))])
+    assert response.status_code == 400
+    assert response.json()["detail"]["error"] == "invalid_image"
@@ -0,0 +1,60 @@
+import cv2
+import numpy as np
+
+from services import face_tracking
+from services.face_tracking import FaceTrack, TrackedIdentity, track_face
+from services.image_quality import check_image_quality, face_sharpness
+
+
+def _full_detection(monkeypatch, bbox):
+    def detect(image, confidence, margin):
+        return image[bbox[1]:bbox[3], bbox[0]:bbox[2]], {
+            "found": True, "face_count": 1, "message": "", "bbox": list(bbox), "confidence": 0.9,
+        }
+    monkeypatch.setattr(face_tracking, "detect_and_crop_face", detect)
+
+
+def test_next_person_at_same_spot_is_re_embedded(monkeypatch):
+    image = np.zeros((200, 200, 3), dtype=np.uint8)
+    track = FaceTrack()
+    identity = TrackedIdentity(gain=1.25)
+
+    _full_detection(monkeypatch, (50, 50, 150, 150))
+    _, result, track = track_face(image, track)
+    assert identity.needs_embedding(result["track_id"], 100.0, result["mode"])
+    identity.update(result["track_id"], 100.0, "alice", 0.8)
+
+    # re-detect ทั้งเฟรม: คนถัดไปยืนเกือบตำแหน่งเดิม (IoU ≥ FACE_TRACK_MIN_IOU) ได้ track_id เดิม
+    track.frames_since_detect = face_tracking.FACE_TRACK_REDETECT_INTERVAL
+    _full_detection(monkeypatch, (55, 55, 155, 155))
+    _, result, track = track_face(image, track)
+    assert result["mode"] == "full"
+    assert result["track_id"] == identity.track_id
+    assert identity.needs_embedding(result["track_id"], 50.0, result["mode"])
+
+
+def test_identity_reuse_only_for_matched_roi_frames():
+    identity = TrackedIdentity(gain=1.25)
+    identity.update(1, 100.0, "alice", 0.8)
+    assert not identity.needs_embedding(1, 110.0, "roi")
+    assert identity.needs_embedding(1, 125.0, "roi")
+    assert identity.needs_embedding(2, 10.0, "roi")
+
+    # ยังไม่รู้ว่าเป็นใคร: embed ใหม่ทุกเฟรม ไม่ต้องรอให้คมชัดขึ้น
+    identity.update(1, 100.0, None, 0.2)
+    assert identity.needs_embedding(1, 90.0, "roi")
+
+
+def test_face_sharpness_ignores_background():
+    rng = np.random.default_rng(0)
+    image = np.full((200, 200, 3), 128, dtype=np.uint8)
+    bbox = [60, 60, 140, 140]
+    image[60:140, 60:140] = rng.integers(0, 255, (80, 80, 3), dtype=np.uint8)
+    noisy_background = image.copy()
+    noisy_background[:40] = rng.integers(0, 255, (40, 200, 3), dtype=np.uint8)
+    blurred_face = image.copy()
+    blurred_face[60:140, 60:140] = cv2.GaussianBlur(image[60:140, 60:140], (9, 9), 3)
+
+    assert face_sharpness(noisy_background, bbox) == face_sharpness(image, bbox)
+    assert face_sharpness(blurred_face, bbox) < face_sharpness(image, bbox)
+    assert face_sharpness(image, bbox) == check_image_quality(image, bbox)["checks"]["blur"]["value"]
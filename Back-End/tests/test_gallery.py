@@ -0,0 +1,144 @@
+import threading
+
+import numpy as np
+
+from core.ann_index import IVFIndex
+from core.gallery import EmbeddingGallery
+
+
+DIM = 64
+
+
+def _normalize(x):
+    return x / np.linalg.norm(x, axis=-1, keepdims=True)
+
+
+def _clustered_users(n_users=2000, n_clusters=40, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = _normalize(rng.standard_normal((n_clusters, DIM)))
+    owners = rng.integers(0, n_clusters, n_users)
+    vectors = _normalize(centers[owners] + 0.35 * rng.standard_normal((n_users, DIM))).astype(np.float32)
+    return [(f"user{i}", v) for i, v in enumerate(vectors)], vectors
+
+
+def _queries(vectors, n=300, noise=0.25, seed=1):
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(vectors), n, replace=False)
+    return rows, _normalize(vectors[rows] + noise * rng.standard_normal((n, DIM)) / np.sqrt(DIM)).astype(np.float32)
+
+
+class _FixedCandidates:
+    """index ที่คืน candidate rows ตายตัว (จำลอง IVF ที่ค้นไม่เจอ user ที่ดีที่สุด)"""
+
+    trained_size = 0
+
+    def __init__(self, rows):
+        self.rows = np.asarray(rows, dtype=np.int64)
+
+    def build(self, vectors):
+        self.trained_size = len(vectors)
+
+    def add(self, row, vector):
+        pass
+
+    def candidates(self, query):
+        return self.rows
+
+
+def test_ivf_recall_close_to_exact():
+    users, vectors = _clustered_users()
+    exact = EmbeddingGallery(dim=DIM)
+    exact.load(users)
+    ivf = EmbeddingGallery(dim=DIM, index_factory=lambda: IVFIndex(nprobe=8), exact_fallback=False)
+    ivf.load(users)
+    assert ivf._ann is not None
+
+    _, queries = _queries(vectors)
+    hits = sum(ivf.search(q)[0] == exact.search(q)[0] for q in queries)
+    assert hits / len(queries) >= 0.95
+
+
+def test_ivf_with_fallback_matches_exact_decision():
+    users, vectors = _clustered_users()
+    exact = EmbeddingGallery(dim=DIM)
+    exact.load(users)
+    ivf = EmbeddingGallery(dim=DIM, index_factory=lambda: IVFIndex(nprobe=2), fallback_margin=0.1)
+    ivf.load(users)
+
+    threshold = 0.8
+    _, queries = _queries(vectors, noise=2.0)
+    for q in queries:
+        exact_user, exact_score = exact.search(q)
+        user, score = ivf.search(q, threshold)
+        assert (score >= threshold) == (exact_score >= threshold)
+        if exact_score < threshold + 0.1:
+            assert user == exact_user
+
+
+def test_fallback_margin_rescans_near_threshold():
+    # user0 (อยู่ใน candidates) score 0.65, user1 (ไม่อยู่ใน candidates) score 0.9
+    query = np.zeros(DIM, dtype=np.float32)
+    query[0] = 1.0
+    near = np.zeros(DIM, dtype=np.float32)
+    near[0], near[1] = 0.65, np.sqrt(1 - 0.65 ** 2)
+    best = np.zeros(DIM, dtype=np.float32)
+    best[0], best[2] = 0.9, np.sqrt(1 - 0.9 ** 2)
+    users = [("user0", near), ("user1", best)]
+
+    without_margin = EmbeddingGallery(dim=DIM, index_factory=lambda: _FixedCandidates([0]))
+    without_margin.load(users)
+    assert without_margin.search(query, threshold=0.6)[0] == "user0"
+
+    with_margin = EmbeddingGallery(dim=DIM, index_factory=lambda: _FixedCandidates([0]), fallback_margin=0.1)
+    with_margin.load(users)
+    user, score = with_margin.search(query, threshold=0.6)
+    assert user == "user1"
+    assert abs(score - 0.9) < 1e-5
+
+
+def test_search_without_threshold_rescans_partial_probe():
+    users, vectors = _clustered_users()
+    exact = EmbeddingGallery(dim=DIM)
+    exact.load(users)
+    ivf = EmbeddingGallery(dim=DIM, index_factory=lambda: IVFIndex(nprobe=1))
+    ivf.load(users)
+
+    _, queries = _queries(vectors, noise=2.0)
+    for q in queries:
+        assert ivf.search(q) == exact.search(q)
+
+
+def test_stale_rebuild_is_dropped_after_load():
+    started = threading.Event()
+    release = threading.Event()
+    built = []
+
+    class SlowIndex(_FixedCandidates):
+        def build(self, vectors):
+            built.append(self)
+            if len(built) == 1:
+                started.set()
+                release.wait(5)
+            super().build(vectors)
+
+    gallery = EmbeddingGallery(dim=DIM, index_factory=lambda: SlowIndex([0]))
+    old_users, _ = _clustered_users(n_users=10, seed=2)
+    with gallery._lock:
+        for username, emb in old_users:
+            gallery._add_locked(username, emb)
+        gallery._loaded = True
+
+    stale = threading.Thread(target=gallery.rebuild_index)
+    stale.start()
+    assert started.wait(5)
+
+    new_users, _ = _clustered_users(n_users=3, seed=3)
+    gallery.load(new_users)
+    fresh = gallery._ann
+    assert fresh is built[1]
+
+    release.set()
+    stale.join(5)
+    assert gallery._ann is fresh
+    assert gallery._ann.trained_size == 3
+    assert not gallery._rebuilding
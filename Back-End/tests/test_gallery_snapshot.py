@@ -0,0 +1,110 @@
+import os
+
+import numpy as np
+import pytest
+
+from core.ann_index import IVFIndex
+from core.gallery import EmbeddingGallery
+from core.gallery_snapshot import SharedGallery, delta_path
+
+
+DIM = 32
+
+
+def _normalize(x):
+    return x / np.linalg.norm(x, axis=-1, keepdims=True)
+
+
+def _users(n, seed=0):
+    vectors = _normalize(np.random.default_rng(seed).standard_normal((n, DIM))).astype(np.float32)
+    return [(f"user{i}", v) for i, v in enumerate(vectors)]
+
+
+def _worker(path, **kwargs):
+    return SharedGallery(str(path), dim=DIM, check_interval=0, publish_delay=0, **kwargs)
+
+
+def _publish(gallery, updates):
+    gallery._publish({u: _normalize(np.asarray(v, dtype=np.float32)) for u, v in updates.items()})
+
+
+def test_registration_appends_delta_without_rewriting_snapshot(tmp_path):
+    path = tmp_path / "gallery.snap"
+    users = _users(200)
+    a, b = _worker(path), _worker(path)
+    a.open(lambda: users)
+    b.open(lambda: [])  # snapshot ยังใหม่ - map ไฟล์เดิม ไม่โหลดจาก loader
+    snapshot_id = os.stat(path).st_ino, os.stat(path).st_mtime_ns
+
+    rng = np.random.default_rng(1)
+    changed = _normalize(rng.standard_normal(DIM)).astype(np.float32)
+    added = _normalize(rng.standard_normal(DIM)).astype(np.float32)
+    _publish(a, {"user5": changed})
+    _publish(a, {"new_user": added})
+
+    assert (os.stat(path).st_ino, os.stat(path).st_mtime_ns) == snapshot_id
+    for worker in (a, b):
+        assert worker.search(changed) == ("user5", pytest.approx(1.0, abs=1e-5))
+        assert worker.search(added)[0] == "new_user"
+        assert len(worker) == 201
+        # centroid เดิมของ user5 ใน snapshot ถูกแทนที่แล้ว
+        assert worker.search(users[5][1])[1] < 0.99
+    assert sorted(b.usernames()) == sorted([u for u, _ in users] + ["new_user"])
+
+
+def test_delta_is_compacted_into_new_snapshot(tmp_path):
+    path = tmp_path / "gallery.snap"
+    users = _users(50)
+    a, b = _worker(path, compact_rows=3), _worker(path, compact_rows=3)
+    a.open(lambda: users)
+    b.open(lambda: [])
+    generation = a.generation
+
+    extra = _users(3, seed=2)
+    for i, (_, v) in enumerate(extra):
+        _publish(a, {f"extra{i}": v})
+
+    assert a.generation == generation + 1
+    assert os.path.getsize(delta_path(str(path))) == 32  # delta ว่างของ snapshot รุ่นใหม่
+    for worker in (a, b):
+        for i, (_, v) in enumerate(extra):
+            assert worker.search(v)[0] == f"extra{i}"
+        assert len(worker) == 53
+    assert b.generation == generation + 1
+
+
+def test_shared_ivf_matches_in_memory_gallery(tmp_path):
+    users = _users(1500, seed=3)
+    shared = _worker(tmp_path / "gallery.snap", index_factory=lambda: IVFIndex(nprobe=2), fallback_margin=0.1)
+    shared.open(lambda: users)
+    shared.rebuild_index()
+    assert shared._view.ann is not None
+    exact = EmbeddingGallery(dim=DIM)
+    exact.load(users)
+
+    rng = np.random.default_rng(4)
+    threshold = 0.5
+    for row in rng.choice(len(users), 100, replace=False):
+        q = _normalize(users[row][1] + 0.5 * rng.standard_normal(DIM) / np.sqrt(DIM)).astype(np.float32)
+        exact_user, exact_score = exact.search(q)
+        user, score = shared.search(q, threshold)
+        assert (score >= threshold) == (exact_score >= threshold)
+        if exact_score < threshold + 0.1:
+            assert user == exact_user
+
+
+
+def test_shared_search_without_threshold_rescans_partial_probe(tmp_path):
+    users = _users(1500, seed=5)
+    shared = _worker(tmp_path / "gallery.snap", index_factory=lambda: IVFIndex(nprobe=1))
+    shared.open(lambda: users)
+    shared.rebuild_index()
+    exact = EmbeddingGallery(dim=DIM)
+    exact.load(users)
+
+    queries = _normalize(np.random.default_rng(6).standard_normal((100, DIM))).astype(np.float32)
+    for q in queries:
+        user, score = shared.search(q)
+        exact_user, exact_score = exact.search(q)
+        assert user == exact_user
+        assert score == pytest.approx(exact_score, abs=1e-6)
@@ -0,0 +1,14 @@
+import cv2
+import numpy as np
+
+from services.image_quality import check_blur, check_brightness, check_contrast, check_image_quality
+
+
+def test_single_pass_matches_per_check_functions():
+    # QUALITY_ANALYSIS_SIZE=0 (default): วัดที่ขนาดเต็ม ค่าต้องเท่ากับ check_* เดิม (threshold เดิมยังใช้ได้)
+    rng = np.random.default_rng(0)
+    image = cv2.GaussianBlur(rng.integers(0, 255, (900, 1200, 3), dtype=np.uint8), (5, 5), 1)
+    checks = check_image_quality(image)["checks"]
+    assert np.isclose(checks["brightness"]["value"], check_brightness(image)[1])
+    assert np.isclose(checks["blur"]["value"], check_blur(image)[1])
+    assert np.isclose(checks["contrast"]["value"], check_contrast(image)[1])
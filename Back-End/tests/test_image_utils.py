@@ -0,0 +1,46 @@
+import struct
+
+import cv2
+import numpy as np
+import pytest
+
+from services.utils import decode_image, decode_image_scaled, get_image_size
+
+
+def _encode(ext):
+    img = np.full((40, 60, 3), 128, dtype=np.uint8)
+    ok, buf = cv2.imencode(ext, img)
+    assert ok
+    return buf.tobytes()
+
+
+def test_get_image_size_reads_headers():
+    assert get_image_size(_encode(".png")) == (60, 40)
+    assert get_image_size(_encode(".jpg")) == (60, 40)
+
+
+@pytest.mark.parametrize("cut", [13, 16, 20, 23])
+def test_get_image_size_truncated_png(cut):
+    assert get_image_size(_encode(".png")[:cut]) is None
+
+
+def test_get_image_size_truncated_jpeg():
+    data = _encode(".jpg")
+    sof = next(i for i in range(2, len(data) - 1) if data[i] == 0xFF and data[i + 1] == 0xC0)
+    for cut in range(2, sof + 9):
+        assert get_image_size(data[:cut]) is None
+    # ตัดกลาง length ของ marker แรก (APP0)
+    assert get_image_size(b"\xff\xd8\xff\xe0\x00") is None
+
+
+def test_get_image_size_zero_dimensions():
+    png = b"\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + b"IHDR" + struct.pack(">II", 0, 10)
+    assert get_image_size(png) is None
+
+
+@pytest.mark.parametrize("data", [b"", b"not an image", b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00", b"\xff\xd8\xff\xc0\x00"])
+def test_decode_invalid_raises_value_error(data):
+    with pytest.raises(ValueError):
+        decode_image(data)
+    with pytest.raises(ValueError):
+        decode_image_scaled(data, 32)
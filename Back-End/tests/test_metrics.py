@@ -0,0 +1,35 @@
+import math
+
+from core import database
+from core.metrics import REGISTRY, UPLOAD_CACHE_REQUESTS, render_metrics
+
+
+def test_counter_exported_with_total_suffix():
+    UPLOAD_CACHE_REQUESTS.labels(result="hit").inc()
+
+    text = render_metrics().decode()
+
+    assert "# TYPE face_upload_cache_requests_total counter" in text
+    assert 'face_upload_cache_requests_total{result="hit"}' in text
+    assert "_created" not in text
+
+
+def test_get_user_embedding_not_timed_twice(monkeypatch):
+    monkeypatch.setattr(database, "get_user_centroid", lambda username: None)
+
+    database.get_user_embedding("alice")
+
+    # วัดเวลาเฉพาะที่ get_user_centroid - wrapper ไม่มี label ของตัวเอง
+    assert REGISTRY.get_sample_value(
+        "face_db_query_duration_seconds_count", {"operation": "get_user_embedding"}) is None
+
+
+def test_pool_gauge_does_not_break_scrape(monkeypatch):
+    def get_pool_stats():
+        raise ConnectionError("database down")
+
+    monkeypatch.setattr(database, "get_pool_stats", get_pool_stats)
+
+    render_metrics()
+    value = REGISTRY.get_sample_value("face_db_pool_connections", {"state": "in_use"})
+    assert math.isnan(value)
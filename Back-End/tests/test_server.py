@@ -0,0 +1,31 @@
+import asyncio
+
+import server
+
+
+def test_gallery_load_retried_until_database_is_up(monkeypatch):
+    attempts = {"init_db": 0, "gallery": 0}
+    state = {"loaded": False}
+
+    def init_db():
+        attempts["init_db"] += 1
+        if attempts["init_db"] < 2:
+            raise ConnectionError("database down")
+
+    def get_gallery():
+        attempts["gallery"] += 1
+        if attempts["gallery"] < 2:
+            raise ConnectionError("database down")
+        state["loaded"] = True
+        return []
+
+    monkeypatch.setattr(server, "GALLERY_LOAD_RETRY_MAX_INTERVAL", 0)
+    monkeypatch.setattr(server, "init_db", init_db)
+    monkeypatch.setattr(server, "get_gallery", get_gallery)
+    monkeypatch.setattr(server, "is_gallery_loaded", lambda: state["loaded"])
+
+    asyncio.run(asyncio.wait_for(server._retry_gallery_load(db_initialized=False), timeout=5))
+
+    assert state["loaded"]
+    # init_db สำเร็จแล้วไม่เรียกซ้ำ แม้การโหลด gallery ยังล้มเหลว
+    assert attempts == {"init_db": 2, "gallery": 2}
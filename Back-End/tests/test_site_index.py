@@ -0,0 +1,115 @@
+import math
+
+import numpy as np
+import pytest
+
+from core.site_index import METERS_PER_DEGREE, SiteIndex, haversine_distances
+
+
+def _brute_force(sites, lat, lon):
+    lats = np.array([s["latitude"] for s in sites])
+    lons = np.array([s["longitude"] for s in sites])
+    radii = np.array([s["radius_meters"] for s in sites])
+    distances = haversine_distances(lat, lon, lats, lons)
+    inside = distances <= radii
+    pool = np.flatnonzero(inside) if inside.any() else np.arange(len(sites))
+    best = pool[np.argmin(distances[pool])]
+    return sites[best]["id"], float(distances[best]), bool(inside[best])
+
+
+def _assert_matches(index, sites, lat, lon):
+    result = index.locate(lat, lon)
+    site_id, distance, inside = _brute_force(sites, lat, lon)
+    assert result["inside"] == inside, (lat, lon)
+    assert result["distance"] == pytest.approx(distance), (lat, lon)
+    if inside:
+        assert result["site"]["id"] == site_id, (lat, lon)
+
+
+def _random_sites(rng, n, lat0, lon0, spread):
+    return [
+        {
+            "id": i,
+            "name": f"site-{i}",
+            "latitude": lat0 + rng.uniform(-spread, spread),
+            "longitude": lon0 + rng.uniform(-spread, spread),
+            "radius_meters": int(rng.integers(50, 500)),
+        }
+        for i in range(n)
+    ]
+
+
+@pytest.mark.parametrize("lat0, lon0", [(13.75, 100.5), (-33.9, 151.2), (64.1, -21.9), (0.0, 0.0)])
+def test_locate_matches_brute_force(lat0, lon0):
+    rng = np.random.default_rng(0)
+    sites = _random_sites(rng, 300, lat0, lon0, 0.05)
+    index = SiteIndex(sites)
+    for _ in range(500):
+        _assert_matches(index, sites, lat0 + rng.uniform(-0.06, 0.06), lon0 + rng.uniform(-0.06, 0.06))
+    # ตรงจุดศูนย์กลางและบนขอบรัศมี
+    for site in sites[:50]:
+        _assert_matches(index, sites, site["latitude"], site["longitude"])
+        edge = site["radius_meters"] / METERS_PER_DEGREE
+        _assert_matches(index, sites, site["latitude"] + edge * 0.999, site["longitude"])
+
+
+@pytest.mark.parametrize("cell_meters", [0, 1000])
+def test_locate_on_cell_boundaries(cell_meters):
+    rng = np.random.default_rng(1)
+    sites = _random_sites(rng, 200, 13.75, 100.5, 0.05)
+    index = SiteIndex(sites, cell_meters)
+    cell = index.cell_deg
+    row0, col0 = math.floor((13.75 - 0.05) / cell), math.floor((100.5 - 0.05) / cell)
+    steps = int(0.1 / cell) + 1
+    for r in range(steps + 1):
+        for c in range(steps + 1):
+            lat, lon = (row0 + r) * cell, (col0 + c) * cell
+            for d_lat, d_lon in [(0, 0), (-1e-9, 0), (0, -1e-9), (-1e-9, -1e-9)]:
+                _assert_matches(index, sites, lat + d_lat, lon + d_lon)
+
+
+def test_site_straddling_cell_boundary():
+    index = SiteIndex([{"id": 1, "name": "a", "latitude": 0.0, "longitude": 0.0, "radius_meters": 500}])
+    cell = index.cell_deg
+    # สาขาอยู่ในช่อง (0, 0) แต่พิกัดอยู่ในช่องข้างเคียง (-1, -1) และยังอยู่ในรัศมี
+    result = index.locate(-cell * 0.5, -cell * 0.5)
+    assert result["inside"] and result["site"]["id"] == 1
+
+
+def test_locate_outside_all_sites_reports_nearest():
+    rng = np.random.default_rng(2)
+    sites = _random_sites(rng, 50, 13.75, 100.5, 0.05)
+    index = SiteIndex(sites)
+    result = index.locate(14.5, 101.0)
+    site_id, distance, inside = _brute_force(sites, 14.5, 101.0)
+    assert not result["inside"] and not inside
+    assert result["site"]["id"] == site_id
+    assert result["distance"] == pytest.approx(distance)
+
+
+def test_empty_index():
+    assert SiteIndex([]).locate(13.75, 100.5) is None
+
+
+def test_locate_across_antimeridian():
+    sites = [{"id": 1, "name": "fiji", "latitude": -17.0, "longitude": 179.9995, "radius_meters": 500}]
+    result = SiteIndex(sites).locate(-17.0, -179.9995)
+    assert result["inside"] and result["site"]["id"] == 1
+    assert result["distance"] == pytest.approx(106.3, abs=0.5)
+
+    # มีสาขาอื่นในช่องฝั่งเดียวกับพิกัด (candidates ไม่ว่าง) แต่สาขาที่ครอบพิกัดอยู่อีกฝั่งของเส้น ±180
+    sites.append({"id": 2, "name": "east", "latitude": -17.0, "longitude": -179.998, "radius_meters": 100})
+    index = SiteIndex(sites)
+    # ช่องฝั่ง +180 อยู่ใน candidates โดยไม่ต้องพึ่งการคำนวณทุกสาขา
+    assert sorted(index.candidates(-17.0, -179.9995).tolist()) == [0, 1]
+    result = index.locate(-17.0, -179.9995)
+    assert result["inside"] and result["site"]["id"] == 1
+
+    rng = np.random.default_rng(3)
+    sites = _random_sites(rng, 100, -17.0, 180.0, 0.02)
+    for site in sites:
+        site["longitude"] = (site["longitude"] + 180.0) % 360.0 - 180.0
+    index = SiteIndex(sites)
+    for _ in range(300):
+        lon = (180.0 + rng.uniform(-0.03, 0.03) + 180.0) % 360.0 - 180.0
+        _assert_matches(index, sites, -17.0 + rng.uniform(-0.03, 0.03), lon)
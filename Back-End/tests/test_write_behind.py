@@ -0,0 +1,161 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+import core.write_behind as write_behind
+from core.write_behind import WriteBehindQueue
+
+pytestmark = pytest.mark.skipif(write_behind.fcntl is None, reason="ต้องมี fcntl (spill file ต่อ process)")
+
+
+class TransientError(Exception):
+    pass
+
+
+class Writer:
+    def __init__(self, reject=lambda record: False, down=False):
+        self.written = []
+        self.reject = reject
+        self.down = down
+        self.lock = threading.Lock()
+
+    def __call__(self, records):
+        if self.down:
+            raise TransientError("database down")
+        for record in records:
+            if self.reject(record):
+                raise ValueError(f"bad record {record['id']}")
+        with self.lock:
+            self.written.extend(records)
+
+
+def _queue(monkeypatch, path, writer, pid, **kwargs):
+    # จำลอง worker คนละ process (flock ของแต่ละ open file แยกกันแม้อยู่ process เดียว)
+    monkeypatch.setattr(os, "getpid", lambda: pid)
+    queue = WriteBehindQueue(writer, str(path), flush_interval=0.01, batch_size=10,
+                             transient_errors=(TransientError,), **kwargs)
+    monkeypatch.undo()
+    return queue
+
+
+def _wait(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def _spill_ids(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line)["id"] for line in f if line.strip()]
+
+
+def test_draining_one_worker_keeps_other_workers_records(tmp_path, monkeypatch):
+    base = tmp_path / "spill.jsonl"
+    writer_a, writer_b = Writer(), Writer(down=True)
+    a = _queue(monkeypatch, base, writer_a, 111)
+    b = _queue(monkeypatch, base, writer_b, 222)
+    a.start()
+    b.start()
+    try:
+        b.put({"id": "b1"})
+        a.put({"id": "a1"})
+        assert _wait(lambda: writer_a.written)
+        assert _wait(lambda: a.stats()["pending"] == 0)
+
+        assert a.spill_path != b.spill_path
+        assert _spill_ids(b.spill_path) == ["b1"]
+        assert _spill_ids(a.spill_path) == []
+    finally:
+        a.stop(timeout=1)
+        b.stop(timeout=1)
+
+
+def test_start_claims_spill_files_of_dead_workers(tmp_path, monkeypatch):
+    base = tmp_path / "spill.jsonl"
+    (tmp_path / "spill.jsonl.999").write_text('{"id": "orphan"}\n{"id": "trunc', encoding="utf-8")
+    base.write_text('{"id": "legacy"}\n', encoding="utf-8")
+
+    writer = Writer()
+    queue = _queue(monkeypatch, base, writer, 111)
+    queue.start()
+    try:
+        assert _wait(lambda: len(writer.written) == 2)
+        assert sorted(r["id"] for r in writer.written) == ["legacy", "orphan"]
+        assert not (tmp_path / "spill.jsonl.999").exists()
+        assert not base.exists()
+    finally:
+        queue.stop(timeout=1)
+    # stop หลัง flush ครบ - ไม่เหลือไฟล์ของ process นี้
+    assert not os.path.exists(queue.spill_path)
+
+
+def test_start_does_not_claim_live_worker_spill(tmp_path, monkeypatch):
+    base = tmp_path / "spill.jsonl"
+    live = _queue(monkeypatch, base, Writer(down=True), 222)
+    live.start()
+    live.put({"id": "live"})
+
+    writer = Writer()
+    queue = _queue(monkeypatch, base, writer, 111)
+    queue.start()
+    try:
+        time.sleep(0.1)
+        assert writer.written == []
+        assert _spill_ids(live.spill_path) == ["live"]
+    finally:
+        queue.stop(timeout=1)
+        live.stop(timeout=1)
+
+    # worker ที่หยุดโดยยังมี records ค้าง - worker ถัดไป claim ได้
+    assert _spill_ids(live.spill_path) == ["live"]
+    writer = Writer()
+    queue = _queue(monkeypatch, base, writer, 333)
+    queue.start()
+    try:
+        assert _wait(lambda: [r["id"] for r in writer.written] == ["live"])
+    finally:
+        queue.stop(timeout=1)
+
+
+def test_rejected_records_move_to_dead_letter(tmp_path, monkeypatch):
+    base = tmp_path / "spill.jsonl"
+    dead = tmp_path / "dead.jsonl"
+    writer = Writer(reject=lambda record: record["id"] == "bad")
+    queue = _queue(monkeypatch, base, writer, 111, max_retries=2, dead_letter_path=str(dead))
+    queue.start()
+    try:
+        for record_id in ("ok1", "bad", "ok2"):
+            queue.put({"id": record_id})
+        assert _wait(lambda: queue.stats()["pending"] == 0)
+
+        queue.put({"id": "ok3"})
+        assert _wait(lambda: any(r["id"] == "ok3" for r in writer.written))
+    finally:
+        queue.stop(timeout=1)
+
+    assert [r["id"] for r in writer.written] == ["ok1", "ok2", "ok3"]
+    assert _spill_ids(dead) == ["bad"]
+    assert queue.stats()["dead_lettered"] == 1
+
+
+def test_transient_errors_never_dead_letter(tmp_path, monkeypatch):
+    base = tmp_path / "spill.jsonl"
+    dead = tmp_path / "dead.jsonl"
+    writer = Writer(down=True)
+    queue = _queue(monkeypatch, base, writer, 111, max_retries=1, dead_letter_path=str(dead))
+    queue.start()
+    try:
+        queue.put({"id": "a"})
+        assert _wait(lambda: queue.stats()["failures"] >= 3)
+        assert not dead.exists()
+
+        writer.down = False
+        assert _wait(lambda: [r["id"] for r in writer.written] == ["a"], timeout=10)
+    finally:
+        queue.stop(timeout=1)